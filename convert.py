@@ -1,18 +1,32 @@
 #!/usr/bin/env python
 
 import argparse
+import os
 import sys
 
 from core import i18n
-from core.builder.convertor import Convertor
+from core.builder.cache import AstCache, ConversionCache
+from core.builder.convertor import Convertor, convert_file
+from core.builder.highlight import HighlightCache
+from core.builder.mathcache import MathCache
+from core.builder.profiler import Profiler
 from core.utilities import colour as c
 
 
 class CLIInterface:
     def __init__(self):
         self.args = self.parse_arguments()
+        if self.args.batch is not None:
+            self.run_batch()
+            return
+
+        other_outputs = {output_format: open(path, 'w') for output_format, path in self.args.also}
         self.convertor = Convertor(self.args.format, self.args.locale, self.args.infile, self.args.outfile,
-                                   math=self.args.math)
+                                   math=self.args.math, math_cache=self.args.math_cache_dir,
+                                   highlight_cache=self.highlight_cache(), asts=self.asts(),
+                                   cache=self.cache(), stream=not self.args.no_stream,
+                                   other_outputs=other_outputs, profile=self.args.profile, depfiles=self.depfiles(),
+                                   depfile_targets=self.args.depfile_target)
         if self.convertor.run() == 0:
             self.success()
         else:
@@ -27,9 +41,121 @@ class CLIInterface:
         parser.add_argument('locale',   choices=i18n.languages.keys())
         parser.add_argument('infile',   nargs='?', type=argparse.FileType('r'), default=sys.stdin)
         parser.add_argument('outfile',  nargs='?', type=argparse.FileType('w'), default=sys.stdout)
-        parser.add_argument('--math',   type=str, choices=['webtex', 'mathjax'], default='mathjax')
+        parser.add_argument('--math', type=str, choices=['webtex', 'mathjax', 'svg', 'mathml'], default='mathjax',
+                            help="HTML math method, 'svg' pre-renders formulas with the local TeX toolchain, "
+                                 "'mathml' writes native MathML that needs no JavaScript")
+        parser.add_argument('--math-cache-dir', type=str, default=MathCache.default_directory,
+                            help="directory of formulas pre-rendered to SVG by --math svg")
+        parser.add_argument('--highlight-cache-dir', type=str, default=HighlightCache.default_directory,
+                            help="directory of code blocks highlighted for LaTeX instead of by minted in every compile")
+        parser.add_argument('--no-highlight-cache', action='store_true',
+                            help="leave highlighting of all code blocks to minted")
+        parser.add_argument('--also', nargs=2, action='append', default=[], metavar=('FORMAT', 'OUTFILE'),
+                            help="also convert to FORMAT in OUTFILE, parsing the input only once")
+        parser.add_argument('--batch', type=argparse.FileType('r'), metavar='MANIFEST',
+                            help="convert all files listed in MANIFEST ('-' for stdin), one 'infile outfile' "
+                                 "or 'format locale infile outfile [format outfile ...]' per line")
+        parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                            help="number of worker processes in batch mode")
+        parser.add_argument('--cache-dir', type=str, default=ConversionCache.default_directory,
+                            help="directory of the content-addressed conversion cache")
+        parser.add_argument('--no-cache', action='store_true', help="always convert, bypassing the cache")
+        parser.add_argument('--ast-cache-dir', type=str, default=AstCache.default_directory,
+                            help="directory of pandoc ASTs stored by `core/markdown-check.py --markdown`")
+        parser.add_argument('--no-ast-cache', action='store_true', help="always parse, ignoring stored ASTs")
+        parser.add_argument('--depfile-dir', type=str, default=Convertor.default_depfiles,
+                            help="root of the tree of make depfiles, listing included files and images of each output")
+        parser.add_argument('--depfile-target', action='append', default=[], metavar='TARGET',
+                            help="also list the dependencies in the depfiles as prerequisites of TARGET, "
+                                 "such as the stamp of a batch conversion")
+        parser.add_argument('--no-depfile', action='store_true', help="do not write make depfiles")
+        parser.add_argument('--no-stream', action='store_true',
+                            help="buffer every stage in a temporary file instead of streaming through pandoc")
+        parser.add_argument('--profile', type=str, metavar='FILE',
+                            default=os.environ.get(Profiler.environment_variable) or None,
+                            help="append timing of every stage and rule as JSON lines to FILE "
+                                 f"(default from ${Profiler.environment_variable}); "
+                                 "summarize with `python -m core.builder.profiler FILE`")
         parser.add_argument('--verbose', action='store_true')
-        return parser.parse_args()
+        args = parser.parse_args()
+        for output_format, _ in args.also:
+            if output_format not in ['latex', 'html'] or output_format == args.format:
+                parser.error(f"--also: invalid or repeated format '{output_format}'")
+        return args
+
+    def cache(self) -> ConversionCache | None:
+        return None if self.args.no_cache else ConversionCache(self.args.cache_dir)
+
+    def asts(self) -> AstCache | None:
+        return None if self.args.no_ast_cache else AstCache(self.args.ast_cache_dir)
+
+    def highlight_cache(self) -> str | None:
+        return None if self.args.no_highlight_cache else self.args.highlight_cache_dir
+
+    def depfiles(self) -> str | None:
+        return None if self.args.no_depfile else self.args.depfile_dir
+
+    def report_cache(self, hits: int, misses: int) -> None:
+        total_hits, total_misses = ConversionCache(self.args.cache_dir).totals()
+        print(f"convert: cache {c.num(hits)} hits, {c.num(misses)} misses "
+              f"({c.num(total_hits)} hits, {c.num(total_misses)} misses in {c.path(self.args.cache_dir)})")
+
+    def read_manifest(self) -> list[tuple[str, str, str, str, dict[str, str]]]:
+        """ Parse the batch manifest into (format, locale, infile, outfile, {other format: outfile}) tuples """
+        jobs = []
+        for number, line in enumerate(self.args.batch, 1):
+            fields = line.split()
+            if len(fields) == 0 or fields[0].startswith('#'):
+                continue
+
+            match fields:
+                case [infile, outfile]:
+                    jobs.append((self.args.format, self.args.locale, infile, outfile, {}))
+                case [output_format, locale_code, infile, outfile, *others] if len(others) % 2 == 0:
+                    others = dict(zip(others[::2], others[1::2]))
+                    formats = [output_format, *others.keys()]
+                    if any(fmt not in ['latex', 'html'] for fmt in formats) or len(set(formats)) < len(formats) \
+                            or locale_code not in i18n.languages:
+                        sys.exit(f"{c.err('convert: invalid format or locale')} on manifest line {c.num(number)}")
+                    jobs.append((output_format, locale_code, infile, outfile, others))
+                case _:
+                    sys.exit(f"{c.err('convert: malformed manifest line')} {c.num(number)}: {line.rstrip()}")
+        return jobs
+
+    def run_batch(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        jobs = self.read_manifest()
+        if len(jobs) == 0:
+            return
+
+        # Compile every rule set before forking, so that the workers inherit them
+        for output_format, locale_code in {(fmt, job[1]) for job in jobs for fmt in [job[0], *job[4]]}:
+            Convertor.rule_set(output_format, locale_code)
+
+        with ProcessPoolExecutor(max_workers=max(1, min(self.args.jobs, len(jobs)))) as pool:
+            futures = [pool.submit(convert_file, *job[:4], other_outputs=job[4], math=self.args.math,
+                                   math_cache=self.args.math_cache_dir, highlight_cache=self.highlight_cache(),
+                                   asts=self.asts(), cache=self.cache(), stream=not self.args.no_stream,
+                                   profile=self.args.profile, depfiles=self.depfiles(),
+                                   depfile_targets=self.args.depfile_target)
+                       for job in jobs]
+            codes, hits = zip(*[future.result() for future in futures])
+
+        for (_, _, infile, _, _), code in zip(jobs, codes):
+            if code == 0:
+                if self.args.verbose:
+                    print(f"convert: {c.ok('success')} on {c.path(infile)}")
+            else:
+                print(f"{c.err(f'convert: failure ({code}) on ')}{c.path(infile)}")
+
+        if not self.args.no_cache:
+            self.report_cache(hits.count(True), hits.count(False))
+
+        failed = sum(code != 0 for code in codes)
+        if failed > 0:
+            print(f"{c.err('convert: batch failed')} on {c.num(failed)} of {c.num(len(jobs))} files")
+            sys.exit(-1)
 
     def fail(self):
         print(f"{c.err('convert: failure on ')}{c.path(self.args.infile.name)}")
@@ -38,6 +164,8 @@ class CLIInterface:
     def success(self):
         if self.args.verbose:
             print(f"convert: {c.ok('success')} on {c.path(self.args.infile.name)}")
+            if self.convertor.cache is not None:
+                self.report_cache(self.convertor.cache.hits, self.convertor.cache.misses)
 
 
 if __name__ == "__main__":
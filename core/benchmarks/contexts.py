@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+"""
+Construction time and peak memory of large contexts, shaped like the venues of a naboj volume:
+every venue adopts the volume with all its problems, the i18n of every language and its own list of teams.
+Run as `python -m core.benchmarks.contexts` from the repository root.
+"""
+
+import argparse
+import logging
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import yaml
+from enschema import Schema
+
+from core.builder.context import FileSystemContext, BuildableFileSystemContext, registry
+from core.utilities import colour as c
+
+
+class BenchmarkContext(FileSystemContext):
+    _schema = Schema({str: object})
+
+    def node_path(self, *path):
+        return Path(self.root, *path)
+
+
+class ContextVolume(BenchmarkContext):
+    def populate(self):
+        self.load_meta('volume')
+
+
+class ContextLanguage(BenchmarkContext):
+    def populate(self, language):
+        self.load_meta('i18n', language)
+
+
+class ContextI18n(BenchmarkContext):
+    def populate(self, languages):
+        self.adopt(**{f'lang{language}': ContextLanguage(self.root, str(language))
+                      for language in range(int(languages))})
+
+
+class ContextVenue(BenchmarkContext):
+    def populate(self, venue):
+        self.load_meta('venues', venue)
+
+
+class BuildableContextVenue(BuildableFileSystemContext, BenchmarkContext):
+    def populate(self, venue, languages):
+        self.adopt(
+            volume=ContextVolume(self.root),
+            i18n=ContextI18n(self.root, languages),
+            venue=ContextVenue(self.root, venue).override('code', venue.upper()),
+        )
+
+
+def write(path: Path, content: dict) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    Path(path, 'meta.yaml').write_text(yaml.safe_dump(content))
+
+
+def create(root: Path, *, problems: int, languages: int, venues: int, teams: int) -> None:
+    write(Path(root, 'volume'), {
+        'problems': [{'id': f'problem-{number}', 'tags': ['kinematics', 'optics'], 'number': number}
+                     for number in range(problems)],
+    })
+    for language in range(languages):
+        write(Path(root, 'i18n', str(language)), {
+            f'section{key}': {'title': f'Nadpis {key}', 'text': f'Text {key} ' * 10} for key in range(50)
+        })
+    for venue in range(venues):
+        write(Path(root, 'venues', f'v{venue}'), {
+            'code': f'v{venue}',
+            'teams': [{'id': team, 'name': f'Tím {team}', 'school': f'Škola {team}', 'contestants': 'A, B, C'}
+                      for team in range(teams)],
+        })
+
+
+def measure(root: Path, *, languages: int, venues: int) -> tuple[float, float]:
+    """ Time in seconds and peak memory in MiB of building all venue contexts, without validation """
+    registry.clear()
+    registry.validation = 'off'
+    tracemalloc.start()
+    start = time.perf_counter()
+    contexts = [BuildableContextVenue(root, f'v{venue}', str(languages)) for venue in range(venues)]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(contexts) == venues
+    registry.clear()
+    return elapsed, peak / 2 ** 20
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the construction of large contexts")
+    parser.add_argument('--problems', type=int, default=60)
+    parser.add_argument('--languages', type=int, default=10)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    logging.getLogger('dgs').setLevel(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directory:
+        create(Path(directory), problems=args.problems, languages=args.languages, venues=args.venues,
+               teams=args.teams)
+        # The first run also parses and caches all meta.yaml files
+        measure(Path(directory), languages=args.languages, venues=args.venues)
+        runs = [measure(Path(directory), languages=args.languages, venues=args.venues) for _ in range(args.repeat)]
+
+    elapsed = min(run[0] for run in runs)
+    peak = min(run[1] for run in runs)
+    print(f"Building {c.num(args.venues)} venues with {c.num(args.teams)} teams, {c.num(args.problems)} problems "
+          f"and {c.num(args.languages)} languages, best of {c.num(args.repeat)} runs")
+    print(f"{c.name('time'):>24} {c.num(f'{1000 * elapsed:8.1f}')} ms, "
+          f"{c.num(f'{1000 * elapsed / args.venues:6.2f}')} ms/venue")
+    print(f"{c.name('peak memory'):>24} {c.num(f'{peak:8.1f}')} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the in-process Lua filters (core/filters) against the external Python pandoc filters they replace.
+Run as `python -m core.benchmarks.filters` from the repository root.
+"""
+
+import argparse
+import io
+import tempfile
+import time
+from pathlib import Path
+
+from core.builder.convertor import Convertor
+from core.utilities import colour as c
+
+
+# A short problem statement, similar to what most files in a repository look like
+PROBLEM = """
+Teleso s hmotnosťou $m = \\SI{2}{kg}$ sa pohybuje rýchlosťou $v$ po vodorovnej podložke.
+
+$$E_k = \\frac12 m v^2$$ {#eq:kinetic}
+
+Z rovnice @eq:kinetic dostaneme výsledok, ktorý vypíše `print(E_k)`{.python}.
+
+!include hint.md
+
+```python
+print("Hello")
+```
+"""
+
+HINT = "Pomôcka: *zákon zachovania energie*.\n"
+
+
+def convert(output_format: str, path: Path, filters: str) -> str:
+    out = io.StringIO()
+    with open(path) as infile:
+        code = Convertor(output_format, 'sk', infile, out, filters=filters).run()
+    if code != 0:
+        raise RuntimeError(f"Conversion of {path} with {filters} filters failed")
+    return out.getvalue()
+
+
+def measure(output_format: str, paths: list[Path], filters: str, repeat: int) -> tuple[float, list[str]]:
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [convert(output_format, path, filters) for path in paths]
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Lua filters against the Python pandoc filters")
+    parser.add_argument('--files', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for number in range(args.files):
+            path = Path(directory, f'{number:02d}', 'problem.md')
+            path.parent.mkdir()
+            path.write_text(PROBLEM)
+            Path(path.parent, 'hint.md').write_text(HINT)
+            paths.append(path)
+
+        print(f"Converting {c.num(len(paths))} files, best of {c.num(args.repeat)} runs")
+        for output_format in ['latex', 'html']:
+            old_time, old = measure(output_format, paths, 'python', args.repeat)
+            new_time, new = measure(output_format, paths, 'lua', args.repeat)
+            if old != new:
+                raise AssertionError(f"Outputs differ for {output_format}")
+
+            old_file, new_file = 1000 * old_time / len(paths), 1000 * new_time / len(paths)
+            print(f"{c.name(output_format):>16} python {c.num(f'{old_file:7.1f}')} ms/file, "
+                  f"lua {c.num(f'{new_file:7.1f}')} ms/file, saving {c.ok(f'{old_file - new_file:7.1f} ms/file')} "
+                  f"({c.ok(f'{old_time / new_time:5.2f}x')})")
+
+
+if __name__ == "__main__":
+    main()
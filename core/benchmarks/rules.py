@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the compiled rule tables (RegexTable) against applying every rule separately.
+Run as `python -m core.benchmarks.rules` from the repository root.
+"""
+
+import argparse
+import random
+import time
+
+from core.builder.convertor import Convertor
+from core.utilities import colour as c
+
+
+# Typical lines of problem statements and solutions; most of them match no rule at all
+SAMPLES = [
+    "Teleso s hmotnosťou $m = \\SI{2}{kg}$ sa pohybuje rýchlosťou $v$ po vodorovnej podložke.",
+    "Určte, aká veľká sila $F$ pôsobí na \"teleso\" v čase $t = \\SI{3}{s}$.",
+    "$${",
+    "    E_k &= \\frac12 m v^2 \\\\",
+    "}$$",
+    "% poznámka pre autorov",
+    "@E Tu chýba obrázok",
+    "@L \\newpage",
+    "@H <hr>",
+    "@TODO skontrolovať jednotky",
+    "![Schéma zapojenia](obrazok.svg){#fig:schema height=40mm}",
+    "\\includegraphics[width=5cm]{graf.png}",
+    "\\includegraphics{graf.gp}",
+    "\\includesvg[width=5cm]{schema.svg}",
+    "\\caption{}\\label{fig:x}",
+    "<p>Výsledok je <img src=\"vysledok.png\" style=\"height:30mm\" /></p>",
+    "<figcaption>Obrázok 3: Priebeh napätia</figcaption>",
+    "Hodnota $\\num{e5}$ a $\\num{3e-2}$ v MathJaxe.",
+    "",
+    "Riešenie je teda $x = \\num{42}$.",
+]
+
+
+def corpus(lines: int, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLES) + '\n' for _ in range(lines)]
+
+
+def reference(tables: list, check: bool):
+    def run(line):
+        for table in tables:
+            line = Convertor.check_line(line, table) if check else Convertor.process_line(line, table)
+        return line
+    return run
+
+
+def compiled(tables: list, check: bool):
+    def run(line):
+        for table in tables:
+            line = table.check(line) if check else table.process(line)
+        return line
+    return run
+
+
+def measure(function, lines: list[str], repeat: int) -> tuple[float, list]:
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = []
+        for line in lines:
+            try:
+                result.append(function(line))
+            except Exception as e:
+                result.append(e.args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Convertor regex rule tables")
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    lines = corpus(args.lines, args.seed)
+    print(f"Corpus of {c.num(len(lines))} lines, best of {c.num(args.repeat)} runs")
+
+    for output_format in ['latex', 'html']:
+        rules = Convertor.rule_set(output_format, 'sk')
+        for stage, tables, check in [
+            ('pre_check', [rules['pre_checks']], True),
+            ('preprocess', [rules['pre_regexes']], False),
+            ('postprocess', [rules['post_regexes']], False),
+            ('post_check', [rules['post_checks']], True),
+        ]:
+            old_time, old = measure(reference(tables, check), lines, args.repeat)
+            new_time, new = measure(compiled(tables, check), lines, args.repeat)
+            if old != new:
+                raise AssertionError(f"Outputs differ for {output_format} {stage}")
+
+            print(f"{c.name(output_format):>16} {c.name(stage):<22} reference {c.num(f'{old_time:8.3f}')} s, "
+                  f"compiled {c.num(f'{new_time:8.3f}')} s, speedup {c.ok(f'{old_time / new_time:5.2f}x')}")
+
+
+if __name__ == "__main__":
+    main()
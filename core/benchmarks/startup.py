@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+"""
+Startup time of the entry points that make runs once per target, measured by `python -X importtime`.
+Fails if an entry point imports a module that its code path does not need, or takes longer than its budget.
+Run as `python -m core.benchmarks.startup` from the repository root.
+"""
+
+import argparse
+import subprocess
+import sys
+
+from core.utilities import colour as c
+
+
+# Command line, budget of imports in ms, and modules that must not be imported, of every entry point.
+# Builders must not import Jinja and YAML before the daemon had its chance to build instead of them.
+ENTRY_POINTS = {
+    'convert': (['convert.py', '--help'], 100, ['asyncio', 'enschema', 'jinja2', 'yaml', 'pygments.formatters']),
+    'markdown-check': (['core/markdown-check.py', '--help'], 110, ['asyncio', 'enschema', 'jinja2', 'yaml']),
+    'i18n builder': (['-m', 'core.builder.i18n', '--help'], 150, ['asyncio', 'jinja2', 'yaml', 'pygments']),
+    'naboj builder': (['-m', 'modules.naboj.builder.language', '--help'], 150,
+                      ['asyncio', 'jinja2', 'yaml', 'pygments']),
+}
+
+
+def imports(argv: list[str]) -> tuple[float, set[str]]:
+    """ Run the command line, returning its total import time in ms and the names of all imported modules """
+    process = subprocess.run([sys.executable, '-X', 'importtime', *argv], capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(argv)} failed: {process.stderr.strip().splitlines()[-1:]}")
+
+    total, modules = 0, set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        _, cumulative, name = line.removeprefix('import time:').split('|')
+        modules.add(name.strip())
+        # Only top-level imports, nested ones are included in their cumulative time
+        if not name.startswith('  '):
+            total += int(cumulative)
+    return total / 1000, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the entry points of DeGeŠ")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for name, (argv, budget, forbidden) in ENTRY_POINTS.items():
+        try:
+            runs = [imports(argv) for _ in range(args.repeat)]
+        except RuntimeError as error:
+            print(f"{c.name(name):>24} {c.warn('skipped')}: {error}")
+            continue
+
+        best = min(total for total, _ in runs)
+        unwanted = sorted(set(forbidden) & runs[0][1])
+        verdict = c.ok('ok') if best <= budget and not unwanted else c.err('over budget')
+        if unwanted:
+            verdict += f", {c.err('imports')} {', '.join(unwanted)}"
+        print(f"{c.name(name):>24} {c.num(f'{best:6.1f}')} ms of {c.num(budget)} ms: {verdict}")
+        failed |= best > budget or len(unwanted) > 0
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Validation of a single large naboj volume, as done by `python -m core.builder.validate` in one of its processes,
+against validation split by subtree: the problems are scanned by a pool of processes and only assembled and checked
+in the main one. Shows whether parallelising within a repository, and not only across repositories, pays off.
+Run as `python -m core.benchmarks.validation` from the repository root.
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from core import i18n
+from core.builder import validator
+from core.builder.cache import TreeCache
+from core.utilities import colour as c
+from modules.naboj.builder.contexts.validators import NabojValidator
+
+
+class SplitValidator(NabojValidator):
+    """ Validator of a volume whose problems have already been scanned by other processes """
+    def __init__(self, root, problems: dict):
+        self.root = Path(root)
+        self.tree = {name: self.scan(self.root / name) for name in os.listdir(self.root) if name != 'problems'}
+        self.tree['problems'] = problems
+        self.debug = False
+
+
+def create(root: Path, *, problems: int, languages: int, venues: int) -> None:
+    codes = list(i18n.languages.keys())[:languages]
+    files = {
+        'meta.yaml': '',
+        **{f'problems/p{number}/answer.md': '' for number in range(problems)},
+        **{f'problems/p{number}/figure{figure}.svg': '' for number in range(problems) for figure in range(3)},
+        **{f'problems/p{number}/{code}/{name}': '' for number in range(problems) for code in codes
+           for name in ['problem.md', 'solution.md']},
+        **{f'languages/{code}/{name}': '' for code in codes for name in ['meta.yaml', 'intro.jtt']},
+        **{f'venues/v{venue}/meta.yaml': '' for venue in range(venues)},
+    }
+    for name, content in files.items():
+        Path(root, name).parent.mkdir(parents=True, exist_ok=True)
+        Path(root, name).write_text(content)
+
+    # Backdate all directories, so that the tree cache trusts their listings (see TreeCache.racy_ns)
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, ns=(time.time_ns() - 10 ** 10,) * 2)
+
+
+def scan(root: Path, names: list[str]) -> dict:
+    """ Scan some of the problems of the volume at `root`, in a worker process """
+    scanner = NabojValidator.__new__(NabojValidator)
+    return {name: scanner.scan(Path(root, 'problems', name)) for name in names}
+
+
+def serial(root: Path, cache: Path) -> tuple[float, float]:
+    """ Time in seconds of scanning and of checking the volume in a new process """
+    validator.tree_cache = TreeCache(cache)
+    start = time.perf_counter()
+    volume = NabojValidator(root)
+    scanned = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        volume.check()
+    return scanned - start, time.perf_counter() - scanned
+
+
+def split(root: Path, cache: Path, jobs: int) -> float:
+    """ Time in seconds of scanning the problems in `jobs` processes and checking the volume in a new process """
+    validator.tree_cache = TreeCache(cache)
+    start = time.perf_counter()
+    names = sorted(os.listdir(Path(root, 'problems')))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(scan, root, names[job::jobs]) for job in range(jobs)]
+        problems = {}
+        for future in futures:
+            problems |= future.result()
+    volume = SplitValidator(root, problems)
+    with contextlib.redirect_stdout(io.StringIO()):
+        volume.check()
+    return time.perf_counter() - start
+
+
+def startup(jobs: int) -> float:
+    """ Time in seconds of starting a pool of `jobs` processes and running a trivial task in each """
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        list(executor.map(abs, range(jobs)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark validating a repository serially and split by subtree")
+    parser.add_argument('--problems', type=int, default=60)
+    parser.add_argument('--languages', type=int, default=8)
+    parser.add_argument('--venues', type=int, default=50)
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count())
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        root, cache = Path(directory, 'volume'), Path(directory, 'cache')
+        create(root, problems=args.problems, languages=args.languages, venues=args.venues)
+        # The first runs list every directory and store the listings for all later ones
+        serial(root, cache)
+        split(root, cache, args.jobs)
+        serial_runs = [serial(root, cache) for _ in range(args.repeat)]
+        split_time = min(split(root, cache, args.jobs) for _ in range(args.repeat))
+        startup_time = min(startup(args.jobs) for _ in range(args.repeat))
+
+    scan_time = min(run[0] for run in serial_runs)
+    check_time = min(run[1] for run in serial_runs)
+    print(f"Validating a volume of {c.num(args.problems)} problems in {c.num(args.languages)} languages "
+          f"with {c.num(args.venues)} venues, best of {c.num(args.repeat)} runs")
+    print(f"{c.name('serial'):>24} {c.num(f'{1000 * (scan_time + check_time):8.1f}')} ms "
+          f"(scan {c.num(f'{1000 * scan_time:.1f}')} ms, check {c.num(f'{1000 * check_time:.1f}')} ms)")
+    print(f"{c.name(f'split over {args.jobs} processes'):>24} {c.num(f'{1000 * split_time:8.1f}')} ms")
+    print(f"{c.name('pool startup alone'):>24} {c.num(f'{1000 * startup_time:8.1f}')} ms")
+
+
+if __name__ == "__main__":
+    main()
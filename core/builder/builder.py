@@ -4,14 +4,15 @@ import argparsedirs
 import logging
 import os
 import subprocess
+import sys
 
 from abc import abstractmethod, ABCMeta
 from pathlib import Path
 from typing import Any, ClassVar
 
 from core.utilities import colour as c, crawler
-from core.builder import jinja
-from core.builder.context import BuildableContext
+from core.builder import daemon, git
+from core.builder.context import BuildableContext, registry, validation_levels
 
 log = logging.getLogger('dgs')
 
@@ -25,11 +26,11 @@ def check_output(command, *, cwd) -> str:
 
 
 def get_last_commit_hash(cwd=None) -> str:
-    return check_output(["git", "rev-parse", "--short", "--verify", "master"], cwd=cwd)
+    return git.last_commit_hash(cwd)
 
 
 def get_branch(cwd=None) -> str:
-    return check_output(["git", "rev-parse", "--symbolic-full-name", "--abbrev-ref", "HEAD"], cwd=cwd)
+    return git.branch(cwd)
 
 
 class BaseBuilder(metaclass=ABCMeta):
@@ -71,11 +72,16 @@ class BaseBuilder(metaclass=ABCMeta):
         self.add_arguments()
         self.args = self.parser.parse_args()
 
+        # Let the daemon of `make serve` build it instead, if it is running
+        if (status := daemon.forward()) is not None:
+            sys.exit(status)
+
         log.setLevel(logging.DEBUG if self.args.debug else logging.INFO)
+        registry.validation = self.args.validate
         self.launch_directory = Path(self.args.launch)
         self.template_root = Path(self.args.template_root)
         self.output_directory = Path(self.args.output) if self.args.output else None
-        self.context = self._root_context_class(self.launch_directory, *self.ident())
+        self.context = daemon.context(self._root_context_class, self.launch_directory, *self.ident())
         self.suffix_map = self.default_suffix_map if suffix_map is None else suffix_map
 
     def add_core_arguments(self) -> None:
@@ -85,6 +91,8 @@ class BaseBuilder(metaclass=ABCMeta):
         self.parser.add_argument('-o', '--output', action=argparsedirs.WriteableDir)
         self.parser.add_argument('-d', '--debug', action='store_true')
         self.parser.add_argument('-t', '--tree', action='store_true')
+        self.parser.add_argument('--validate', choices=validation_levels, default='full',
+                                 help="validate all contexts (default), only the root context, or nothing")
 
     @abstractmethod
     def add_arguments(self) -> None:
@@ -141,6 +149,9 @@ class BaseBuilder(metaclass=ABCMeta):
                              f"only supports {', '.join(self.suffix_map.keys())}")
 
     def build_templates(self, *, new_name: str = None) -> None:
+        # Jinja is imported only now, as the daemon may build instead of us
+        from core.builder import jinja
+
         assert isinstance(self.context, BuildableContext), \
             c.err(f"Builder's context class is {self.context.__class__.__name__}, which is not a buildable context!")
 
@@ -159,8 +170,11 @@ class BaseBuilder(metaclass=ABCMeta):
 
         log.debug(f"{c.ok('Template builder on')} {c.name(self._target)} "
                   f"{c.path(self.full_name())} {c.ok('successful')}")
+        log.debug(f"Contexts: {registry}")
 
     def build_contexts(self) -> None:
+        from core.builder import jinja
+
         for context in self.contexts:
             assert isinstance(context, BuildableContext), \
                 c.err(f"Builder's context class {context} is {self.context.__class__.__name__}, "
@@ -169,4 +183,6 @@ class BaseBuilder(metaclass=ABCMeta):
             for template in self.templates:
                 jinja.print_template(self.template_root, template, context.data,
                                      outdir=self.output_directory,
-                                     new_name=f"{context.name}.tex")
\ No newline at end of file
+                                     new_name=f"{context.name}.tex")
+
+        log.debug(f"Contexts: {registry}")
@@ -0,0 +1,295 @@
+import functools
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import stat
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any
+
+
+class ConversionCache:
+    """
+    Content-addressed on-disk cache of conversion results.
+    Entries are immutable files named by their key and are written atomically (temporary file + rename),
+    so that any number of concurrent processes (make -j) can share the same directory.
+    Hits and misses are counted per process and also appended to a shared log in the cache directory.
+    """
+    default_directory = Path('build', '.cache', 'convert')
+    stats_name = 'stats.log'
+
+    class Discard(Exception):
+        """ Raise inside `writer` to drop the entry being written without an error """
+
+    def __init__(self, directory=None):
+        self.directory = Path(self.default_directory if directory is None else directory)
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: str) -> Path:
+        return self.directory / key[:2] / key
+
+    def fetch(self, key: str, outfile: IO) -> bool:
+        """ Copy the cached result for `key` to `outfile`, if present. Returns whether it was a hit. """
+        try:
+            source = open(self.path(key), 'r')
+        except FileNotFoundError:
+            self.record(False)
+            return False
+
+        with source:
+            if not self._clone(source, outfile):
+                shutil.copyfileobj(source, outfile)
+
+        self.record(True)
+        return True
+
+    @contextmanager
+    def writer(self, key: str, *, binary: bool = False):
+        """
+        Context manager yielding a file for the result of `key`, published atomically upon a clean exit.
+        Raising ConversionCache.Discard inside drops the entry silently, any other exception propagates.
+        """
+        target = self.path(key)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=target.parent, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb' if binary else 'w') as out:
+                yield out
+            os.replace(temporary, target)
+        except ConversionCache.Discard:
+            os.unlink(temporary)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+    def store(self, key: str, file: IO) -> None:
+        """ Store the contents of a seekable `file` under `key` and rewind it """
+        with self.writer(key) as out:
+            shutil.copyfileobj(file, out)
+        file.seek(0)
+
+    @staticmethod
+    def _clone(source: IO, outfile: IO) -> bool:
+        """
+        Copy a cache entry into a regular output file on the kernel side with copy_file_range,
+        which reflinks on file systems that support it. Returns False if this is not possible.
+        """
+        try:
+            outfile.flush()
+            src, dst = source.fileno(), outfile.fileno()
+            if not stat.S_ISREG(os.fstat(dst).st_mode):
+                return False
+
+            size = os.fstat(src).st_size
+            start = os.lseek(dst, 0, os.SEEK_CUR)
+            done = 0
+            while done < size:
+                copied = os.copy_file_range(src, dst, size - done, done, start + done)
+                if copied == 0:
+                    return False
+                done += copied
+            os.lseek(dst, start + size, os.SEEK_SET)
+            return True
+        except (AttributeError, OSError, ValueError):
+            return False
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+        # Single short O_APPEND writes are atomic, so concurrent processes cannot garble the log
+        self.directory.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.directory / self.stats_name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, b'hit\n' if hit else b'miss\n')
+        finally:
+            os.close(fd)
+
+    def totals(self) -> tuple[int, int]:
+        """ Return (hits, misses) accumulated by all processes sharing this cache directory """
+        try:
+            with open(self.directory / self.stats_name, 'r') as log:
+                lines = log.read().split()
+        except FileNotFoundError:
+            return 0, 0
+        return lines.count('hit'), lines.count('miss')
+
+
+class AstCache(ConversionCache):
+    """
+    pandoc's JSON AST of Markdown sources, keyed by the exact text pandoc parses and by the pandoc executable.
+    Filled by `core/markdown-check.py --markdown`, which runs its checks on the AST, and read by Convertor,
+    which renders from a stored AST instead of parsing the same text again, so a lint-then-build cycle parses once.
+    """
+    default_directory = Path('build', '.cache', 'ast')
+    reader = 'markdown+smart'
+
+    @staticmethod
+    @functools.cache
+    def pandoc_fingerprint() -> tuple | None:
+        """ The pandoc executable by path, size and modification time, see also convertor.tool_fingerprint """
+        if (path := shutil.which('pandoc')) is None:
+            return None
+        info = Path(path).resolve().stat()
+        return path, info.st_size, info.st_mtime_ns
+
+    @classmethod
+    def key(cls, text: str) -> str:
+        digest = hashlib.sha256(text.encode('utf-8'))
+        digest.update(repr((cls.reader, cls.pandoc_fingerprint())).encode('utf-8'))
+        return digest.hexdigest()
+
+    def lookup(self, text: str) -> Path | None:
+        """ The path of the stored AST of `text`, if present """
+        path = self.path(self.key(text))
+        self.record(path.is_file())
+        return path if path.is_file() else None
+
+    def parse(self, text: str) -> dict:
+        """ The AST of `text`, parsed by pandoc and stored unless already present """
+        if (path := self.lookup(text)) is not None:
+            with open(path) as file:
+                return json.load(file)
+
+        ast = subprocess.run(['pandoc', '--from', self.reader, '--to', 'json'], input=text, capture_output=True,
+                             encoding='utf-8', check=True).stdout
+        with self.writer(self.key(text)) as out:
+            out.write(ast)
+        return json.loads(ast)
+
+
+class MetadataCache(ConversionCache):
+    """
+    Parsed YAML metadata files, kept for the whole process and pickled on disk for other processes,
+    keyed by the path, size and modification time of the file, so that the many contexts loading the same
+    meta.yaml parse it only once. Every load returns a new copy, which the caller may modify freely.
+    On disk there is a single entry per file, holding the size and modification time it was read at,
+    so that every edit replaces the previous version instead of adding another one.
+    """
+    default_directory = Path('build', '.cache', 'meta')
+
+    def __init__(self, directory=None):
+        super().__init__(directory)
+        # Pickled contents by path, with the (path, size, mtime) they were read at: unpickling is the cheapest way
+        # to make a deep copy. Only the latest version of each file is kept, so that a long-lived process
+        # (core/builder/daemon.py) does not keep every version of a file that is being edited.
+        self.loaded: dict[str, tuple[tuple[str, int, int], bytes]] = {}
+
+    @staticmethod
+    @functools.cache
+    def loader():
+        """ The safe YAML loader of libyaml if available, the pure Python one otherwise """
+        import yaml
+        return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+    def load(self, path) -> Any:
+        info = os.stat(path)
+        identity = (os.path.abspath(path), info.st_size, info.st_mtime_ns)
+        cached = self.loaded.get(identity[0])
+        if cached is None or cached[0] != identity:
+            cached = self.loaded[identity[0]] = identity, self._read(path, identity)
+        return pickle.loads(cached[1])
+
+    def _read(self, path, identity: tuple[str, int, int]) -> bytes:
+        import yaml
+
+        loader = self.loader()
+        key = hashlib.sha1(repr((identity[0], yaml.__version__, loader.__name__, pickle.HIGHEST_PROTOCOL))
+                           .encode('utf-8')).hexdigest()
+        try:
+            stored, pickled = pickle.loads(self.path(key).read_bytes())
+            if stored == identity:
+                return pickled
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass
+
+        with open(path, 'r') as file:
+            pickled = pickle.dumps(yaml.load(file, Loader=loader), protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            with self.writer(key, binary=True) as out:
+                pickle.dump((identity, pickled), out, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            # Not being able to keep it for other processes is no reason to fail
+            pass
+        return pickled
+
+
+class TreeCache(ConversionCache):
+    """
+    Listings of the directories scanned by file system validators, kept for the whole process and pickled on disk
+    per scanned root. Adding, removing or renaming an entry changes the modification time of its directory,
+    so a directory is listed again only if its modification time has changed since it was last listed.
+    Hits and misses are only counted per process.
+    """
+    default_directory = Path('build', '.cache', 'tree')
+    # A directory changed this shortly before it was listed may change again without getting a new modification time
+    racy_ns = 1_000_000_000
+
+    def __init__(self, directory=None):
+        super().__init__(directory)
+        # Names and kinds of the entries by directory, with its modification time and the time it was listed
+        self.listings: dict[str, tuple[int, int, list[tuple[str, str | None]]]] = {}
+        self.loaded: set[str] = set()
+
+    @staticmethod
+    def key(root: str) -> str:
+        return hashlib.sha1(root.encode('utf-8', 'surrogateescape')).hexdigest()
+
+    def record(self, hit: bool) -> None:
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+
+    def listing(self, path: str) -> list[tuple[str, str | None]]:
+        """ Names and kinds of the entries of the directory `path`: 'dir', 'link', 'file', or None for anything else """
+        mtime = os.stat(path).st_mtime_ns
+        cached = self.listings.get(path)
+        if cached is not None and cached[0] == mtime and cached[1] - mtime >= self.racy_ns:
+            self.record(True)
+            return cached[2]
+
+        listed = time.time_ns()
+        entries = []
+        with os.scandir(path) as scan:
+            for entry in scan:
+                if entry.is_dir():
+                    kind = 'dir'
+                elif entry.is_symlink():
+                    kind = 'link'
+                elif entry.is_file():
+                    kind = 'file'
+                else:
+                    kind = None
+                entries.append((entry.name, kind))
+        self.listings[path] = (mtime, listed, entries)
+        self.record(False)
+        return entries
+
+    def load(self, root: str) -> None:
+        """ Add the listings stored for `root` by other processes, once per process """
+        if root in self.loaded:
+            return
+        self.loaded.add(root)
+        try:
+            stored = pickle.loads(self.path(self.key(root)).read_bytes())
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return
+        for path, listing in stored.items():
+            self.listings.setdefault(path, listing)
+
+    def save(self, root: str, paths: list[str]) -> None:
+        """ Store the listings of `paths`, the directories of the tree under `root`, for other processes """
+        try:
+            with self.writer(self.key(root), binary=True) as out:
+                pickle.dump({path: self.listings[path] for path in paths}, out, protocol=pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            pass
@@ -1,4 +1,5 @@
 import re
+import time
 
 
 class RegexFailure:
@@ -6,6 +7,22 @@ class RegexFailure:
         self.pattern = re.compile(pattern, flags=flags)
         self.error = error
 
+    def __repr__(self):
+        return f"RegexFailure({self.pattern.pattern!r}, flags={self.pattern.flags}, error={self.error!r})"
+
+
+class CheckFailure(Exception):
+    """ A RegexFailure caught on a particular line of a stream """
+    def __init__(self, error: str, number: int, line: str, *, stage: str = "input"):
+        super().__init__(error, number, line)
+        self.error = error
+        self.number = number
+        self.line = line
+        self.stage = stage
+
+    def __str__(self):
+        return f"{self.error} on {self.stage} line {self.number}: {self.line.rstrip()}"
+
 
 class RegexReplacement:
     def __init__(self, pattern: str, repl: str, *, purpose: str = "", flags: re.RegexFlag = re.NOFLAG):
@@ -15,3 +32,259 @@ class RegexReplacement:
         self.pattern = re.compile(pattern, flags=flags)
         self.repl = repl
         self.purpose = purpose
+
+    def __repr__(self):
+        return f"RegexReplacement({self.pattern.pattern!r}, {self.repl!r}, flags={self.pattern.flags})"
+
+
+re_quantifier = re.compile(r"[*+?]|\{(\d*,\d*|\d+)\}")
+
+
+def _skip_class(source: str, i: int) -> int:
+    """ Return the index just past the character class starting at source[i] == '[' """
+    j = i + 1
+    if source.startswith('^', j):
+        j += 1
+    # A ']' right after the opening '[' or '[^' is a literal
+    if source.startswith(']', j):
+        j += 1
+    while source[j] != ']':
+        j += 2 if source[j] == '\\' else 1
+    return j + 1
+
+
+def _skip_group(source: str, i: int) -> int:
+    """ Return the index just past the group starting at source[i] == '(' """
+    depth = 0
+    j = i
+    while True:
+        char = source[j]
+        if char == '\\':
+            j += 2
+            continue
+        if char == '[':
+            j = _skip_class(source, j)
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+
+
+def _tokenize(source: str) -> list[tuple[str, str, str]]:
+    """
+    Split a pattern into top-level (kind, text, quantifier) tokens, where kind is
+    'literal' (a single character), 'group' (a plain or named group, text is its body), '|' or 'other'.
+    """
+    tokens = []
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            escaped = source[i + 1]
+            kind, text, i = ('other', escaped, i + 2) if escaped.isalnum() else ('literal', escaped, i + 2)
+        elif char == '[':
+            kind, text, i = 'other', '', _skip_class(source, i)
+        elif char == '(':
+            end = _skip_group(source, i)
+            body = source[i + 1:end - 1]
+            if body.startswith('?:'):
+                kind, text = 'group', body[2:]
+            elif body.startswith('?P<'):
+                kind, text = 'group', body[body.index('>') + 1:]
+            elif body.startswith('?'):
+                kind, text = 'other', ''
+            else:
+                kind, text = 'group', body
+            i = end
+        elif char == '|':
+            kind, text, i = '|', '', i + 1
+        elif char in '.^$':
+            kind, text, i = 'other', '', i + 1
+        else:
+            kind, text, i = 'literal', char, i + 1
+
+        quantifier = ''
+        if kind != '|' and (match := re_quantifier.match(source, i)):
+            quantifier = match.group(0)
+            i = match.end()
+            # Lazy or possessive modifier
+            if i < len(source) and source[i] in '?+':
+                i += 1
+        tokens.append((kind, text, quantifier))
+    return tokens
+
+
+def _required_literals(source: str) -> frozenset[str] | None:
+    """
+    Find a set of literal strings such that every match of the pattern contains at least one of them,
+    preferring long ones. Returns None if no such set is apparent.
+    """
+    tokens = _tokenize(source)
+    if any(kind == '|' for kind, _, _ in tokens):
+        branches = [[]]
+        for token in tokens:
+            if token[0] == '|':
+                branches.append([])
+            else:
+                branches[-1].append(token)
+        result = set()
+        for branch in branches:
+            literals = _required_literals_sequence(branch)
+            if literals is None:
+                return None
+            result |= literals
+        return frozenset(result)
+    return _required_literals_sequence(tokens)
+
+
+def _required_literals_sequence(tokens: list[tuple[str, str, str]]) -> frozenset[str] | None:
+    candidates = []
+    run = ''
+    for kind, text, quantifier in tokens:
+        if kind == 'literal' and quantifier == '':
+            run += text
+            continue
+
+        if run:
+            candidates.append(frozenset([run]))
+        run = ''
+        if kind == 'group' and quantifier in ['', '+']:
+            if (literals := _required_literals(text)) is not None:
+                candidates.append(literals)
+    if run:
+        candidates.append(frozenset([run]))
+
+    return max(candidates, key=lambda literals: min(map(len, literals)), default=None)
+
+
+def _prefilter_source(regex: re.Pattern) -> str | None:
+    """
+    Rewrite a pattern so that it can be embedded in an alternation with others: named groups become plain groups
+    (names may repeat across patterns) and flags become a scoped group. Returns None if this is not possible,
+    namely for patterns with backreferences, whose group numbers would shift.
+    """
+    source = regex.pattern
+    out = []
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char == '\\':
+            if source[i + 1].isdigit() and source[i + 1] != '0':
+                return None
+            out.append(source[i:i + 2])
+            i += 2
+        elif char == '[':
+            end = _skip_class(source, i)
+            out.append(source[i:end])
+            i = end
+        elif source.startswith('(?P=', i) or source.startswith('(?(', i):
+            return None
+        elif source.startswith('(?P<', i):
+            i = source.index('>', i) + 1
+            out.append('(')
+        else:
+            out.append(char)
+            i += 1
+
+    if regex.flags & ~(re.IGNORECASE | re.MULTILINE | re.DOTALL | re.UNICODE):
+        return None
+    flags = ''.join(letter for flag, letter in [(re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's')]
+                    if regex.flags & flag)
+    return f"(?{flags}:{''.join(out)})" if flags else ''.join(out)
+
+
+class RegexTable:
+    """
+    An ordered table of RegexReplacements or RegexFailures, compiled once into a combined prefilter.
+    Lines that no rule can match are rejected cheaply and returned untouched;
+    all other lines go through the rules in order, exactly as if they were applied one by one.
+
+    The prefilter is a set of literal triggers (every match of some rule contains one of them) if they can be found
+    for all rules, otherwise a single alternation of all patterns, otherwise nothing.
+    """
+    def __init__(self, rules):
+        self.rules = tuple(rules)
+        self.triggers = None
+        self.prefilter = None
+
+        literals = [None if rule.pattern.flags & (re.IGNORECASE | re.VERBOSE) else _required_literals(rule.pattern.pattern)
+                    for rule in self.rules]
+        if None not in literals:
+            triggers = set().union(*literals)
+            # A trigger containing another one is redundant
+            self.triggers = tuple(sorted(
+                trigger for trigger in triggers
+                if not any(other != trigger and other in trigger for other in triggers)
+            ))
+            return
+
+        sources = [_prefilter_source(rule.pattern) for rule in self.rules]
+        if None not in sources:
+            try:
+                self.prefilter = re.compile('|'.join(sources))
+            except re.error:
+                pass
+
+    def __iter__(self):
+        return iter(self.rules)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __repr__(self):
+        return f"RegexTable({list(self.rules)!r})"
+
+    def may_match(self, line: str) -> bool:
+        if self.triggers is not None:
+            for trigger in self.triggers:
+                if trigger in line:
+                    return True
+            return False
+        return self.prefilter is None or self.prefilter.search(line) is not None
+
+    def process(self, line: str, profile: dict | None = None) -> str:
+        """ Apply all replacements in order. If given, count firings and time of each rule in `profile`. """
+        if self.may_match(line):
+            if profile is not None:
+                return self._process_profiled(line, profile)
+            for rule in self.rules:
+                line = rule.pattern.sub(rule.repl, line)
+        return line
+
+    def check(self, line: str, profile: dict | None = None) -> str:
+        """ Raise an Exception with the error of the first failure that matches """
+        if self.may_match(line):
+            if profile is not None:
+                return self._check_profiled(line, profile)
+            for rule in self.rules:
+                if rule.pattern.search(line):
+                    raise Exception(rule.error)
+        return line
+
+    @staticmethod
+    def rule_name(rule) -> str:
+        return getattr(rule, 'purpose', '') or getattr(rule, 'error', '') or rule.pattern.pattern
+
+    def _process_profiled(self, line: str, profile: dict) -> str:
+        for rule in self.rules:
+            start = time.perf_counter()
+            line, count = rule.pattern.subn(rule.repl, line)
+            stats = profile[self.rule_name(rule)]
+            stats[0] += count
+            stats[1] += time.perf_counter() - start
+        return line
+
+    def _check_profiled(self, line: str, profile: dict) -> str:
+        for rule in self.rules:
+            start = time.perf_counter()
+            match = rule.pattern.search(line)
+            stats = profile[self.rule_name(rule)]
+            stats[0] += match is not None
+            stats[1] += time.perf_counter() - start
+            if match:
+                raise Exception(rule.error)
+        return line
@@ -1,23 +1,110 @@
 import abc
 import copy
+import functools
+import os
 import pprint
 
-import yaml
 from pathlib import Path
 from abc import ABCMeta, abstractmethod
-from enschema import Schema, SchemaMissingKeyError, SchemaError, And
+from enschema import Schema, SchemaMissingKeyError, SchemaError, And, Optional
 from typing import Any, Self, ClassVar
 
+from core.builder.cache import MetadataCache
 from core.utilities import colour as c, crawler, logger
+from core.utilities.frozen import FrozenDict, FrozenList, freeze, thaw
+from core.utilities.schema import compiled
 
 log = logger.setupLog('dgs')
 
+# Parsed meta.yaml files, shared by all contexts of the process
+metadata = MetadataCache()
+
+# What is validated when contexts are built:
+#   full: every context validates its own data, and the data of every child is validated exactly once
+#   root: only the buildable root context validates its own data, children are trusted
+#   off:  nothing is validated, not even the file system structure of the repository
+validation_levels = ['full', 'root', 'off']
+
+
+class ContextRegistry:
+    """
+    Identity map of file system contexts: every node of the hierarchy is populated and validated only once per process,
+    and every construction with the same class, root, path and keyword arguments gets a copy of it.
+    Contexts built from unhashable arguments (such as other contexts) are not shared.
+    """
+    def __init__(self):
+        self.contexts: dict[tuple, 'FileSystemContext'] = {}
+        self.built = 0
+        self.saved = 0
+        # Validation level of contexts built from now on, contexts built at other levels are not shared
+        self.validation = 'full'
+
+    def __str__(self):
+        return f"<{self.__class__.__name__}: {self.built} contexts built, {self.saved} constructions saved>"
+
+    def construct(self, cls, root, path: tuple, kwargs: dict, build) -> 'FileSystemContext':
+        try:
+            key = (cls, os.path.abspath(root), path, frozenset(kwargs.items()), self.validation)
+            found = self.contexts.get(key)
+        except TypeError:
+            key, found = None, None
+
+        if found is None:
+            found = build()
+            self.built += 1
+            if key is None:
+                return found
+            self.contexts[key] = found
+        else:
+            self.saved += 1
+            log.debug(f"Reusing {c.name(cls.__name__)} {c.path(found.id)}")
+        return found.copy()
+
+    def clear(self) -> None:
+        """ Forget all contexts, for long-running processes whose source files change """
+        self.contexts.clear()
+        self.built = 0
+        self.saved = 0
+        self.validation = 'full'
+
+
+registry = ContextRegistry()
+
+# Schemas without the keys of adopted children, by the identity of the schema and the keys
+_own_schemas: dict[tuple[int, frozenset[str]], tuple[Schema, Schema]] = {}
+
+
+def own_schema(schema: Schema, keys: frozenset[str]) -> Schema:
+    """ The part of `schema` that does not describe the children under `keys`, derived once per schema """
+    if not keys or not isinstance(schema.schema, dict):
+        return schema
+
+    found = _own_schemas.get((id(schema), keys))
+    if found is None or found[0] is not schema:
+        def own(key) -> bool:
+            raw = key.schema if isinstance(key, Optional) else key
+            return not (isinstance(raw, str) and raw in keys)
+
+        found = _own_schemas[id(schema), keys] = (
+            schema,
+            Schema({key: value for key, value in schema.schema.items() if own(key)},
+                   ignore_extra_keys=schema.ignore_extra_keys),
+        )
+    return found[1]
+
+
+@functools.cache
+def frozen_defaults(cls) -> FrozenDict:
+    """ Defaults of a context class, shared by all its instances """
+    return freeze(cls.defaults)
+
 
 class Context(metaclass=ABCMeta):
     defaults = {}                  # Defaults for every instance
     _schema: Schema | None = None  # Validation schema for the context, or None if it is not to be validated
     _id: str = None
     _data: dict[str, Any] = None
+    _validated: bool = False       # Whether the data has been validated against the schema
 
     @property
     def schema(self) -> Schema:
@@ -40,7 +127,9 @@ class Context(metaclass=ABCMeta):
 
     def __init__(self, new_id=None, **defaults):
         self._id = new_id
-        self._data = copy.deepcopy(self.defaults)
+        self._data = dict(frozen_defaults(self.__class__))
+        # Keys of adopted children, whose data is validated by their own schemas, never by ours
+        self._children: set[str] = set()
 
         if defaults is not None:
             self.add(**defaults)
@@ -56,19 +145,32 @@ class Context(metaclass=ABCMeta):
 
     def validate(self) -> None:
         """
-        Validate the data against the schema, if provided
+        Validate the data against the schema, if provided. The data of adopted children is left to their own schemas.
         """
         if self._schema is None:
             log.warning(f"No validation schema defined for {self.__class__.__name__}, skipping validation")
         else:
-            try:
-                self._schema.validate(self.data)
-            except SchemaError as exc:
-                log.error(f"Failed to validate {c.name(self.__class__.__name__)} at {c.path(self.id)}")
-                pprint.pprint(self.data)
-                log.error("against")
-                pprint.pprint(self._schema.schema)
-                raise exc
+            schema = own_schema(self._schema, frozenset(self._children))
+            data = {key: value for key, value in self.data.items() if key not in self._children}
+            # The compiled check is fast, but only the schema itself can tell what is wrong
+            if not compiled(schema)(data):
+                try:
+                    schema.validate(thaw(data))
+                except SchemaError as exc:
+                    log.error(f"Failed to validate {c.name(self.__class__.__name__)} at {c.path(self.id)}")
+                    pprint.pprint(data)
+                    log.error("against")
+                    pprint.pprint(schema.schema)
+                    raise exc
+        self._validated = True
+
+    def _adopt_children(self, key: str, ctxs: list['Context']) -> None:
+        """ Register `key` as holding the data of children `ctxs`, validating those that have not done so yet """
+        if registry.validation == 'full':
+            for ctx in ctxs:
+                if not ctx._validated and ctx._schema is not None:
+                    ctx.validate()
+        self._children.add(key)
 
     def add(self, **kwargs):
         """ Merge extra key-value pairs into this context, overwriting existing keys """
@@ -80,16 +182,9 @@ class Context(metaclass=ABCMeta):
         for key, ctx in ctxs.items():
             assert isinstance(ctx, Context)
 
-            if key in self.data:
-                self.data[key] |= ctx.data
-            else:
-                self.data[key] = copy.deepcopy(ctx.data)
-
-            if self._schema is not None:
-                # If child has no schema, accept anything, otherwise merge
-                self._schema |= Schema(
-                    {key: {object: object} if ctx._schema is None else ctx._schema}
-                )
+            shared = ctx.shared()
+            self.data[key] = freeze(self.data[key]) | shared if key in self.data else shared
+            self._adopt_children(key, [ctx])
         return self
 
     def override(self, key, new_value):
@@ -112,22 +207,48 @@ class Context(metaclass=ABCMeta):
         if not isinstance(other, Context):
             return NotImplemented
         else:
-            self._data |= other.data
+            self._data |= other.shared()
+            self._children |= other._children
 
             if self.schema is None or other.schema is None:
                 self._schema = None
             else:
-                self._schema |= other.schema
+                # Schemas may be shared with the class and other contexts, so they are never modified
+                self._schema = self._schema | other.schema
 
         return self
 
     def __or__(self, other):
-        new = copy.deepcopy(self)
+        new = self.copy()
         new |= other
         return new
 
+    def shared(self) -> FrozenDict:
+        """
+        The data as a frozen mapping, which other contexts include without copying it. The values are frozen
+        in this context too, so from now on they can only be replaced, not changed in place.
+        """
+        self._data = {key: freeze(value) for key, value in self._data.items()}
+        return FrozenDict(self._data)
+
+    def copy(self) -> Self:
+        """ A copy of this context whose keys can be set independently, sharing its values and schema """
+        new = copy.copy(self)
+        new._data = dict(self.shared())
+        new._children = set(self._children)
+        return new
+
+
+class FileSystemContextMeta(ABCMeta):
+    """ Constructs file system contexts through the registry """
+    def __call__(cls, root, *path, **kwargs):
+        def build():
+            return super(FileSystemContextMeta, cls).__call__(root, *path, **kwargs)
+
+        return registry.construct(cls, root, path, kwargs, build)
 
-class FileSystemContext(Context, metaclass=abc.ABCMeta):
+
+class FileSystemContext(Context, metaclass=FileSystemContextMeta):
     """
     Context that is reasonably mapped to a file system path, ideally inside a git repository.
     Typical traits are
@@ -143,7 +264,8 @@ class FileSystemContext(Context, metaclass=abc.ABCMeta):
         super().__init__(self.name(self.ident(*path)), **defaults)
         self.root = root
         self.populate(*path)
-        self.validate()
+        if registry.validation == 'full' or (registry.validation == 'root' and isinstance(self, BuildableContext)):
+            self.validate()
 
     @staticmethod
     def name(*path: Any) -> str:
@@ -168,10 +290,10 @@ class FileSystemContext(Context, metaclass=abc.ABCMeta):
         filename = Path(*args)
         log.debug(f"Loading {c.name(self.__class__.__name__)} metadata from {c.path(filename)}")
         try:
-            contents = yaml.load(open(filename, 'r'), Loader=yaml.SafeLoader)
+            contents = metadata.load(filename)
             self._data = {} if contents is None else contents
         except FileNotFoundError as e:
-            log.critical(c.err("[FATAL] Could not load YAML file"), c.path(filename))
+            log.critical(f"{c.err('[FATAL] Could not load YAML file')} {c.path(filename)}")
             raise e
 
         return self
@@ -189,11 +311,8 @@ class FileSystemContext(Context, metaclass=abc.ABCMeta):
         """ Fill the context with data from the filesystem """
 
     def add_list(self, key, ctxs):
-        self.data[key] = [item.data for item in ctxs]
-
-        if self.__class__._schema is not None:
-            self.__class__._schema.schema[key] = [self._subcontext_class._schema]
-
+        self.data[key] = FrozenList(item.shared() for item in ctxs)
+        self._adopt_children(key, ctxs)
         return self
 
     def add_subdirs(self, *subcontext_args):
@@ -217,12 +336,19 @@ class BuildableContext(Context):
     def populate(self, *args, **kwargs):
         pass
 
+    def refresh(self) -> None:
+        """
+        Update the data that may change without any change in the source tree, such as the build info.
+        Called by the daemon of `make serve` before every build that reuses this context.
+        """
+
 
 class BuildableFileSystemContext(FileSystemContext, BuildableContext, metaclass=abc.ABCMeta):
     def __init__(self, root, *path, **defaults):
         super().__init__(root, *path, **defaults)
         # A filesystem context needs to validate its repository upon creation
-        self.validate_repo(*path)
+        if registry.validation != 'off':
+            self.validate_repo(*path)
 
 
 class ContextModule(Context):
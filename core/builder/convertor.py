@@ -1,14 +1,127 @@
+import contextlib
+import functools
+import hashlib
+import io
+import os
+import re
+import shutil
 import subprocess
+import sys
 import tempfile
-from typing import Callable
+import threading
+import time
+from typing import IO, Callable
 from pathlib import Path
 
 from core.utilities import colour as c
-from .classes import RegexFailure, RegexReplacement
+from .cache import AstCache, ConversionCache
+from .classes import CheckFailure, RegexFailure, RegexReplacement, RegexTable
+from .highlight import HighlightCache
+from .mathcache import MathCache
+from .profiler import Profiler
 from core import i18n
 
 
+# pandoc-include statements: `!include`, `$include` or `!include-header`, optionally with arguments and quoted names
+re_include = re.compile(r"^\\?[!$]include(-header)?(`[^`]+`)?\s+((?P<name>[^`'\"\s][^`'\"]*?)|(?P<quote>[`'\"])(?P<quoted>.+)(?P=quote))\s*$")
+
+
+def included_files(text: str, directory: Path, *, seen: frozenset = frozenset()) -> list[Path]:
+    """
+        Find all files pulled in by pandoc-include statements in `text`, recursively.
+        Names are resolved (and globbed) relative to `directory`, as pandoc-include does.
+    """
+    result = []
+    for line in text.splitlines():
+        if (match := re_include.match(line)) is None:
+            continue
+
+        name = match.group('name') or match.group('quoted')
+        for path in sorted(Path(directory).glob(name)) if any(ch in name for ch in '*?[') else [Path(directory, name)]:
+            if not path.is_file() or path in seen or path in result:
+                continue
+
+            result.append(path)
+            result += [sub for sub in included_files(path.read_text(), path.parent, seen=seen | {path})
+                       if sub not in result]
+    return result
+
+
+# What pandoc-crossref names in the language of the locale: references ("rovnica 2") and captions ("Obrázok 1: ...")
+re_crossref = re.compile(r"@(fig|tbl|eq|lst|sec):|#(fig|tbl|lst):")
+
+
+# Markdown images `![caption](path)`, optionally with the path in angle brackets or followed by a title
+re_image = re.compile(r"!\[[^\]]*\]\(\s*(<(?P<bracketed>[^>]+)>|(?P<path>[^)\s]+))")
+
+
+def referenced_images(text: str, directory: Path) -> list[Path]:
+    """ Find all local image files referenced by Markdown images in `text`, relative to `directory` """
+    result = []
+    for match in re_image.finditer(text):
+        name = match.group('bracketed') or match.group('path')
+        path = Path(directory, name)
+        if '://' not in name and path.is_file() and path not in result:
+            result.append(path)
+    return result
+
+
+def depfile_escape(path) -> str:
+    return str(path).replace('$', '$$').replace('#', '\\#').replace(' ', '\\ ')
+
+
+@functools.cache
+def tool_fingerprint() -> tuple:
+    """
+        Identify the installed pandoc and filter executables by path, size and modification time.
+        This is much cheaper than asking each of them for its version, and changes on every upgrade.
+    """
+    result = []
+    for tool in ['pandoc', 'pandoc-crossref', *Convertor.python_filters]:
+        if (path := shutil.which(tool)) is None:
+            result.append((tool, None))
+        else:
+            info = Path(path).resolve().stat()
+            result.append((tool, path, info.st_size, info.st_mtime_ns))
+    return tuple(result)
+
+
+@functools.cache
+def pandoc_version() -> tuple[int, ...] | None:
+    """ The version of the installed pandoc, None if it cannot be found out """
+    try:
+        output = subprocess.run(['pandoc', '--version'], capture_output=True, encoding='utf-8', check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    match = re.match(r'pandoc(?:\.exe)? (\d+(?:\.\d+)*)', output)
+    return None if match is None else tuple(map(int, match.group(1).split('.')))
+
+
+@functools.cache
+def warn_old_pandoc(fallback: str) -> None:
+    """ Tell once per process that pandoc is too old for our Lua filters, and what is done instead """
+    version = '.'.join(map(str, pandoc_version()))
+    minimum = '.'.join(map(str, Convertor.lua_pandoc))
+    print(f"{c.path(__file__)}: {c.err(f'pandoc {version} is older than {minimum}')}, {fallback}")
+
+
 class Convertor:
+    # Make depfiles of build/x.tex are written to build/.deps/build/x.tex.d, keeping them out of output/
+    default_depfiles = Path('build', '.deps')
+
+    # Longest output line accepted from pandoc by the asyncio streams
+    line_limit = 2 ** 24
+
+    # External Python filters replaced by the Lua filters in core/filters, still available for comparison
+    # and used with older pandoc
+    python_filters = ['pandoc-eqnos', 'pandoc-include', 'pandoc-minted']
+
+    # Oldest pandoc our Lua filters run with (pandoc.utils.type, Pandoc:walk, pandoc.read and pandoc.write)
+    lua_pandoc = (2, 17)
+
+    # Formulas core/filters/svgmath.lua has left to the HTML math method, as TeX failed to render them
+    re_unrendered_math = re.compile(r'<span class="math (inline|display)">')
+
     post_regexes = {
         'all': [],
         'latex': [
@@ -111,44 +224,141 @@ class Convertor:
         self.infile = infile
         self.outfile = outfile
         self.math = options.get('math', 'mathjax')
+        if self.math == 'svg' and not self.lua_supported():
+            warn_old_pandoc("formulas are left to MathJax instead of being rendered to SVG")
+            self.math = 'mathjax'
+        # Directory of formulas pre-rendered to SVG for `math='svg'`, shared by all conversions
+        self.math_cache = Path(options.get('math_cache') or MathCache.default_directory)
+        # Directory of code blocks highlighted for LaTeX instead of by minted, shared by all conversions, or None
+        self.highlight_cache: Path | None = options.get('highlight_cache')
+        # Run eqnos, include and minted as Lua filters inside pandoc, or as the original Python filter processes
+        self.filters: str = options.get('filters', 'lua')
+        if 'filters' not in options and not self.lua_supported():
+            warn_old_pandoc(f"running the Python filters {', '.join(self.python_filters)} instead")
+            self.filters = 'python'
+        # Stream the input through pandoc instead of buffering every stage in a temporary file
+        self.stream: bool = options.get('stream', True)
+        self.directory = Path(getattr(infile, 'name', '.')).parent
         self.file = None
 
+        # Content-addressed cache of results, None if disabled
+        self.cache: ConversionCache | None = options.get('cache')
+        self.key: str | None = None
+        self.cache_hit: bool | None = None
+        self.pandoc_returncode: int | None = None
+
+        # Stored pandoc ASTs of prepared inputs, and the one we render from instead of parsing, if found
+        self.asts: AstCache | None = options.get('asts')
+        self.ast: Path | None = None
+
+        # Further {format: outfile} to convert the same input to, rendered from the same parse whenever possible
+        self.others: dict[str, Convertor] = {
+            other_format: Convertor(other_format, locale_code, infile, other_outfile,
+                                    **{**options, 'other_outputs': {}})
+            for other_format, other_outfile in options.get('other_outputs', {}).items()
+        }
+        # Other convertors rendered by our pandoc run, and the temporary files they are rendered to
+        self.rendered: dict[Convertor, Path] = {}
+        # Other convertors that have to be run on their own
+        self.separate: list[Convertor] = []
+
+        # Root of the tree of make depfiles, one for every named output file, None if disabled
+        self.depfiles: Path | None = options.get('depfiles')
+        # Further make targets depending on the same files, such as the stamp of a batch conversion
+        self.depfile_targets: list[str] = options.get('depfile_targets', [])
+
+        # Timing of stages and rules, appended to this JSON lines file, if given
+        profile = options.get('profile')
+        self.profiler: Profiler | None = None if profile is None else Profiler(profile)
+
         assert output_format in ['html', 'latex'], "Output format is neither 'html' nor 'latex'"
+        assert self.filters in ['lua', 'python'], "Filters are neither 'lua' nor 'python'"
+        assert self.math in ['mathjax', 'webtex', 'svg', 'mathml'], \
+            "Math is neither 'mathjax', 'webtex', 'svg' nor 'mathml'"
+        assert output_format not in self.others, "Other outputs repeat the output format"
 
         # regexes = yaml.safe_load(open('core/builder/regexes.yaml', 'rb'))
 
         (self.quote_open, self.quote_close) = self.locale.quotes
 
-        self.quotes_regexes = [
-            RegexReplacement(r'"(_)', self.quote_close + r'\g<1>'),
-            RegexReplacement(r'"(\b)', self.quote_open + r'\g<1>'),
-            RegexReplacement(r'(\b)"', r'\g<1>' + self.quote_close),
-            RegexReplacement(r'(\S)"', r'\g<1>' + self.quote_close),
-            RegexReplacement(r'"(\S)', self.quote_open + r'\g<1>'),
-        ]
+        rules = self.rule_set(output_format, locale_code)
+        self.quotes_regexes = rules['quotes']
+        self.pre_checks = rules['pre_checks']
+        self.pre_regexes = rules['pre_regexes']
+        self.post_checks = rules['post_checks']
+        self.post_regexes = rules['post_regexes']
 
-        self.pre_regexes['all'] += [
-            # Currently nothing
-        ]
+    @classmethod
+    @functools.cache
+    def rule_set(cls, output_format: str, locale_code: str) -> dict[str, RegexTable]:
+        """
+            Build all regex tables for a (format, locale) pair. Cached, so that batch conversions
+            compile every rule set only once per process.
+        """
+        quote_open, quote_close = i18n.languages[locale_code].quotes
 
-        self.pre_checks = self._filter_regexes(self.pre_checks)
-        self.pre_regexes = self._filter_regexes(self.pre_regexes)
-        self.post_checks = self._filter_regexes(self.post_checks)
-        self.post_regexes = self._filter_regexes(self.post_regexes)
+        return {
+            'quotes': RegexTable([
+                RegexReplacement(r'"(_)', quote_close + r'\g<1>'),
+                RegexReplacement(r'"(\b)', quote_open + r'\g<1>'),
+                RegexReplacement(r'(\b)"', r'\g<1>' + quote_close),
+                RegexReplacement(r'(\S)"', r'\g<1>' + quote_close),
+                RegexReplacement(r'"(\S)', quote_open + r'\g<1>'),
+            ]),
+            'pre_checks': RegexTable(cls._filter_regexes(cls.pre_checks, output_format)),
+            'pre_regexes': RegexTable(cls._filter_regexes(cls.pre_regexes, output_format)),
+            'post_checks': RegexTable(cls._filter_regexes(cls.post_checks, output_format)),
+            'post_regexes': RegexTable(cls._filter_regexes(cls.post_regexes, output_format)),
+        }
 
-    def _filter_regexes(self, regex_set: dict[str, list]) -> list:
-        return regex_set['all'] + regex_set[self.output_format]
+    @staticmethod
+    def _filter_regexes(regex_set: dict[str, list], output_format: str) -> list:
+        return regex_set['all'] + regex_set[output_format]
 
     def run(self):
+        with self.reported():
+            text, source, shared = self.begin()
+            if not self.cache_hit:
+                with self.rendering(shared):
+                    self.convert(source, self.key)
+
+            code = None if self.pandoc_failed() else 0
+            for other in self.separate:
+                if other.run_text(text) != 0:
+                    code = None
+            return code
+
+    async def run_async(self):
+        """ Same as `run`, but talking to pandoc through asyncio, so that many conversions can share one thread """
+        with self.reported():
+            text, source, shared = self.begin()
+            if not self.cache_hit:
+                with self.rendering(shared):
+                    await self.convert_async(source, self.key)
+
+            code = None if self.pandoc_failed() else 0
+            for other in self.separate:
+                if await other.run_text_async(text) != 0:
+                    code = None
+            return code
+
+    def pandoc_failed(self) -> bool:
+        """ Report if our pandoc run has failed. Its output is incomplete and was not cached, so the conversion fails """
+        if self.cache_hit or self.pandoc_returncode == 0:
+            return False
+        print(f"{c.path(getattr(self.infile, 'name', '<stdin>'))}: "
+              f"{c.err(f'pandoc failed with code {self.pandoc_returncode}')}")
+        return True
+
+    @contextlib.contextmanager
+    def reported(self):
+        """ Report failures of a conversion (it then returns None) and append its profile """
+        self.separate = []
         try:
-            # fm, tm = frontmatter.parse(self.infile.read())
-            # self.infile.seek(0)
-            self.file = self.file_operation(self.pre_check)(self.infile)
-            self.file = self.file_operation(self.preprocess)(self.file)
-            self.file = self.call_pandoc()
-            self.file = self.file_operation(self.postprocess)(self.file)
-            self.file = self.file_operation(self.post_check)(self.file)
-            self.write()
+            yield
+        except CheckFailure as e:
+            print(f"{c.path(getattr(self.infile, 'name', '<stdin>'))}: {c.err(e.error)} "
+                  f"on {e.stage} line {c.num(e.number)}: {e.line.rstrip()}")
         except IOError as e:
             print(f"{c.path(__file__)}: Could not create a temporary file: {e}")
         except AssertionError as e:
@@ -156,8 +366,217 @@ class Convertor:
         except Exception as e:
             print("Unexpected exception occurred:")
             raise e
+        finally:
+            self.report()
+            # Others converted separately have reported from their own run
+            for other in self.others.values():
+                if other not in self.separate:
+                    other.report()
+
+    def begin(self) -> tuple[str | None, IO, list['Convertor']]:
+        """
+            Read the input and look up the cache for all formats. Return the text (if it had to be read),
+            the source to convert, and the other formats that can be rendered from our own parse.
+            Other formats that still have to be converted on their own are left in `self.separate`.
+        """
+        # fm, tm = frontmatter.parse(self.infile.read())
+        # self.infile.seek(0)
+        text = None
+        source = self.infile
+        if self.cache is not None or self.others or self.depfiles is not None or self.asts is not None:
+            text = self.infile.read()
+            source = io.StringIO(text)
+
+        if self.cache_hit is None:
+            self.fetch_cached(text)
+
+        # Other formats are rendered from our own parse if pandoc would be fed the same input for them
+        pending = [other for other in self.others.values() if not other.fetch_cached(text)]
+        shared = [] if self.cache_hit else [other for other in pending if self.shares_input(other, text)]
+        self.separate = [other for other in pending if other not in shared]
+        if self.asts is not None and not self.cache_hit:
+            self.find_ast(text)
+
+        for convertor in [self, *(other for other in self.others.values() if other not in self.separate)]:
+            convertor.write_depfile(text)
+        return text, source, shared
+
+    def find_ast(self, text: str) -> None:
+        """ Look up the AST of our prepared input, as stored by markdown-check, so that pandoc need not parse it """
+        with self.stage('ast'):
+            if (prepared := self.prepared(text)) is not None:
+                self.ast = self.asts.lookup(prepared)
+
+    def dependencies(self, text: str) -> list[Path]:
+        """ All files the output depends on besides the input: included files and local images """
+        included = included_files(text, self.directory)
+        result = included + [image for image in referenced_images(text, self.directory) if image not in included]
+        for path in included:
+            if path.suffix == '.md':
+                # Included documents are not rewritten, so their images are relative to our directory too
+                result += [image for image in referenced_images(path.read_text(), self.directory)
+                           if image not in result]
+        return result
+
+    def depfile_path(self) -> Path | None:
+        name = getattr(self.outfile, 'name', None)
+        if self.depfiles is None or not isinstance(name, str) or name.startswith('<'):
+            return None
+        target = Path(name)
+        return Path(self.depfiles, target.relative_to(target.anchor) if target.is_absolute() else target) \
+            .with_name(f'{target.name}.d')
+
+    def write_depfile(self, text: str) -> None:
+        """
+            Write a make depfile listing the dependencies of the output file, with an empty rule for each of them,
+            so that make does not fail when one is deleted. Written atomically, as make may read it at any time.
+        """
+        if (path := self.depfile_path()) is None:
+            return
+
+        targets = [depfile_escape(target) for target in [self.outfile.name, *self.depfile_targets]]
+        dependencies = [depfile_escape(dependency) for dependency in self.dependencies(text)]
+        content = f"{' '.join(targets)}:{''.join(f' {dep}' for dep in dependencies)}\n"
+        content += ''.join(f"{dep}:\n" for dep in dependencies)
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, temporary = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as out:
+            out.write(content)
+        os.replace(temporary, path)
+
+    @contextlib.contextmanager
+    def rendering(self, shared: list['Convertor']):
+        """ Render `shared` from our pandoc run into temporary files, and finish them once it has succeeded """
+        with tempfile.TemporaryDirectory() if shared else contextlib.nullcontext() as directory:
+            self.rendered = {other: Path(directory, f'render.{other.output_format}') for other in shared}
+            yield
+            if self.pandoc_returncode == 0:
+                for other, path in self.rendered.items():
+                    other.write_rendered(path)
+
+    def convert(self, source, key: str | None) -> None:
+        """ Convert `source` (or our stored AST) to the output file and the cache under `key`, streamed or buffered """
+        if self.ast is not None:
+            # The input has already been checked and prepared when looking up the AST
+            with open(self.ast) as ast, self.stage('call_pandoc'):
+                self.file = ast
+                self.file = self.call_pandoc()
+        elif self.stream:
+            self.run_stream(source, key)
+            return
         else:
-            return 0
+            self.file = self.file_operation(self.timed('pre_check', self.pre_check))(source)
+            self.file = self.file_operation(self.timed('preprocess', self.preprocess))(self.file)
+            with self.stage('call_pandoc'):
+                self.file = self.call_pandoc()
+        self.file = self.file_operation(self.timed('postprocess', self.postprocess))(self.file)
+        self.file = self.file_operation(self.timed('post_check', self.post_check))(self.file)
+        if key is not None and self.cacheable():
+            self.cache.store(key, self.file)
+        with self.stage('write'):
+            self.write()
+
+    async def convert_async(self, source, key: str | None) -> None:
+        """ Same as `convert`, with pandoc run as an asyncio subprocess """
+        if self.ast is not None:
+            with open(self.ast) as ast, self.stage('call_pandoc'):
+                self.file = ast
+                self.file = await self.call_pandoc_async()
+        elif self.stream:
+            await self.run_stream_async(source, key)
+            return
+        else:
+            self.file = self.file_operation(self.timed('pre_check', self.pre_check))(source)
+            self.file = self.file_operation(self.timed('preprocess', self.preprocess))(self.file)
+            with self.stage('call_pandoc'):
+                self.file = await self.call_pandoc_async()
+        self.file = self.file_operation(self.timed('postprocess', self.postprocess))(self.file)
+        self.file = self.file_operation(self.timed('post_check', self.post_check))(self.file)
+        if key is not None and self.cacheable():
+            self.cache.store(key, self.file)
+        with self.stage('write'):
+            self.write()
+
+    def unrendered(self, line: str) -> bool:
+        """ Does an output line hold a formula that should have been rendered to SVG, but was not? """
+        return self.output_format == 'html' and self.math == 'svg' and self.re_unrendered_math.search(line) is not None
+
+    def cacheable(self) -> bool:
+        """
+        Can the buffered output be cached? Never from a failed pandoc run, nor with formulas left unrendered
+        by a TeX failure, which may be transient and would otherwise stay in the cache until it is wiped
+        """
+        if self.pandoc_returncode != 0:
+            return False
+        fallback = any(self.unrendered(line) for line in self.file)
+        self.file.seek(0)
+        return not fallback
+
+    def fetch_cached(self, text: str) -> bool:
+        """ Try to fill the output file from the cache, remembering the key for storing the result later """
+        if self.cache is None:
+            return False
+        with self.stage('cache'):
+            self.key = self.cache_key(text)
+            self.cache_hit = self.cache.fetch(self.key, self.outfile)
+        return self.cache_hit
+
+    def prepared(self, text: str) -> str | None:
+        """ The checked and preprocessed input as it would be fed to pandoc, or None if a check fails """
+        try:
+            return ''.join(self.pre_regexes.process(self.checked(self.pre_checks.check, line, number, 'input'))
+                           for number, line in enumerate(io.StringIO(text), 1))
+        except CheckFailure:
+            return None
+
+    @classmethod
+    def lua_supported(cls) -> bool:
+        """ Can pandoc run our Lua filters? If it cannot be found out, the conversion fails anyway. """
+        return (version := pandoc_version()) is None or version >= cls.lua_pandoc
+
+    def shares_input(self, other: 'Convertor', text: str) -> bool:
+        """ Can `other` be rendered from our parse of `text`? Only if pandoc would be fed exactly the same input """
+        if other.locale_code != self.locale_code or other.filters != self.filters or not self.lua_supported():
+            return False
+        with self.stage('share_check'):
+            return (mine := self.prepared(text)) is not None and mine == other.prepared(text)
+
+    def run_text(self, text: str):
+        """ Run the whole conversion on `text`, as read from our input file """
+        with self.reading(text):
+            return self.run()
+
+    async def run_text_async(self, text: str):
+        with self.reading(text):
+            return await self.run_async()
+
+    @contextlib.contextmanager
+    def reading(self, text: str):
+        """ Temporarily read `text` instead of the input file, keeping its name for messages """
+        infile = self.infile
+        try:
+            self.infile = io.StringIO(text)
+            self.infile.name = getattr(infile, 'name', '<stdin>')
+            yield
+        finally:
+            self.infile = infile
+
+    def write_rendered(self, path: Path) -> None:
+        """ Postprocess and check another format rendered from a shared parse, as `run_stream` does with its own """
+        post_check, postprocess = self.timed('post_check', self.post_check), self.timed('postprocess', self.postprocess)
+        write = self.timed('write', self.outfile.write)
+        copy = self.cache.writer(self.key) if self.key is not None else contextlib.nullcontext()
+        fallback = False
+        with open(path) as rendered, copy as copy:
+            for number, line in enumerate(rendered, 1):
+                line = self.checked(post_check, postprocess(line), number, 'output')
+                write(line)
+                if copy is not None:
+                    copy.write(line)
+                    fallback = fallback or self.unrendered(line)
+            if copy is not None and fallback:
+                raise self.cache.Discard
 
     @staticmethod
     def file_operation(function: Callable) -> Callable:
@@ -173,11 +592,135 @@ class Convertor:
 
         return inner
 
+    def run_stream(self, source, key: str | None) -> None:
+        """
+            Pipe the checked and preprocessed input into pandoc line by line from a feeder thread,
+            while postprocessing and checking its output as it arrives and writing it straight to the output file
+            (and to the cache). Only a few lines of the document are held in memory at any time.
+        """
+        pre_check, preprocess = self.timed('pre_check', self.pre_check), self.timed('preprocess', self.preprocess)
+        post_check, postprocess = self.timed('post_check', self.post_check), self.timed('postprocess', self.postprocess)
+        write = self.timed('write', self.outfile.write)
+
+        started = time.perf_counter()
+        process = subprocess.Popen(self.command(), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        failure = []
+
+        def feed():
+            try:
+                for number, line in enumerate(source, 1):
+                    process.stdin.write(preprocess(self.checked(pre_check, line, number, 'input')))
+            except CheckFailure as e:
+                failure.append(e)
+                process.kill()
+            except BrokenPipeError:
+                # pandoc has exited or has been killed, the main thread will find out
+                pass
+            finally:
+                try:
+                    process.stdin.close()
+                except BrokenPipeError:
+                    pass
+
+        feeder = threading.Thread(target=feed, daemon=True)
+        feeder.start()
+        fallback = False
+        try:
+            with self.cache.writer(key) if key is not None else contextlib.nullcontext() as copy:
+                for number, line in enumerate(process.stdout, 1):
+                    line = self.checked(post_check, postprocess(line), number, 'output')
+                    write(line)
+                    if copy is not None:
+                        copy.write(line)
+                        fallback = fallback or self.unrendered(line)
+
+                feeder.join()
+                self.pandoc_returncode = process.wait()
+                if self.profiler is not None:
+                    # pandoc runs concurrently with all other stages, so this is the wall time of the whole pipe
+                    self.profiler.stages['call_pandoc'] += time.perf_counter() - started
+                if failure:
+                    raise failure[0]
+                # Never cache output of a failed pandoc run, nor formulas left unrendered, as `cacheable` explains
+                if copy is not None and (self.pandoc_returncode != 0 or fallback):
+                    raise self.cache.Discard
+        finally:
+            if process.poll() is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+            feeder.join()
+
+    async def run_stream_async(self, source, key: str | None) -> None:
+        """ Same as `run_stream`, with pandoc run as an asyncio subprocess and fed by a task instead of a thread """
+        import asyncio
+
+        pre_check, preprocess = self.timed('pre_check', self.pre_check), self.timed('preprocess', self.preprocess)
+        post_check, postprocess = self.timed('post_check', self.post_check), self.timed('postprocess', self.postprocess)
+        write = self.timed('write', self.outfile.write)
+
+        started = time.perf_counter()
+        process = await asyncio.create_subprocess_exec(*self.command(), stdin=asyncio.subprocess.PIPE,
+                                                       stdout=asyncio.subprocess.PIPE, limit=self.line_limit)
+
+        async def feed():
+            try:
+                for number, line in enumerate(source, 1):
+                    process.stdin.write(preprocess(self.checked(pre_check, line, number, 'input')).encode('utf-8'))
+                    await process.stdin.drain()
+            except CheckFailure:
+                process.kill()
+                raise
+            except ConnectionError:
+                # pandoc has exited or has been killed, the main task will find out
+                pass
+            finally:
+                process.stdin.close()
+
+        feeder = asyncio.create_task(feed())
+        fallback = False
+        try:
+            with self.cache.writer(key) if key is not None else contextlib.nullcontext() as copy:
+                number = 0
+                async for line in process.stdout:
+                    number += 1
+                    line = self.checked(post_check, postprocess(line.decode('utf-8')), number, 'output')
+                    write(line)
+                    if copy is not None:
+                        copy.write(line)
+                        fallback = fallback or self.unrendered(line)
+
+                await feeder
+                self.pandoc_returncode = await process.wait()
+                if self.profiler is not None:
+                    self.profiler.stages['call_pandoc'] += time.perf_counter() - started
+                # Never cache output of a failed pandoc run, nor formulas left unrendered, as `cacheable` explains
+                if copy is not None and (self.pandoc_returncode != 0 or fallback):
+                    raise self.cache.Discard
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            if not feeder.done():
+                feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+
+    @staticmethod
+    def checked(check: Callable, line: str, number: int, stage: str) -> str:
+        """ Run a check stage on a single line, reporting the line if it fails """
+        try:
+            return check(line)
+        except CheckFailure:
+            raise
+        except Exception as e:
+            raise CheckFailure(str(e), number, line, stage=stage) from e
+
     def write(self):
         for line in self.file:
             self.outfile.write(line)
         self.file.seek(0)
 
+    # Reference implementation of the rule tables, applying every rule separately
     @staticmethod
     def process_line(line: str, regexes) -> str:
         for regex in regexes:
@@ -198,45 +741,243 @@ class Convertor:
         return line
 
     def preprocess(self, line):
-        # return self.chain_process(line, [self.pre_regexes, self.quotes_regexes]) # Turned off for quote testing!
-        return self.chain_process(line, [self.pre_regexes])
+        # return self.quotes_regexes.process(self.pre_regexes.process(line)) # Turned off for quote testing!
+        return self.pre_regexes.process(line, self.rule_profile('preprocess'))
 
     def postprocess(self, line):
-        return self.chain_process(line, [self.post_regexes])
+        return self.post_regexes.process(line, self.rule_profile('postprocess'))
 
     def pre_check(self, line):
-        return self.chain_process(line, [self.pre_checks], func=self.check_line)
+        return self.pre_checks.check(line, self.rule_profile('pre_check'))
 
     def post_check(self, line):
-        return self.chain_process(line, [self.post_checks], func=self.check_line)
+        return self.post_checks.check(line, self.rule_profile('post_check'))
 
-    def call_pandoc(self):
-        out = tempfile.SpooledTemporaryFile(mode='w+')
+    def rule_profile(self, stage: str) -> dict | None:
+        return None if self.profiler is None else self.profiler.rules[stage]
 
-        self.file.seek(0)
+    def timed(self, stage: str, function: Callable) -> Callable:
+        """ Count every call of `function` towards `stage` when profiling """
+        return function if self.profiler is None else self.profiler.timed(stage, function)
+
+    def stage(self, stage: str):
+        return contextlib.nullcontext() if self.profiler is None else self.profiler.stage(stage)
+
+    def report(self) -> None:
+        """ Append the profile of this conversion to the profile log """
+        if self.profiler is not None:
+            self.profiler.record(
+                file=getattr(self.infile, 'name', '<stdin>'),
+                format=self.output_format,
+                locale=self.locale_code,
+                mode='stream' if self.stream else 'buffered',
+                cache_hit=self.cache_hit,
+                ast=self.ast is not None,
+                returncode=self.pandoc_returncode,
+            )
+
+    def cache_key(self, text: str) -> str:
+        """
+            Hash everything the output depends on: the input, all included files, format, options, the locale
+            if it matters, the compiled regex tables, the pandoc command line and files it reads, and installed tools.
+            Not the directory of the input, so that translations symlinked to the same file share the key.
+        """
+        digest = hashlib.sha256()
+
+        def feed(item):
+            digest.update(item if isinstance(item, bytes) else repr(item).encode('utf-8'))
+            digest.update(b'\0')
+
+        feed(text.encode('utf-8'))
+        included = included_files(text, self.directory)
+        for path in included:
+            # Included files are found relative to the directory, so only their names within it reach the output
+            feed(os.path.relpath(path, self.directory))
+            feed(path.read_bytes())
+
+        # The locale only reaches the output through the names pandoc-crossref gives to figures, tables, ...,
+        # so all languages share one conversion of the same input when it has nothing to name.
+        # The quotes table is not applied, see `preprocess`.
+        feed((self.output_format, self.math))
+        feed({name: table for name, table in self.rule_set(self.output_format, self.locale_code).items()
+              if name != 'quotes'})
+        feed([arg for arg in self.pandoc_args(locale=False) if not arg.startswith('include-entry=')])
+        for path in [*sorted(Path('core', 'filters').glob('*.lua')), Path('core', 'latex', 'siunitx.tex')]:
+            feed(path.read_bytes())
+        if not self.locale_invariant(text, included):
+            path = Path('build', 'core', 'i18n', f'{self.locale_code}.yaml')
+            feed((self.locale.id, path.read_bytes() if path.is_file() else None))
+        feed(Path(__file__).read_bytes())
+        feed(tool_fingerprint())
+        return digest.hexdigest()
+
+    @staticmethod
+    def locale_invariant(text: str, included: list[Path]) -> bool:
+        """ Is the output the same for every locale, as the input and its included Markdown have nothing to name? """
+        texts = [text, *(path.read_text() for path in included if path.suffix == '.md')]
+        return not any(re_crossref.search(item) for item in texts)
+
+    def filter_chain(self) -> list[tuple[str, str]]:
+        """ The filters pandoc runs on the parsed document, in order, as ('json', program) or ('lua', path) """
+        chain = [('json', 'pandoc-crossref')]
+        for name in self.python_filters:
+            if self.filters == 'lua':
+                chain.append(('lua', f"./core/filters/{name.removeprefix('pandoc-')}.lua"))
+            else:
+                chain.append(('json', name))
+        if self.output_format == 'html' and self.math == 'svg':
+            chain.append(('lua', './core/filters/svgmath.lua'))
+        if self.output_format == 'html' and self.math == 'mathml':
+            chain.append(('lua', './core/filters/siunitx.lua'))
+        return chain + [('lua', './core/filters/quotes.lua')]
+
+    def math_method(self) -> str | None:
+        """ HTML math rendering as 'method' or 'method:url', None for LaTeX. Also used for formulas not in SVG """
+        if self.output_format != 'html':
+            return None
+        if self.math == 'mathml':
+            return "mathml"
+        return "webtex:'eqn://'" if self.math == 'webtex' else "mathjax"
+
+    def filter_metadata(self) -> list[str]:
+        """
+        Metadata configuring the SVG math cache of core/filters/svgmath.lua, the number formatting
+        of siunitx.lua and the code cache of minted.lua
+        """
+        if self.output_format == 'html' and self.math == 'svg':
+            return [
+                "-M", f"svgmath-cache={self.math_cache}",
+                "-M", f"svgmath-salt={MathCache.salt(self.locale_code)}",
+                "-M", f"svgmath-locale={self.locale_code}",
+                "-M", f"svgmath-python={sys.executable}",
+            ]
+        if self.output_format == 'html' and self.math == 'mathml':
+            return [
+                "-M", f"siunitx-decimal-marker={self.locale.output_decimal_marker}",
+                "-M", f"siunitx-and={self.locale.andw}",
+            ]
+        if self.output_format == 'latex' and self.filters == 'lua' and self.highlight_cache is not None:
+            return [
+                "-M", f"highlight-cache={self.highlight_cache}",
+                "-M", f"highlight-salt={HighlightCache.salt()}",
+                "-M", f"highlight-python={sys.executable}",
+            ]
+        return []
+
+    def pandoc_args(self, *, locale: bool = True) -> list[str]:
+        """ The pandoc command line, without the arguments that depend on the locale unless `locale` """
         args = [
             "pandoc",
-            "--metadata", f"lang={self.locale.id}",
+            *(["--metadata", f"lang={self.locale.id}"] if locale else []),
             "-V", "csquotes=true",
-            "--from", "markdown+smart",
+            "--from", AstCache.reader if self.ast is None else "json",
             "--pdf-engine", "xelatex",
             "--to", self.output_format,
-            "--filter", "pandoc-crossref",
-            "-M", f"crossrefYaml=build/core/i18n/{self.locale_code}.yaml",
+            *(["-M", f"crossrefYaml=build/core/i18n/{self.locale_code}.yaml"] if locale else []),
             #"-M", "cref=true",
-            "--filter", "pandoc-eqnos",
-            "--filter", "pandoc-include",
-            "-M", f"include-entry={Path(self.infile.name).parent}/",
+            "-M", f"include-entry={self.directory}/",
             "-M", f"rewrite-path=false",
-            "--filter", "pandoc-minted",
-            "--lua-filter", "./core/filters/quotes.lua",
         ]
-        if self.output_format == 'html':
-            args += [
-                "--webtex='eqn://'" if self.math == 'webtex' else "--mathjax",
+        args += self.filter_metadata()
+        for kind, name in self.filter_chain():
+            args += ["--filter" if kind == 'json' else "--lua-filter", name]
+        if (method := self.math_method()) is not None:
+            method, _, url = method.partition(':')
+            args += [f"--{method}={url}" if url else f"--{method}"]
+        return args
+
+    def command(self) -> list[str]:
+        """
+            The pandoc command line, which also renders the convertors in `self.rendered` from the same parse.
+            The render filter must run first, before our own filters change the document.
+        """
+        args = self.pandoc_args()
+        render = []
+        for other, path in self.rendered.items():
+            render += [
+                "--lua-filter", "./core/filters/render.lua",
+                "-M", f"render-to={other.output_format}",
+                "-M", f"render-output={path}",
             ]
+            if (method := other.math_method()) is not None:
+                render += ["-M", f"render-math={method}"]
+            render += other.filter_metadata()
+            for kind, name in other.filter_chain():
+                render += ["-M", f"render-filter={kind}:{name}"]
+        return args[:1] + render + args[1:]
 
-        subprocess.run(args, stdin=self.file, stdout=out)
+    async def call_pandoc_async(self):
+        import asyncio
 
+        self.file.seek(0)
+        process = await asyncio.create_subprocess_exec(*self.command(), stdin=asyncio.subprocess.PIPE,
+                                                       stdout=asyncio.subprocess.PIPE)
+        output, _ = await process.communicate(self.file.read().encode('utf-8'))
+        self.pandoc_returncode = process.returncode
+
+        out = tempfile.SpooledTemporaryFile(mode='w+')
+        out.write(output.decode('utf-8'))
         out.seek(0)
         return out
+
+    def call_pandoc(self):
+        out = tempfile.SpooledTemporaryFile(mode='w+')
+
+        self.file.seek(0)
+        self.pandoc_returncode = subprocess.run(self.command(), stdin=self.file, stdout=out).returncode
+
+        out.seek(0)
+        return out
+
+
+@contextlib.contextmanager
+def file_convertor(output_format: str, locale_code: str, infile: str, outfile: str, **options):
+    """ A Convertor between files given by paths, with other outputs given as {format: path} in `other_outputs` """
+    paths = {output_format: outfile, **options.pop('other_outputs', {})}
+    for path in paths.values():
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with open(infile, 'r') as fin, contextlib.ExitStack() as stack:
+        outs = {fmt: stack.enter_context(open(path, 'w')) for fmt, path in paths.items()}
+        yield Convertor(output_format, locale_code, fin, outs.pop(output_format), other_outputs=outs, **options)
+
+
+def convert_file(output_format: str, locale_code: str, infile: str, outfile: str, **options) -> tuple[int, bool | None]:
+    """
+        Convert a single file given by path and return its exit code and whether it was a cache hit.
+        Used by the batch mode, which runs this in worker processes.
+    """
+    try:
+        with file_convertor(output_format, locale_code, infile, outfile, **options) as convertor:
+            return (0 if convertor.run() == 0 else 1), convertor.cache_hit
+    except Exception as e:
+        print(f"{c.path(infile)}: {c.err(e)}")
+        return 1, None
+
+
+async def convert_file_async(output_format: str, locale_code: str, infile: str, outfile: str,
+                             **options) -> tuple[int, bool | None]:
+    """ Same as `convert_file`, running pandoc as an asyncio subprocess """
+    try:
+        with file_convertor(output_format, locale_code, infile, outfile, **options) as convertor:
+            return (0 if await convertor.run_async() == 0 else 1), convertor.cache_hit
+    except Exception as e:
+        print(f"{c.path(infile)}: {c.err(e)}")
+        return 1, None
+
+
+async def convert_files(jobs, *, limit: int = os.cpu_count() or 1, **options) -> list[tuple[int, bool | None]]:
+    """
+        Convert many (format, locale, infile, outfile) jobs concurrently, with at most `limit` conversions at once.
+        Returns (exit code, cache hit) for each job in order; a failure is reported for its own file only
+        and does not cancel the others.
+    """
+    # Imported here, as single conversions run synchronously and most processes never need it
+    import asyncio
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def convert(job):
+        async with semaphore:
+            return await convert_file_async(*job, **options)
+
+    return await asyncio.gather(*(convert(job) for job in jobs))
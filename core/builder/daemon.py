@@ -0,0 +1,267 @@
+#!/usr/bin/env python
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import runpy
+import socket
+import socketserver
+import sys
+import traceback
+from pathlib import Path
+from typing import Any
+
+from core.builder import git
+from core.builder.context import BuildableContext, registry
+
+log = logging.getLogger('dgs')
+
+default_socket = Path('build', '.dgs.sock')
+
+# Files that do not belong to the source tree, but whose changes mean new commits for the build info
+git_files = [Path('.git', 'HEAD'), Path('.git', 'logs', 'HEAD')]
+
+# Builder modules the daemon runs, as named by `python -m` in the makefiles; it refuses to run anything else
+entry_points = frozenset({
+    'core.builder.i18n',
+    'modules.naboj.builder.language',
+    'modules.naboj.builder.venue',
+    'modules.naboj.builder.volume',
+    'modules.poetry.builder.author',
+    'modules.scholar.builder.course',
+    'modules.scholar.builder.handout',
+    'modules.scholar.builder.homework',
+    'modules.scholar.builder.lecture',
+    'modules.seminar.builder.invite',
+    'modules.seminar.builder.round',
+    'modules.seminar.builder.semester',
+    'modules.seminar.builder.volume',
+    'modules.simple.builder.lecture',
+})
+
+# The server, if this process is the daemon
+server: 'BuildServer | None' = None
+
+
+def _stamp(path: str, info: os.stat_result) -> bytes:
+    return f"{path}\0{info.st_size}\0{info.st_mtime_ns}\n".encode('utf-8', 'surrogateescape')
+
+
+def tree_fingerprint(root: Path, *, suffix: str | None = None) -> str:
+    """ Identify the state of all files under `root` (or only those with `suffix`) by their size and mtime """
+    digest = hashlib.sha1()
+
+    def scan(directory: str) -> None:
+        try:
+            entries = sorted(os.scandir(directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in ['.git', '__pycache__']:
+                    scan(entry.path)
+            elif suffix is None or entry.name.endswith(suffix):
+                digest.update(_stamp(entry.path, entry.stat()))
+
+    scan(str(root))
+    for name in git_files:
+        path = Path(root, name)
+        if path.is_file():
+            digest.update(_stamp(str(path), path.stat()))
+    return digest.hexdigest()
+
+
+def code_fingerprint() -> str:
+    """ Identify our own code, which the daemon cannot reload """
+    return hashlib.sha1(''.join(tree_fingerprint(Path(root), suffix='.py') for root in ['core', 'modules'])
+                        .encode('utf-8')).hexdigest()
+
+
+def context(cls, root, *ident: Any):
+    """
+    The root context of a builder. The daemon keeps them across builds, until anything under the source root changes,
+    and refreshes them before every build that reuses them (new commits in nested repositories, build timestamps).
+    Otherwise this is just `cls(root, *ident)`.
+    """
+    if server is None:
+        return cls(root, *ident)
+
+    key = (cls, os.path.abspath(root), ident, registry.validation)
+    fingerprint = tree_fingerprint(Path(root))
+    cached = server.contexts.get(key)
+    if cached is not None and cached[0] == fingerprint:
+        log.debug(f"Reusing the context {cached[1]} kept by the daemon")
+        if isinstance(cached[1], BuildableContext):
+            cached[1].refresh()
+        return cached[1]
+
+    result = cls(root, *ident)
+    server.contexts[key] = (fingerprint, result)
+    return result
+
+
+def request(module: str, argv: list[str], *, path: Path = default_socket) -> dict | None:
+    """
+    Ask the daemon listening at `path` to run the builder `module` with the command line `argv`.
+    Returns its response with the exit status and output, or None if the build has to run locally.
+    """
+    if server is not None or not hasattr(socket, 'AF_UNIX'):
+        return None
+
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(path))
+            client.sendall(json.dumps({'module': module, 'argv': argv, 'cwd': os.getcwd()}).encode('utf-8') + b'\n')
+            client.shutdown(socket.SHUT_WR)
+            with client.makefile('rb') as stream:
+                response = json.loads(stream.read() or 'null')
+    except (FileNotFoundError, ConnectionRefusedError, BlockingIOError, json.JSONDecodeError):
+        return None
+    return None if response is None or response.get('status') is None else response
+
+
+def forward(*, path: Path = default_socket) -> int | None:
+    """
+    Run the builder command line of this process by the daemon, if it is running.
+    Returns the exit status, or None if the build has to run locally.
+    """
+    spec = getattr(sys.modules['__main__'], '__spec__', None)
+    if spec is None:
+        return None
+
+    response = request(spec.name, sys.argv, path=path)
+    if response is None:
+        return None
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['status']
+
+
+class BuildHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            query = json.loads(self.rfile.readline())
+        except json.JSONDecodeError:
+            return
+
+        response = self.server.run(query['module'], query['argv'], query['cwd'])
+        self.wfile.write(json.dumps(response).encode('utf-8'))
+
+
+class BuildServer(socketserver.UnixStreamServer):
+    """
+    Runs builder modules in a single long-lived process, one at a time, so that modules are imported,
+    templates compiled and root contexts built only once. The source tree is checked for changes before every
+    build, and a change of our own code makes the daemon refuse further builds, which then run locally.
+    """
+    # Let all jobs of a parallel make wait for their turn instead of building locally
+    request_queue_size = 64
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.code = code_fingerprint()
+        self.contexts: dict[tuple, tuple[str, Any]] = {}
+        self.stale = False
+        super().__init__(str(path), BuildHandler)
+
+    def run(self, module: str, argv: list[str], cwd: str) -> dict:
+        if module not in entry_points:
+            print(f"dgs daemon: refused to run {module}, which is not a builder", file=sys.stderr)
+            return {'status': 1, 'stdout': '', 'stderr': f"dgs daemon: {module} is not a builder\n"}
+
+        if self.stale or code_fingerprint() != self.code:
+            if not self.stale:
+                print("dgs daemon: the code has changed, restart the daemon; building locally until then",
+                      file=sys.stderr)
+            self.stale = True
+            return {'status': None}
+
+        # Repositories may have new commits and meta.yaml files new contents since the last build
+        git.clear_cache()
+        registry.clear()
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        # Handlers write to the stream they were created with, so they are pointed at our output for the build
+        handlers = [handler for handler in log.handlers if isinstance(handler, logging.StreamHandler)]
+        streams = [handler.setStream(stderr) for handler in handlers]
+        argv_before, cwd_before = sys.argv, os.getcwd()
+        status = 0
+        try:
+            os.chdir(cwd)
+            sys.argv = list(argv)
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    runpy.run_module(module, run_name='__main__', alter_sys=True)
+                except SystemExit as exit:
+                    if exit.code is None or isinstance(exit.code, int):
+                        status = exit.code or 0
+                    else:
+                        print(exit.code, file=sys.stderr)
+                        status = 1
+                except Exception:
+                    traceback.print_exc()
+                    status = 1
+        finally:
+            sys.argv = argv_before
+            os.chdir(cwd_before)
+            for handler, stream in zip(handlers, streams):
+                handler.setStream(stream)
+            # Handlers created by the first build captured its output as their stream
+            for handler in log.handlers:
+                if isinstance(handler, logging.StreamHandler) and handler.stream is stderr:
+                    handler.setStream(sys.stderr)
+
+        print(f"dgs daemon: {module} {' '.join(argv[1:])}: {status}", file=sys.stderr)
+        return {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue()}
+
+
+def serve(path: Path = default_socket) -> None:
+    global server
+
+    if is_listening(path):
+        raise RuntimeError(f"A daemon is already listening at {path}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.unlink(missing_ok=True)
+
+    with BuildServer(path) as server:
+        print(f"dgs daemon: listening at {path}", file=sys.stderr)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            path.unlink(missing_ok=True)
+            server = None
+
+
+def is_listening(path: Path) -> bool:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(str(path))
+            return True
+        except (FileNotFoundError, ConnectionRefusedError):
+            return False
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve builds of templates from a single long-running process. Builder command lines "
+                    "use it whenever it is running, and build on their own otherwise.",
+    )
+    parser.add_argument('--socket', type=Path, default=default_socket, help="path of the Unix socket")
+    args = parser.parse_args()
+
+    try:
+        serve(args.socket)
+    except RuntimeError as error:
+        print(f"dgs daemon: {error}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import functools
+import os
+import re
+import subprocess
+from pathlib import Path
+
+# Abbreviated hashes are at least this long, unless core.abbrev says otherwise, see `abbreviate`
+default_abbrev = 7
+
+# Magic number of pack indices of version 2 and later
+pack_index_magic = b'\377tOc'
+
+re_sha = re.compile(r'[0-9a-f]{40}|[0-9a-f]{64}')
+
+
+class UnreadableRepository(Exception):
+    pass
+
+
+@functools.cache
+def git_directories(directory: str) -> tuple[Path, Path]:
+    """ The git directory of the repository containing `directory`, and its common directory (differs in worktrees) """
+    for parent in [Path(directory), *Path(directory).parents]:
+        dot_git = Path(parent, '.git')
+        if dot_git.is_dir():
+            git_dir = dot_git
+        elif dot_git.is_file():
+            content = dot_git.read_text().strip()
+            if not content.startswith('gitdir:'):
+                raise UnreadableRepository(f"{dot_git} does not point to a git directory")
+            git_dir = Path(parent, content.removeprefix('gitdir:').strip())
+        else:
+            continue
+
+        common = Path(git_dir, 'commondir')
+        common_dir = Path(git_dir, common.read_text().strip()) if common.is_file() else git_dir
+        return git_dir, common_dir
+    raise UnreadableRepository(f"{directory} is not inside a git repository")
+
+
+def packed_refs(common_dir: Path) -> dict[str, str]:
+    path = Path(common_dir, 'packed-refs')
+    refs = {}
+    if path.is_file():
+        for line in path.read_text().splitlines():
+            if line and line[0] not in '#^':
+                sha, _, name = line.partition(' ')
+                refs[name] = sha
+    return refs
+
+
+def read_ref(git_dir: Path, common_dir: Path, name: str, packed: dict[str, str], depth: int = 0) -> str | None:
+    """ The hash a ref points to, following symbolic refs, or None if there is no such ref """
+    if depth > 5:
+        raise UnreadableRepository(f"Too many levels of symbolic refs at {name}")
+
+    # Refs of a worktree are in its own directory, shared refs in the common one
+    for directory in [git_dir, common_dir]:
+        path = Path(directory, name)
+        if path.is_file():
+            content = path.read_text().strip()
+            if content.startswith('ref:'):
+                return read_ref(git_dir, common_dir, content.removeprefix('ref:').strip(), packed, depth + 1)
+            if re_sha.fullmatch(content):
+                return content
+            raise UnreadableRepository(f"Cannot read ref {path}")
+    return packed.get(name)
+
+
+def abbrev(common_dir: Path) -> int | None:
+    """ core.abbrev from the configuration of the repository, if set to a number, None to let git choose """
+    section = None
+    path = Path(common_dir, 'config')
+    for line in path.read_text().splitlines() if path.is_file() else []:
+        line = line.split('#')[0].split(';')[0].strip()
+        if line.startswith('['):
+            section = line.strip('[]').strip().lower()
+        elif section == 'core' and '=' in line:
+            key, _, value = line.partition('=')
+            if key.strip().lower() == 'abbrev' and value.strip().isdigit():
+                return max(4, int(value.strip()))
+    return None
+
+
+def pack_objects(index: Path, first: int, size: int) -> tuple[int, list[str]]:
+    """
+    The number of objects in the pack of `index`, and the names of those whose first byte is `first`.
+    Names are sorted and `size` bytes long, after the fanout table of how many of them start with each byte.
+    """
+    with open(index, 'rb') as file:
+        header = file.read(8 + 256 * 4)
+        if header[:4] != pack_index_magic or int.from_bytes(header[4:8], 'big') != 2:
+            raise UnreadableRepository(f"Cannot read pack index {index}")
+        fanout = [int.from_bytes(header[8 + 4 * i:12 + 4 * i], 'big') for i in range(256)]
+        start = fanout[first - 1] if first > 0 else 0
+        count = fanout[first] - start
+        file.seek(8 + 256 * 4 + start * size)
+        names = file.read(count * size)
+    return fanout[255], [names[i:i + size].hex() for i in range(0, len(names), size)]
+
+
+def abbreviate(common_dir: Path, sha: str) -> str:
+    """
+    Abbreviate `sha` as `git rev-parse --short` does: to core.abbrev characters if set, otherwise to a length
+    that grows with the number of packed objects, at least 7 (8 from 2 ** 14 objects on). Either is lengthened
+    until no other loose or packed object shares the prefix. Repositories borrowing objects from elsewhere,
+    or with pack indices of the old format, are left to git.
+    """
+    objects = Path(common_dir, 'objects')
+    if Path(objects, 'info', 'alternates').is_file():
+        raise UnreadableRepository(f"{common_dir} has alternate object stores")
+
+    first = int(sha[:2], 16)
+    count, others = 0, []
+    for index in Path(objects, 'pack').glob('*.idx'):
+        packed, names = pack_objects(index, first, len(sha) // 2)
+        count += packed
+        others += names
+    loose = Path(objects, sha[:2])
+    if loose.is_dir():
+        others += [sha[:2] + name for name in os.listdir(loose) if re_sha.fullmatch(sha[:2] + name)]
+
+    length = abbrev(common_dir)
+    if length is None:
+        length = max(default_abbrev, (count.bit_length() + 1) // 2)
+    for other in others:
+        if other != sha:
+            common = next((i for i, (a, b) in enumerate(zip(sha, other)) if a != b), len(sha))
+            length = max(length, common + 1)
+    return sha[:length]
+
+
+@functools.cache
+def read_metadata(git_dir: Path, common_dir: Path) -> tuple[str, str]:
+    packed = packed_refs(common_dir)
+
+    # As `git rev-parse --verify master` would look for it
+    sha = None
+    for name in ['master', 'refs/master', 'refs/tags/master', 'refs/heads/master', 'refs/remotes/master',
+                 'refs/remotes/master/HEAD']:
+        if (sha := read_ref(git_dir, common_dir, name, packed)) is not None:
+            break
+    if sha is None:
+        raise UnreadableRepository(f"No master in {common_dir}")
+
+    head = Path(git_dir, 'HEAD').read_text().strip()
+    if head.startswith('ref:'):
+        branch = head.removeprefix('ref:').strip().removeprefix('refs/heads/')
+    elif re_sha.fullmatch(head):
+        branch = 'HEAD'
+    else:
+        raise UnreadableRepository(f"Cannot read HEAD of {git_dir}")
+
+    return abbreviate(common_dir, sha), branch
+
+
+@functools.cache
+def run_git(directory: str) -> tuple[str, str]:
+    def output(*args: str) -> str:
+        return subprocess.check_output(['git', *args], cwd=directory).decode().rstrip("\n")
+
+    return (output("rev-parse", "--short", "--verify", "master"),
+            output("rev-parse", "--symbolic-full-name", "--abbrev-ref", "HEAD"))
+
+
+def metadata(directory: str) -> tuple[str, str]:
+    """
+    Abbreviated hash of master and the current branch of the repository containing `directory`,
+    read from the files of the repository once per repository and process, or by running git if they cannot be read
+    """
+    try:
+        return read_metadata(*git_directories(directory))
+    except (OSError, UnicodeDecodeError, UnreadableRepository):
+        return run_git(directory)
+
+
+def clear_cache() -> None:
+    """ Forget all repositories, for long-running processes whose repositories get new commits """
+    git_directories.cache_clear()
+    read_metadata.cache_clear()
+    run_git.cache_clear()
+
+
+def last_commit_hash(cwd=None) -> str:
+    return metadata(os.path.abspath(os.getcwd() if cwd is None else cwd))[0]
+
+
+def branch(cwd=None) -> str:
+    return metadata(os.path.abspath(os.getcwd() if cwd is None else cwd))[1]
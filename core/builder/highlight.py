@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+
+import argparse
+import functools
+import hashlib
+import sys
+from pathlib import Path
+
+import pygments
+
+from core.builder.cache import ConversionCache
+from core.utilities import colour as c
+
+
+class HighlightCache:
+    """
+    Content-addressed cache of code blocks highlighted by Pygments for LaTeX output, used instead of minted.
+    minted runs Pygments on every listing of every document in every compile. Cached blocks are plain fancyvrb
+    Verbatim environments keyed by the code, its language and a salt identifying Pygments and the style,
+    so identical listings in problems and solutions are highlighted once and the LaTeX compile does not run Pygments.
+    """
+    default_directory = Path('build', '.cache', 'highlight')
+    style = 'default'
+    # Differs from the prefixes of minted, so that both can be used in the same document
+    command_prefix = 'PYGdgs'
+    # fancyvrb options of every listing, as set for minted in core/latex/fonts.tex
+    verbatim_options = r'fontsize=\footnotesize'
+
+    def __init__(self, directory=None):
+        self.storage = ConversionCache(self.default_directory if directory is None else directory)
+        self.directory = self.storage.directory
+
+    @classmethod
+    @functools.cache
+    def salt(cls) -> str:
+        return hashlib.sha1(repr((pygments.__version__, cls.style, cls.command_prefix, cls.verbatim_options))
+                            .encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def key(salt: str, language: str, code: str) -> str:
+        """ The key of a code block, also computed by core/filters/minted.lua, which reads the cache directly """
+        return hashlib.sha1(f"{salt}\0{language}\0{code}".encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.storage.path(key)
+
+    def formatter(self) -> 'pygments.formatters.LatexFormatter':
+        # Formatters and lexers load their plugins through importlib.metadata, which the conversion never needs
+        from pygments.formatters import LatexFormatter
+        return LatexFormatter(style=self.style, commandprefix=self.command_prefix, verboptions=self.verbatim_options)
+
+    def highlight(self, salt: str, blocks: list[tuple[str, str]]) -> list[tuple[str, str]]:
+        """
+        Highlight all (language, code) blocks that are not cached yet and store them, together with the style
+        definitions they need, which are stored under the salt itself.
+        Returns (language, error) of blocks that could not be highlighted and are left to minted.
+        """
+        from pygments.lexers import get_lexer_by_name
+        from pygments.util import ClassNotFound
+
+        failures = []
+        formatter = self.formatter()
+        if not self.path(salt).is_file():
+            with self.storage.writer(salt) as out:
+                out.write(formatter.get_style_defs())
+
+        # The compile runs in the repository root, as does the conversion
+        preamble = f"\\ifcsname {self.command_prefix}\\endcsname\\else\\input{{{self.path(salt)}}}\\fi\n"
+        for language, code in dict.fromkeys(blocks):
+            key = self.key(salt, language, code)
+            if self.path(key).is_file():
+                continue
+            try:
+                lexer = get_lexer_by_name(language, stripnl=False)
+            except ClassNotFound as error:
+                failures.append((language, str(error)))
+                continue
+            with self.storage.writer(key) as out:
+                out.write(preamble + pygments.highlight(code, lexer, formatter).rstrip('\n'))
+        return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Highlight code blocks into the highlighting cache. Used by core/filters/minted.lua, which passes "
+                    "one 'language hex-encoded-code' per line on standard input.",
+    )
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('salt', type=str)
+    args = parser.parse_args()
+
+    blocks = []
+    for line in sys.stdin:
+        if line.strip():
+            language, _, code = line.strip().partition(' ')
+            blocks.append((language, bytes.fromhex(code).decode('utf-8')))
+
+    for language, error in HighlightCache(args.directory).highlight(args.salt, blocks):
+        print(f"{c.err('highlight:')} {c.name(language)} left to minted: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
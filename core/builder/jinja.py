@@ -1,3 +1,6 @@
+import functools
+import hashlib
+import itertools
 import jinja2
 import os
 import sys
@@ -33,21 +36,49 @@ class MissingVariablesError(Exception):
         return f"Missing variables: {self.missing}"
 
 
-# Create a custom LaTeX Jinja2 environment, including filters
+# Template syntax shared by all our LaTeX templates
+syntax = dict(
+    block_start_string='(@',
+    block_end_string='@)',
+    variable_start_string='(*',
+    variable_end_string='*)',
+    comment_start_string='(#',
+    comment_end_string='#)',
+    line_statement_prefix='%%',
+    line_comment_prefix='%#',
+    trim_blocks=True,
+)
+
+# Every make target renders its templates in a new process, so compiled templates are kept on disk
+bytecode_directory = Path('build', '.cache', 'jinja')
+
+
+@functools.cache
+def bytecode_cache() -> jinja2.BytecodeCache | None:
+    """ Persistent cache of compiled templates, None if it cannot be created """
+    try:
+        bytecode_directory.mkdir(parents=True, exist_ok=True)
+    except OSError as e:
+        log.warning(f"Cannot create the template cache {c.path(bytecode_directory)}: {e}")
+        return None
+    # Jinja checks the source of every template, but not the syntax it was compiled with
+    salt = hashlib.sha1(repr(sorted(syntax.items())).encode('utf-8')).hexdigest()[:12]
+    return jinja2.FileSystemBytecodeCache(str(bytecode_directory), f'__jinja2_{salt}_%s.cache')
+
+
 def environment(directory):
+    """ The custom LaTeX Jinja2 environment of a template root, including filters, created once per process """
+    return _environment(os.path.normpath(directory))
+
+
+@functools.cache
+def _environment(directory: str) -> jinja2.Environment:
     env = jinja2.Environment(
-        block_start_string='(@',
-        block_end_string='@)',
-        variable_start_string='(*',
-        variable_end_string='*)',
-        comment_start_string='(#',
-        comment_end_string='#)',
-        line_statement_prefix='%%',
-        line_comment_prefix='%#',
-        trim_blocks=True,
+        **syntax,
         autoescape=False,
         undefined=jinja2.StrictUndefined,
         loader=jinja2.FileSystemLoader(directory),
+        bytecode_cache=bytecode_cache(),
     )
 
     env.filters |= {
@@ -71,22 +102,41 @@ def environment(directory):
     return env
 
 
-def print_template(root, template, context, *, outdir=None, new_name=None):
-    """ Print a Jinja2 template with provided context """
+# Rendered templates are written in chunks of a few bytes, which are collected into writes of this size
+output_buffer_size = 2 ** 16
+
+
+def print_template(root, template, context, *, outdir=None, new_name=None) -> int:
+    """
+    Print a Jinja2 template with provided context to `outdir`, or to stdout if there is none.
+    The output is written as it is rendered, without ever being held in memory as a whole.
+    Returns the number of bytes written.
+    """
     template_path = Path(root, template)
-    if outdir is None:
-        output_path = sys.stdout
-    else:
-        output_path = open(Path(outdir, template if new_name is None else new_name), 'w')
+    output_path = None if outdir is None else Path(outdir, template if new_name is None else new_name)
+    log.info(f"Rendering template {c.path(template_path)} to "
+             f"{c.path('stdout' if output_path is None else output_path)}")
     try:
-        log.info(f"Rendering template {c.path(template_path)} to {c.path(output_path.name)}")
-        print(
-            environment(root).get_template(template).render(context),
-            file=output_path,
-        )
+        chunks = environment(root).get_template(template).generate(context)
+        if output_path is None:
+            written = 0
+            for chunk in itertools.chain(chunks, ['\n']):
+                sys.stdout.write(chunk)
+                written += len(chunk.encode('utf-8'))
+        else:
+            try:
+                with open(output_path, 'wb', buffering=output_buffer_size) as output:
+                    written = sum(output.write(chunk.encode('utf-8')) for chunk in itertools.chain(chunks, ['\n']))
+            except BaseException:
+                # A partial output would look up to date to make
+                output_path.unlink(missing_ok=True)
+                raise
     except jinja2.exceptions.TemplateNotFound as e:
         log.critical(f"{c.err('Template not found')}: {c.path(template_path)}, {c.err('aborting')}")
         raise e
     except jinja2.exceptions.UndefinedError as e:
         log.critical(f"Missing required variable from context in {c.path(template)}: {c.err(e)}")
         raise e
+
+    log.debug(f"Wrote {c.num(written)} bytes from {c.path(template_path)}")
+    return written
@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+
+import argparse
+import functools
+import hashlib
+import html
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from core import i18n
+from core.builder.cache import ConversionCache
+from core.utilities import colour as c
+
+
+class RenderError(Exception):
+    pass
+
+
+class MathCache:
+    """
+    Content-addressed cache of formulas rendered to SVG with the local TeX toolchain, for `--math svg` HTML output.
+    Entries are ready HTML fragments keyed by the formula, its mode (inline or display) and a salt identifying
+    the preamble, the number formatting of the locale and the tools, so identical formulas are rendered once
+    and shared by all problems, rounds and volumes. All formulas missing from the cache are rendered
+    in a single TeX run, one per page.
+    """
+    default_directory = Path('build', '.cache', 'math')
+    preamble = Path('core', 'latex', 'svgmath.tex')
+    override = Path('core', 'templates', 'override.jtt')
+    tools = ['xelatex', 'dvisvgm']
+
+    # Dimensions of every page in sp, as logged by the preview package
+    re_snippet = re.compile(r'Preview: Snippet (?P<number>\d+) ended\.'
+                            r'\((?P<height>\d+)\+(?P<depth>\d+)/(?P<width>\d+)\)')
+    re_id = re.compile(r'''(\bid=['"]|\bhref=['"]#|\burl\(#)''')
+
+    def __init__(self, locale_code: str, directory=None):
+        self.storage = ConversionCache(self.default_directory if directory is None else directory)
+        self.directory = self.storage.directory
+        self.locale_code = locale_code
+
+    @classmethod
+    @functools.cache
+    def settings(cls, locale_code: str) -> str:
+        """ The `\\sisetup` of the locale, rendered from the same template as for the PDFs """
+        # Only needed when rendering, convert.py must start without Jinja
+        from core.builder import jinja
+
+        setup = re.search(r'^\\sisetup\{$.*?^\}$', cls.override.read_text(), flags=re.MULTILINE | re.DOTALL)
+        return jinja.environment(cls.override.parent).from_string(setup[0]).render(
+            i18n=i18n.languages[locale_code].as_dict(),
+        )
+
+    @classmethod
+    @functools.cache
+    def salt(cls, locale_code: str) -> str:
+        """ Identify the preamble, the locale settings and the installed tools by content, path, size and mtime """
+        digest = hashlib.sha1(cls.preamble.read_bytes() if cls.preamble.is_file() else b'')
+        digest.update(cls.settings(locale_code).encode('utf-8'))
+        for tool in cls.tools:
+            if (path := shutil.which(tool)) is not None:
+                info = Path(path).resolve().stat()
+                digest.update(repr((tool, path, info.st_size, info.st_mtime_ns)).encode('utf-8'))
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(salt: str, mode: str, formula: str) -> str:
+        """ The key of a formula, also computed by core/filters/svgmath.lua, which reads the cache directly """
+        return hashlib.sha1(f"{salt}\0{mode}\0{formula}".encode('utf-8')).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.storage.path(key)
+
+    def render(self, salt: str, formulas: list[tuple[str, str]]) -> list[tuple[str, str, str]]:
+        """
+        Render all (mode, formula) pairs that are not cached yet and store them.
+        A formula that does not compile would fail the whole batch, so then every formula is rendered separately.
+        Returns the (mode, formula, error) of formulas that could not be rendered.
+        """
+        missing = list(dict.fromkeys(
+            (mode, formula) for mode, formula in formulas
+            if not self.path(self.key(salt, mode, formula)).is_file()
+        ))
+        if len(missing) == 0:
+            return []
+
+        for tool in self.tools:
+            if shutil.which(tool) is None:
+                raise RenderError(f"{tool} not found, cannot render formulas to SVG")
+
+        try:
+            self._store(salt, missing)
+            return []
+        except RenderError as error:
+            if len(missing) == 1:
+                return [(*missing[0], str(error))]
+
+        failures = []
+        for mode, formula in missing:
+            try:
+                self._store(salt, [(mode, formula)])
+            except RenderError as error:
+                failures.append((mode, formula, str(error)))
+        return failures
+
+    def _store(self, salt: str, formulas: list[tuple[str, str]]) -> None:
+        for (mode, formula), (svg, depth) in zip(formulas, self.compile(formulas)):
+            key = self.key(salt, mode, formula)
+            with self.storage.writer(key) as out:
+                out.write(self.fragment(svg, key, mode, formula, depth))
+
+    def compile(self, formulas: list[tuple[str, str]]) -> list[tuple[str, float]]:
+        """ Typeset the formulas one per page, returning the SVG of every page and its depth below the baseline (pt) """
+        with tempfile.TemporaryDirectory(prefix='svgmath-') as directory:
+            styles = {'inline': '', 'display': '\\displaystyle '}
+            snippets = [f"\\begin{{preview}}${styles[mode]}{formula}$\\end{{preview}}" for mode, formula in formulas]
+            source = Path(directory, 'formulas.tex')
+            document = [f"\\input{{{self.preamble}}}", self.settings(self.locale_code),
+                        "\\begin{document}", *snippets, "\\end{document}"]
+            source.write_text('\n'.join(document) + '\n')
+
+            # Run from the repository root, so that the preamble finds core/latex and assets/fonts;
+            # unlimited log lines keep the preview dimensions on a single line
+            env = {**os.environ, 'max_print_line': '100000'}
+            latex = subprocess.run(['xelatex', '-no-pdf', '-interaction=nonstopmode', '-halt-on-error',
+                                    f'-output-directory={directory}', str(source)],
+                                   stdin=subprocess.DEVNULL, capture_output=True, text=True, env=env)
+            log = Path(directory, 'formulas.log')
+            log = log.read_text(errors='replace') if log.is_file() else latex.stdout
+            if latex.returncode != 0:
+                errors = [line for line in log.splitlines() if line.startswith('!')]
+                raise RenderError(errors[0] if errors else f"xelatex failed with code {latex.returncode}")
+
+            depths = {int(match['number']): int(match['depth']) / 65536 for match in self.re_snippet.finditer(log)}
+            svg = subprocess.run(['dvisvgm', '--no-fonts', '--bbox=papersize', '--page=1-', '--verbosity=1',
+                                  f'--output={directory}/%p.svg', str(Path(directory, 'formulas.xdv'))],
+                                 stdin=subprocess.DEVNULL, capture_output=True, text=True)
+            pages = sorted(Path(directory).glob('*.svg'), key=lambda path: int(path.stem))
+            if svg.returncode != 0 or len(pages) != len(formulas):
+                raise RenderError(f"dvisvgm produced {len(pages)} pages for {len(formulas)} formulas: "
+                                  f"{svg.stderr.strip()}")
+
+            return [(page.read_text(), depths.get(number, 0.0)) for number, page in enumerate(pages, 1)]
+
+    @classmethod
+    def fragment(cls, svg: str, key: str, mode: str, formula: str, depth: float) -> str:
+        """
+        Turn a standalone SVG file into a single line of HTML to be inlined, aligned to the baseline of the text.
+        Identifiers are prefixed by the key, so that formulas inlined into the same page cannot collide.
+        """
+        svg = re.sub(r'<\?xml.*?\?>|<!--.*?-->', '', svg, flags=re.DOTALL).strip()
+        svg = cls.re_id.sub(lambda match: f"{match[1]}m{key[:12]}-", svg)
+        svg = re.sub(r'\s*\n\s*', ' ', svg)
+        svg = svg.replace('<svg ', f'<svg style="vertical-align: {-depth:.3f}pt" ', 1)
+        style = ' style="display: block; text-align: center"' if mode == 'display' else ''
+        return f'<span class="math {mode}"{style} role="img" aria-label="{html.escape(formula)}">{svg}</span>'
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Render formulas to the SVG math cache. Used by core/filters/svgmath.lua, which passes "
+                    "one 'mode hex-encoded-formula' per line on standard input.",
+    )
+    parser.add_argument('directory', type=Path)
+    parser.add_argument('salt', type=str)
+    parser.add_argument('locale', type=str, choices=i18n.languages.keys())
+    args = parser.parse_args()
+
+    formulas = []
+    for line in sys.stdin:
+        if line.strip():
+            mode, _, formula = line.strip().partition(' ')
+            formulas.append((mode, bytes.fromhex(formula).decode('utf-8')))
+
+    try:
+        failures = MathCache(args.locale, args.directory).render(args.salt, formulas)
+    except RenderError as error:
+        print(f"{c.err('svgmath:')} {error}", file=sys.stderr)
+        sys.exit(1)
+
+    for mode, formula, error in failures:
+        print(f"{c.err('svgmath: cannot render')} {mode} formula {c.name(formula)}: {error}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
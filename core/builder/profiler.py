@@ -0,0 +1,109 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import os
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable
+
+from core.utilities import colour as c
+
+
+class Profiler:
+    """
+    Wall time of the stages of a single conversion, and how often and for how long each rule fired.
+    Stages may overlap (the streaming Convertor runs the input and output stages concurrently with pandoc),
+    in which case a stage's time is the sum of the time spent in it, line by line.
+    Results are appended as one JSON line per conversion to a log that is shared by all processes of a build.
+    """
+    environment_variable = 'DGS_PROFILE'
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.start = time.perf_counter()
+        self.stages: dict[str, float] = defaultdict(float)
+        # {stage: {rule: [fired, seconds]}}
+        self.rules: dict[str, dict[str, list]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.perf_counter() - start
+
+    def timed(self, name: str, function: Callable) -> Callable:
+        """ Wrap a function so that every call of it is counted towards stage `name` """
+        stages = self.stages
+
+        def inner(*args):
+            start = time.perf_counter()
+            try:
+                return function(*args)
+            finally:
+                stages[name] += time.perf_counter() - start
+
+        return inner
+
+    def record(self, **fields) -> None:
+        entry = {
+            **fields,
+            'total': time.perf_counter() - self.start,
+            'stages': dict(self.stages),
+            'rules': {
+                stage: {rule: {'fired': fired, 'time': seconds} for rule, (fired, seconds) in rules.items()}
+                for stage, rules in self.rules.items()
+            },
+        }
+
+        # O_APPEND writes of a whole line at once do not interleave, so concurrent processes cannot garble the log
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, (json.dumps(entry, ensure_ascii=False) + '\n').encode('utf-8'))
+        finally:
+            os.close(fd)
+
+
+def aggregate(lines) -> tuple[int, dict[str, float], dict[tuple[str, str], list]]:
+    """ Sum the profiles of many conversions: (count, {stage: seconds}, {(stage, rule): [fired, seconds]}) """
+    count = 0
+    stages = defaultdict(float)
+    rules = defaultdict(lambda: [0, 0.0])
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        count += 1
+        stages['total'] += entry['total']
+        for stage, seconds in entry['stages'].items():
+            stages[stage] += seconds
+        for stage, table in entry['rules'].items():
+            for rule, stats in table.items():
+                rules[stage, rule][0] += stats['fired']
+                rules[stage, rule][1] += stats['time']
+    return count, stages, rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a conversion profile written by `convert.py --profile`")
+    parser.add_argument('profile', type=argparse.FileType('r'))
+    parser.add_argument('--rules', type=int, default=20, help="number of slowest rules to show")
+    args = parser.parse_args()
+
+    count, stages, rules = aggregate(args.profile)
+    print(f"{c.num(count)} conversions")
+    for stage, seconds in sorted(stages.items(), key=lambda item: -item[1]):
+        print(f"{c.name(stage):>24} {c.num(f'{seconds:10.3f}')} s")
+
+    print("Slowest rules:")
+    for (stage, rule), (fired, seconds) in sorted(rules.items(), key=lambda item: -item[1][1])[:args.rules]:
+        print(f"{c.name(stage):>24} {c.num(f'{seconds:10.3f}')} s, fired {c.num(f'{fired:6d}')} times: {rule}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+
+"""
+Validate the file system structure of every repository in the source tree in a single command:
+all seminar rounds, naboj volumes and scholar handouts and homework, in parallel processes.
+Repositories are the unit of work and are not split further by subtree (volumes, problems): with its listings
+in the tree cache, even a large volume is scanned and checked in a few milliseconds, less than it takes to start
+the processes, as core/benchmarks/validation.py shows.
+Run as `python -m core.builder.validate source/` or `make validate`.
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import os
+import sys
+from pathlib import Path
+from typing import Iterator
+
+from enschema import SchemaError
+
+from core.utilities import colour as c
+
+# Validators by module and the pattern of their repositories under the source directory of the module
+validators = [
+    ('seminar', '*/*/*/*', 'modules.seminar.builder.validators', 'SeminarRoundValidator'),
+    ('naboj', '*/*', 'modules.naboj.builder.contexts.validators', 'NabojValidator'),
+    ('scholar', '*/*/handouts/*', 'modules.scholar.builder.contexts.validators', 'HandoutValidator'),
+    ('scholar', '*/*/homework/*', 'modules.scholar.builder.contexts.validators', 'HomeworkValidator'),
+]
+
+
+def repositories(source: Path) -> Iterator[tuple[str, str, Path]]:
+    """ The validator module, validator class and root of every repository under `source` that has a meta.yaml """
+    for module, pattern, validator_module, validator_class in validators:
+        for meta in sorted(Path(source, module).glob(f'{pattern}/meta.yaml')):
+            yield validator_module, validator_class, meta.parent
+
+
+def validate(validator_module: str, validator_class: str, root: Path) -> tuple[Path, str | None, str]:
+    """
+    Validate the repository at `root` with the validator, possibly in another process.
+    Returns the root, the error if it failed to validate or None, and the warnings printed by its extra checks.
+    """
+    validator = getattr(importlib.import_module(validator_module), validator_class)
+    warnings = io.StringIO()
+    error = None
+    with contextlib.redirect_stdout(warnings):
+        try:
+            validator(root).check()
+        except SchemaError as e:
+            error = str(e)
+    return root, error, warnings.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Validate the file system structure of all seminar rounds, naboj volumes "
+                    "and scholar handouts and homework in the source tree",
+    )
+    parser.add_argument('source', type=Path, nargs='?', default=Path('source'), help="the source directory")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help="number of parallel processes")
+    args = parser.parse_args()
+
+    found = list(repositories(args.source))
+    if args.jobs > 1 and len(found) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = list(executor.map(validate, *zip(*found)))
+    else:
+        results = [validate(*repository) for repository in found]
+
+    failed = 0
+    for root, error, warnings in results:
+        if error is None:
+            print(f"{c.ok('ok')}     {c.path(root)}")
+        else:
+            failed += 1
+            print(f"{c.err('failed')} {c.path(root)}\n{error}")
+        if warnings:
+            print(warnings, end='')
+
+    print(f"Validated {c.num(len(results))} repositories under {c.path(args.source)}, "
+          f"{c.num(failed) if failed else c.ok('none')} failed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
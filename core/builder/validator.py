@@ -1,10 +1,14 @@
 import abc
 import logging
+import os
 import pprint
 
 from enschema import Schema, SchemaError, And, Or, Regex
 from pathlib import Path
 
+from core.builder.cache import TreeCache
+from core.utilities.schema import compiled
+
 log = logging.getLogger('dgs')
 
 Link = 'link'
@@ -13,6 +17,9 @@ FileOrLink = Or(File, Link)
 String = And(str, len)
 CommitHash = Regex(r'[a-f0-9]+')
 
+# Directory listings of all trees scanned by this process, also stored on disk for the next ones
+tree_cache = TreeCache()
+
 
 class FileSystemValidator(metaclass=abc.ABCMeta):
     IGNORED = ['.git']
@@ -28,25 +35,57 @@ class FileSystemValidator(metaclass=abc.ABCMeta):
         self.tree = self.scan(self.root)
 
     def scan(self, path) -> str | dict | None:
+        """
+        The tree under `path`: directories are dicts of their entries, files are File, symlinks to files are Link.
+        Directories are listed only if they have changed since they were last listed, by any process.
+        """
         if path.name in self.IGNORED:
             return None
-        if path.is_dir():
-            return {
-                child.name: self.scan(Path(child)) for child in path.iterdir() if child.name[0] not in self.IGNORED
-            }
-        else:
+        if not path.is_dir():
             if path.is_symlink():
                 return Link
             elif path.is_file():
                 return File
+            return None
+
+        root = os.path.abspath(path)
+        tree_cache.load(root)
+        misses = tree_cache.misses
+        directories = []
+
+        def scan_directory(directory: str) -> dict:
+            directories.append(directory)
+            tree = {}
+            for name, kind in tree_cache.listing(directory):
+                if name[0] in self.IGNORED:
+                    continue
+                if name in self.IGNORED:
+                    tree[name] = None
+                elif kind == 'dir':
+                    tree[name] = scan_directory(os.path.join(directory, name))
+                else:
+                    tree[name] = kind
+            return tree
+
+        result = scan_directory(root)
+        if tree_cache.misses > misses:
+            tree_cache.save(root, directories)
+        return result
+
+    def check(self) -> None:
+        """
+        Validate the tree, raising the corresponding SchemaError if anything is out of order, without reporting it
+        """
+        if not compiled(self.schema)(self.tree):
+            self.schema.validate(self.tree)
+        self.perform_extra_checks()
 
     def validate(self) -> None:
         """
         Validate the tree, re-raising the corresponding SchemaError if anything is out of order
         """
         try:
-            self.schema.validate(self.tree)
-            self.perform_extra_checks()
+            self.check()
         except SchemaError as e:
             log.error(f"Could not validate file system tree")
             pprint.pprint(self.tree)
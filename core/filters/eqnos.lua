@@ -0,0 +1,513 @@
+-- Number equations labelled `{#eq:label}` and replace references `@eq:label`, in place of the pandoc-eqnos
+-- Python filter, with identical output. Supports tags (`{#eq:label tag="A"}`), custom environments
+-- (`env="align"`), the `+`, `*` and `!` reference modifiers, `nolink`, and the metadata fields
+-- eqnos-cleveref, xnos-cleveref, xnos-capitalise, eqnos-plus-name, eqnos-star-name, eqnos-eqref
+-- and eqnos-default-env. Numbering by section is not supported.
+
+local NBSP = '\u{a0}'
+
+local settings = {
+    cleveref = false,
+    capitalise = false,
+    plusname = {'eq.', 'eqs.'},
+    starname = {'Equation', 'Equations'},
+    eqref = false,
+    default_env = 'equation',
+}
+
+local targets = {}
+local count = 0
+
+local function is_latex()
+    return FORMAT == 'latex' or FORMAT == 'beamer'
+end
+
+local function is_html()
+    return FORMAT:match('^html') ~= nil or FORMAT:match('^epub') ~= nil
+end
+
+local function is_label(id)
+    return id:sub(1, 3) == 'eq:'
+end
+
+local function title(s)
+    return (s:gsub('(%a)([%w]*)', function(first, rest) return first:upper() .. rest:lower() end))
+end
+
+-- Attributes ---------------------------------------------------------------------------------------------------
+
+-- Reconstruct the markdown source of an attribute block from the inlines pandoc has parsed it into
+local function source(inlines)
+    local out = {}
+    for _, elem in ipairs(inlines) do
+        if elem.t == 'Str' then
+            table.insert(out, elem.text)
+        elseif elem.t == 'Space' or elem.t == 'SoftBreak' or elem.t == 'LineBreak' then
+            table.insert(out, ' ')
+        elseif elem.t == 'Quoted' then
+            local quote = elem.quotetype == 'DoubleQuote' and '"' or "'"
+            table.insert(out, quote .. source(elem.content) .. quote)
+        elseif elem.t == 'Math' then
+            local dollars = elem.mathtype == 'DisplayMath' and '$$' or '$'
+            table.insert(out, dollars .. elem.text .. dollars)
+        elseif elem.t == 'Code' then
+            table.insert(out, elem.text)
+        else
+            table.insert(out, pandoc.utils.stringify(elem))
+        end
+    end
+    return table.concat(out)
+end
+
+local function parse_attributes(text)
+    text = text:gsub('^[{}]+', ''):gsub('[{}]+$', '')
+
+    -- Split on spaces and newlines outside of quotes
+    local words, word, quote = {}, '', nil
+    for char in text:gmatch('.') do
+        if quote == nil and (char == ' ' or char == '\n') then
+            if word ~= '' then
+                table.insert(words, word)
+            end
+            word = ''
+        else
+            if quote == nil and (char == '"' or char == "'") then
+                quote = char
+            elseif char == quote then
+                quote = nil
+            end
+            word = word .. char
+        end
+    end
+    if word ~= '' then
+        table.insert(words, word)
+    end
+
+    -- Match single word attributes e.g. python
+    if #words == 1 and not text:match('^[#.]') and not text:find('=', 1, true) then
+        return pandoc.Attr('', {text}, {})
+    end
+
+    local identifier, classes, special, attributes, expected = nil, {}, {}, {}, 0
+    for _, word in ipairs(words) do
+        if word:sub(1, 1) == '#' then
+            identifier = identifier or word:sub(2)
+        elseif word:sub(1, 1) == '.' then
+            table.insert(classes, word:sub(2))
+        elseif word == '-' then
+            table.insert(special, 'unnumbered')
+        else
+            expected = expected + 1
+            local key, value = word:match('^([^=]+)=(.*[^=])$')
+            if key ~= nil then
+                table.insert(attributes, {key, value})
+            end
+        end
+    end
+    for _, class in ipairs(special) do
+        table.insert(classes, class)
+    end
+    if #attributes ~= expected then
+        io.stderr:write('\npandoc-eqnos: Malformed attributes:\n{' .. text .. '}\n')
+    end
+    return pandoc.Attr(identifier or '', classes, attributes)
+end
+
+-- Extract an attribute block `{...}` starting at index `n` of the list `x`, removing it from `x`.
+-- Returns nil if there is none.
+local function extract_attributes(x, n)
+    if x[n] == nil or x[n].t ~= 'Str' or x[n].text:sub(1, 1) ~= '{' then
+        return nil
+    end
+
+    local seq = {}
+    local quote = nil
+    for i = n, #x do
+        local elem = x[i]
+        if elem.t == 'Str' then
+            local text = elem.text
+            for j = 1, #text do
+                local char = text:sub(j, j)
+                if char == quote then
+                    quote = nil
+                elseif char == '"' or char == "'" then
+                    quote = char
+                elseif char == '}' and quote == nil then
+                    table.insert(seq, pandoc.Str(text:sub(1, j)))
+                    local tail = text:sub(j + 1)
+                    for _ = n, i do
+                        x:remove(n)
+                    end
+                    if tail ~= '' then
+                        x:insert(n, pandoc.Str(tail))
+                    end
+
+                    -- Remove extraneous quotes from values, as pandoc-eqnos does
+                    local attr = parse_attributes(source(seq):match('^%s*(.-)%s*$'))
+                    local attributes = {}
+                    for _, pair in ipairs(attr.attributes) do
+                        local key, value = pair[1], pair[2]
+                        local first, last = value:sub(1, 1), value:sub(-1)
+                        if #value >= 2 and first == last and (first == '"' or first == "'") then
+                            value = value:sub(2, -2)
+                        end
+                        table.insert(attributes, {key, value})
+                    end
+                    return pandoc.Attr(attr.identifier, attr.classes, attributes)
+                end
+            end
+        end
+        table.insert(seq, elem)
+    end
+    return nil
+end
+
+-- Equations ----------------------------------------------------------------------------------------------------
+
+-- Wrap every Math directly in a paragraph that is followed by an attribute block in a marker Span carrying them
+local function attach(elem)
+    local x = elem.content
+    local changed = false
+    local i = 1
+    while i <= #x do
+        if x[i].t == 'Math' then
+            local n = (x[i + 1] ~= nil and x[i + 1].t == 'Space') and i + 2 or i + 1
+            local attr = extract_attributes(x, n)
+            if attr ~= nil then
+                local classes = {'eqnos-math', table.unpack(attr.classes)}
+                x[i] = pandoc.Span({x[i]}, pandoc.Attr(attr.identifier, classes, attr.attributes))
+                changed = true
+            end
+        end
+        i = i + 1
+    end
+    if changed then
+        elem.content = x
+        return elem
+    end
+end
+
+local function number(span)
+    if not span.classes:includes('eqnos-math') then
+        return nil
+    end
+
+    local equation = span.content[1]
+    local attr = span.attr
+    local id = attr.identifier
+    if not is_label(id) then
+        -- Unnumbered, the attributes are simply dropped
+        return equation
+    end
+
+    local unreferenceable = false
+    if id == 'eq:' then
+        id = id .. pandoc.utils.sha1(tostring(count) .. equation.text)
+        unreferenceable = true
+    end
+
+    local tag = attr.attributes['tag']
+    local num
+    if tag ~= nil then
+        local first, last = tag:sub(1, 1), tag:sub(-1)
+        if #tag >= 2 and first == last and (first == '"' or first == "'") then
+            tag = tag:sub(2, -2)
+        end
+        num = tag
+    else
+        count = count + 1
+        num = count
+    end
+    targets[id] = {num = num, duplicate = targets[id] ~= nil}
+
+    local text = equation.text
+    if is_latex() then
+        if not unreferenceable then
+            if tag ~= nil then
+                text = text .. '\\tag{' .. tostring(num):gsub(' ', '\\ ') .. '}\\label{' .. id .. '}'
+            else
+                text = text .. '\\label{' .. id .. '}'
+            end
+        end
+        local env, arg = (attr.attributes['env'] or settings.default_env):match('^([^.]*)%.?(.*)$')
+        return pandoc.RawInline('tex', '\\begin{' .. env .. '}' .. (arg ~= '' and '{' .. arg .. '}' or '')
+            .. text .. '\\end{' .. env .. '}')
+    elseif is_html() then
+        local label = tostring(num)
+        local eqno = (label:sub(1, 1) == '$' and label:sub(-1) == '$')
+            and pandoc.Math('InlineMath', label:sub(2, -2))
+            or pandoc.Str('(' .. label .. ')')
+        return {
+            pandoc.RawInline('html', '<span' .. (unreferenceable and ' ' or ' id="' .. id .. '" ') .. 'class="eqnos">'),
+            equation,
+            pandoc.RawInline('html', '<span class="eqnos-number">'),
+            eqno,
+            pandoc.RawInline('html', '</span></span>'),
+        }
+    else
+        if type(num) == 'number' then
+            equation.text = text .. '\\qquad (' .. num .. ')'
+        else
+            num = num:gsub(' ', '\\ ')
+            equation.text = text .. '\\qquad ('
+                .. ((num:sub(1, 1) == '$' and num:sub(-1) == '$') and num:sub(2, -2) or '\\text{' .. num .. '}') .. ')'
+        end
+        return equation
+    end
+end
+
+-- References ---------------------------------------------------------------------------------------------------
+
+local function replacement(cite, attributes)
+    local citation = cite.citations[1]
+    local label = citation.id
+    local target = targets[label]
+    local text = target and tostring(target.num) or '??'
+    local nolink = attributes['nolink'] ~= nil and title(attributes['nolink']) == 'True'
+
+    local modifier = attributes['modifier']
+    local use_cleveref = modifier ~= nil and (modifier == '*' or modifier == '+') or (modifier == nil and settings.cleveref)
+    local is_plus = modifier ~= nil and modifier == '+' or (modifier == nil and settings.cleveref)
+    local plusname = (not settings.capitalise or settings.plusname_changed) and settings.plusname
+        or {title(settings.plusname[1]), title(settings.plusname[2])}
+    local refname = is_plus and plusname[1] or settings.starname[1]
+
+    local result
+    if is_latex() then
+        local macro = use_cleveref and (is_plus and '\\cref' or '\\Cref') or (settings.eqref and '\\eqref' or '\\ref')
+        local tex = macro .. '{' .. label .. '}'
+        if nolink then
+            tex = '{\\protect\\NoHyper' .. tex .. '\\protect\\endNoHyper}'
+        end
+        result = {pandoc.RawInline('tex', tex)}
+    else
+        if settings.eqref then
+            text = '(' .. text .. ')'
+        end
+        local elem = (text:sub(1, 1) == '$' and text:sub(-1) == '$')
+            and pandoc.Math('InlineMath', text:sub(2, -2)) or pandoc.Str(text)
+        if not nolink and target then
+            elem = pandoc.Link({elem}, '#' .. label, '')
+        end
+        result = use_cleveref and {pandoc.Str(refname .. NBSP), elem} or {elem}
+    end
+
+    -- A bracketed reference keeps its prefix and suffix
+    local s = pandoc.utils.stringify(cite.content)
+    if s:sub(1, 1) == '[' and s:sub(-1) == ']' then
+        local prefix = pandoc.utils.stringify(citation.prefix)
+        local els = pandoc.List(citation.prefix)
+        if #citation.prefix > 0 and not prefix:match('[{+*!]$') then
+            els:insert(pandoc.Space())
+        end
+        els:extend(result)
+        els:extend(citation.suffix)
+        return els, true
+    end
+    return result, false
+end
+
+local process_references
+
+-- Process all references in the list `x`, which is the content of a paragraph if `top` is true
+local function references(x, top)
+    local i = 1
+    while i <= #x do
+        local elem = x[i]
+        if elem.t == 'Cite' and is_label(elem.citations[1].id) then
+            local cite = elem
+            local citation = cite.citations[1]
+            local attributes = {}
+
+            -- Extract the modifier from the end of the citation prefix or the preceding string
+            local prefix = citation.prefix
+            local holder, modifier = nil, nil
+            if #prefix > 0 and prefix[#prefix].t == 'Str' then
+                holder, modifier = 'prefix', prefix[#prefix].text:sub(-1)
+            elseif i > 1 and x[i - 1].t == 'Str' then
+                holder, modifier = 'previous', x[i - 1].text:sub(-1)
+            end
+            if modifier == '*' or modifier == '+' or modifier == '!' then
+                attributes['modifier'] = modifier
+                if holder == 'prefix' then
+                    local last = prefix[#prefix]
+                    if #last.text > 1 then
+                        prefix[#prefix] = pandoc.Str(last.text:sub(1, -2))
+                    else
+                        prefix:remove(#prefix)
+                    end
+                else
+                    if #x[i - 1].text > 1 then
+                        x[i - 1] = pandoc.Str(x[i - 1].text:sub(1, -2))
+                    else
+                        x:remove(i - 1)
+                        i = i - 1
+                    end
+                end
+            end
+
+            -- Remove curly brackets around the reference
+            local suffix = citation.suffix
+            if #prefix > 0 and #suffix > 0 then
+                if prefix[#prefix].t == 'Str' and suffix[1].t == 'Str'
+                        and prefix[#prefix].text:sub(-1) == '{' and suffix[1].text:sub(1, 1) == '}' then
+                    if #suffix[1].text > 1 then
+                        suffix[1] = pandoc.Str(suffix[1].text:sub(2))
+                    else
+                        suffix:remove(1)
+                    end
+                    if #prefix[#prefix].text > 1 then
+                        prefix[#prefix] = pandoc.Str(prefix[#prefix].text:sub(1, -2))
+                    else
+                        prefix:remove(#prefix)
+                    end
+                end
+            elseif i > 1 and i < #x and x[i - 1].t == 'Str' and x[i + 1].t == 'Str'
+                    and x[i - 1].text:sub(-1) == '{' and x[i + 1].text:sub(1, 1) == '}' then
+                if #x[i + 1].text > 1 then
+                    x[i + 1] = pandoc.Str(x[i + 1].text:sub(2))
+                else
+                    x:remove(i + 1)
+                end
+                if #x[i - 1].text > 1 then
+                    x[i - 1] = pandoc.Str(x[i - 1].text:sub(1, -2))
+                else
+                    x:remove(i - 1)
+                    i = i - 1
+                end
+            end
+
+            citation.prefix = process_references(prefix, false)
+            citation.suffix = process_references(suffix, false)
+            local citations = cite.citations
+            citations[1] = citation
+            cite.citations = citations
+
+            -- Attributes may immediately follow the reference
+            if #citation.suffix == 0 and pandoc.utils.stringify(cite.content):sub(-1) ~= ']' then
+                local extra = extract_attributes(x, i + 1)
+                if extra ~= nil then
+                    for _, pair in ipairs(extra.attributes) do
+                        attributes[pair[1]] = pair[2]
+                    end
+                end
+            end
+
+            local result, bracketed = replacement(cite, attributes)
+            if bracketed then
+                -- A bracketed reference may be given attributes, making it a span
+                local span_attr = top and extract_attributes(x, i + 1) or nil
+                if span_attr ~= nil then
+                    result = {pandoc.Span(result, span_attr)}
+                else
+                    table.insert(result, 1, pandoc.Str('['))
+                    table.insert(result, pandoc.Str(']'))
+                end
+            end
+
+            x:remove(i)
+            for j, item in ipairs(result) do
+                x:insert(i + j - 1, item)
+            end
+            i = i + #result
+        else
+            i = i + 1
+        end
+    end
+    return x
+end
+
+process_references = references
+
+local function content_references(top)
+    return function(elem)
+        elem.content = references(elem.content, top)
+        return elem
+    end
+end
+
+-- Metadata -----------------------------------------------------------------------------------------------------
+
+local function meta_value(value)
+    local kind = pandoc.utils.type(value)
+    if kind == 'boolean' or kind == 'string' then
+        return value
+    elseif kind == 'List' then
+        local result = {}
+        for _, item in ipairs(value) do
+            table.insert(result, pandoc.utils.stringify(item))
+        end
+        return result
+    end
+    return pandoc.utils.stringify(value)
+end
+
+local function meta_bool(value)
+    value = meta_value(value)
+    if type(value) == 'boolean' then
+        return value
+    end
+    return value == 'true' or value == 'True' or value == 'TRUE' or value == 'On' or value == 'on'
+end
+
+local function read_settings(meta)
+    for _, name in ipairs {'eqnos-cleveref', 'xnos-cleveref'} do
+        if meta[name] ~= nil then
+            settings.cleveref = meta_bool(meta[name])
+            break
+        end
+    end
+    for _, name in ipairs {'xnos-capitalise', 'xnos-capitalize'} do
+        if meta[name] ~= nil then
+            settings.capitalise = meta_bool(meta[name])
+            break
+        end
+    end
+
+    if meta['eqnos-plus-name'] ~= nil then
+        local value = meta_value(meta['eqnos-plus-name'])
+        local old = {settings.plusname[1], settings.plusname[2]}
+        settings.plusname = type(value) == 'table' and value or {value, settings.plusname[2]}
+        settings.plusname_changed = settings.plusname[1] ~= old[1] or settings.plusname[2] ~= old[2]
+        if settings.plusname_changed then
+            settings.starname = {title(settings.plusname[1]), title(settings.plusname[2])}
+        end
+    end
+
+    if meta['eqnos-star-name'] ~= nil then
+        local value = meta_value(meta['eqnos-star-name'])
+        settings.starname = type(value) == 'table' and value or {value, settings.starname[2]}
+    end
+
+    if meta['eqnos-eqref'] ~= nil then
+        settings.eqref = meta_bool(meta['eqnos-eqref'])
+    end
+    if meta['eqnos-default-env'] ~= nil then
+        settings.default_env = meta_value(meta['eqnos-default-env'])
+    end
+    for _, name in ipairs {'eqnos-number-by-section', 'xnos-number-by-section', 'xnos-number-offset'} do
+        if meta[name] ~= nil then
+            io.stderr:write('eqnos.lua: "' .. name .. '" is not supported and will be ignored\n')
+        end
+    end
+end
+
+function Pandoc(doc)
+    read_settings(doc.meta)
+
+    doc = doc:walk {traverse = 'topdown', Para = attach, Plain = attach}
+    doc = doc:walk {traverse = 'topdown', Span = number}
+    return doc:walk {
+        traverse = 'topdown',
+        Para = content_references(true),
+        Plain = content_references(true),
+        Emph = content_references(false),
+        Strong = content_references(false),
+        Span = content_references(false),
+        Header = content_references(false),
+        Image = function(elem)
+            elem.caption = references(elem.caption, false)
+            return elem
+        end,
+    }
+end
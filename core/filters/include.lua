@@ -0,0 +1,576 @@
+-- Resolve `!include`, `$include` and `!include-header` statements in place of the pandoc-include Python filter,
+-- with identical output. Paragraphs and code blocks consisting of an include statement are replaced
+-- by the parsed contents of the named file(s), which may include further files. Names are globbed relative
+-- to the directory of the including file (metadata `include-entry` for the top level), then relative to
+-- `include-resources` (':'-separated, relative to the working directory). Supported arguments are
+-- startLine, endLine, snippetStart, snippetEnd, includeSnippetDelimiters, dedent, incrementSection, format and raw.
+
+local path = pandoc.path
+local system = pandoc.system
+
+local config_types = {
+    startLine = 'number', endLine = 'number', snippetStart = 'string', snippetEnd = 'string',
+    xslt = 'string', includeSnippetDelimiters = 'boolean', incrementSection = 'number', dedent = 'number',
+    format = 'string', raw = 'string',
+}
+
+local extension_formats = {
+    ['.adoc'] = 'asciidoc', ['.asciidoc'] = 'asciidoc', ['.context'] = 'context', ['.ctx'] = 'context',
+    ['.db'] = 'docbook', ['.doc'] = 'doc', ['.docx'] = 'docx', ['.dokuwiki'] = 'dokuwiki', ['.epub'] = 'epub',
+    ['.fb2'] = 'fb2', ['.htm'] = 'html', ['.html'] = 'html', ['.icml'] = 'icml', ['.json'] = 'json',
+    ['.latex'] = 'latex', ['.lhs'] = 'markdown+lhs', ['.ltx'] = 'latex', ['.markdown'] = 'markdown',
+    ['.mkdn'] = 'markdown', ['.mkd'] = 'markdown', ['.mdwn'] = 'markdown', ['.mdown'] = 'markdown',
+    ['.Rmd'] = 'markdown', ['.md'] = 'markdown', ['.ms'] = 'ms', ['.muse'] = 'muse', ['.native'] = 'native',
+    ['.odt'] = 'odt', ['.opml'] = 'opml', ['.org'] = 'org', ['.pdf'] = 'pdf', ['.pptx'] = 'pptx',
+    ['.roff'] = 'ms', ['.rst'] = 'rst', ['.rtf'] = 'rtf', ['.s5'] = 's5', ['.t2t'] = 't2t', ['.tei'] = 'tei',
+    ['.tex'] = 'latex', ['.texi'] = 'texinfo', ['.texinfo'] = 'texinfo', ['.text'] = 'markdown',
+    ['.textile'] = 'textile', ['.txt'] = 'markdown', ['.wiki'] = 'mediawiki', ['.xhtml'] = 'html',
+    ['.ipynb'] = 'ipynb', ['.csv'] = 'csv', ['.bib'] = 'biblatex', ['.xml'] = 'xml', ['.xslt'] = 'xslt',
+}
+
+local options = {
+    entry = '.',
+    resources = '.',
+    order = 'natural',
+    rewrite_path = true,
+    not_found_error = (os.getenv('PANDOC_INCLUDE_NOT_FOUND_ERROR') or '0') ~= '0'
+        and os.getenv('PANDOC_INCLUDE_NOT_FOUND_ERROR') ~= '',
+}
+
+local function warn(message)
+    io.stderr:write('[WARNING] ' .. message .. '\n')
+end
+
+local function strip(s)
+    return (s:gsub('^%s+', ''):gsub('%s+$', ''))
+end
+
+-- Paths ----------------------------------------------------------------------------------------------------------
+
+local function is_directory(name)
+    return (pcall(system.list_directory, name == '' and '.' or name))
+end
+
+local function exists(name)
+    local file = io.open(name, 'r')
+    if file == nil then
+        return false
+    end
+    file:close()
+    return true
+end
+
+local function is_file(name)
+    return exists(name) and not is_directory(name)
+end
+
+-- Translate a shell wildcard (a single path component) to an anchored Lua pattern
+local function wildcard_pattern(wildcard)
+    local out = {'^'}
+    local i = 1
+    while i <= #wildcard do
+        local char = wildcard:sub(i, i)
+        if char == '*' then
+            table.insert(out, '.*')
+        elseif char == '?' then
+            table.insert(out, '.')
+        elseif char == '[' and wildcard:find(']', i + 2, true) then
+            local close = wildcard:find(']', i + 2, true)
+            local set = wildcard:sub(i + 1, close - 1):gsub('^!', '^'):gsub('%%', '%%%%')
+            table.insert(out, '[' .. set .. ']')
+            i = close
+        else
+            table.insert(out, (char:gsub('%W', '%%%0')))
+        end
+        i = i + 1
+    end
+    table.insert(out, '$')
+    return table.concat(out)
+end
+
+local function has_magic(s)
+    return s:find('[%*%?%[]') ~= nil
+end
+
+local function list(directory)
+    local ok, entries = pcall(system.list_directory, directory == '' and '.' or directory)
+    if not ok then
+        return {}
+    end
+    table.sort(entries)
+    return entries
+end
+
+-- All descendant directories of `directory` (including itself), skipping hidden ones, as Python's glob does
+local function walk_directories(directory, result)
+    table.insert(result, directory)
+    for _, name in ipairs(list(directory)) do
+        local child = directory == '' and name or path.join {directory, name}
+        if name:sub(1, 1) ~= '.' and is_directory(child) then
+            walk_directories(child, result)
+        end
+    end
+    return result
+end
+
+-- Expand a glob relative to the directory `base`, returning names relative to it (or absolute if the glob is)
+local function glob(pattern, base)
+    local function resolve(name)
+        return (path.is_absolute(name) or base == '.') and name or path.join {base, name}
+    end
+
+    if not has_magic(pattern) then
+        return exists(resolve(pattern)) and {pattern} or {}
+    end
+
+    local parts = path.split(pattern)
+    local current = {''}
+    local first = 1
+    if path.is_absolute(pattern) then
+        current, first = {parts[1]}, 2
+    end
+
+    for index = first, #parts do
+        local part = parts[index]
+        local last = index == #parts
+        local next = {}
+        for _, prefix in ipairs(current) do
+            local directory = prefix == '' and base or resolve(prefix)
+
+            local function add(name)
+                table.insert(next, prefix == '' and name or path.join {prefix, name})
+            end
+
+            if part == '**' then
+                for _, sub in ipairs(walk_directories(directory, {})) do
+                    if sub == directory then
+                        if not last then
+                            table.insert(next, prefix)
+                        end
+                    else
+                        add(sub:sub(#directory + 2))
+                    end
+                end
+                if last then
+                    for _, name in ipairs(list(directory)) do
+                        if name:sub(1, 1) ~= '.' and not is_directory(path.join {directory, name}) then
+                            add(name)
+                        end
+                    end
+                end
+            elseif has_magic(part) then
+                local lua_pattern = wildcard_pattern(part)
+                for _, name in ipairs(list(directory)) do
+                    if (name:sub(1, 1) ~= '.' or part:sub(1, 1) == '.') and name:match(lua_pattern)
+                            and (last or is_directory(path.join {directory, name})) then
+                        add(name)
+                    end
+                end
+            else
+                local name = path.join {directory, part}
+                if (last and exists(name)) or is_directory(name) then
+                    add(part)
+                end
+            end
+        end
+        current = next
+    end
+    return current
+end
+
+-- Natural order, as natsort does: runs of digits compare as numbers
+local function natural_key(s)
+    local key = {}
+    for text, digits in s:gmatch('(%D*)(%d*)') do
+        if text == '' and digits == '' then
+            break
+        end
+        table.insert(key, text)
+        table.insert(key, digits == '' and -1 or tonumber(digits))
+    end
+    return key
+end
+
+local function natural_less(a, b)
+    local ka, kb = natural_key(a), natural_key(b)
+    for i = 1, math.min(#ka, #kb) do
+        if ka[i] ~= kb[i] then
+            return ka[i] < kb[i]
+        end
+    end
+    return #ka < #kb
+end
+
+-- Find included files as a list of {name = as globbed, file = path relative to the working directory}
+local function find_files(name, cwd)
+    local files = {}
+    for _, found in ipairs(glob(name, cwd)) do
+        table.insert(files, {name = found, file = (path.is_absolute(found) or cwd == '.') and found
+            or path.join {cwd, found}})
+    end
+
+    if #files == 0 and options.resources ~= '' then
+        -- Resource paths are relative to the working directory, not to the including file
+        for resource in (options.resources .. ':'):gmatch('([^:]*):') do
+            for _, found in ipairs(glob(path.normalize(path.join {resource, name}), '.')) do
+                table.insert(files, {name = found, file = found})
+            end
+        end
+    end
+    return files
+end
+
+-- Include statements -------------------------------------------------------------------------------------------
+
+local function parse_config(text)
+    local config = {}
+    local pos = 1
+    while pos <= #text do
+        local start, finish, key = text:find('([%w_]+)=', pos)
+        if start == nil then
+            break
+        end
+
+        local quote = text:sub(finish + 1, finish + 1)
+        if not quote:match('["\'`]') then
+            quote = ''
+        end
+
+        -- The value is the shortest string followed by the closing quote and then a comma or the end
+        local value_start = finish + 1 + #quote
+        local value, after
+        local search = value_start
+        while true do
+            local close = quote == '' and search or text:find(quote, search, true)
+            if close == nil then
+                break
+            end
+            local rest = close + #quote
+            if rest > #text or text:sub(rest, rest) == ',' then
+                value, after = text:sub(value_start, close - 1), rest + 1
+                break
+            end
+            search = close + 1
+            if search > #text + 1 then
+                break
+            end
+        end
+
+        if value == nil then
+            pos = start + 1
+        else
+            if config_types[key] == nil then
+                io.stderr:write('[Warn] Invalid config key: ' .. key .. '\n')
+            else
+                local parsed
+                if quote == '"' or quote == "'" then
+                    parsed = value
+                elseif quote == '' and value:match('^[+-]?%d+$') then
+                    parsed = tonumber(value)
+                elseif quote == '' and (value == 'True' or value == 'False') then
+                    parsed = value == 'True'
+                else
+                    error('Invalid config: ' .. key .. '=' .. quote .. value .. quote)
+                end
+                if type(parsed) ~= config_types[key] then
+                    error('Invalid value type: ' .. key .. '=' .. quote .. value .. quote)
+                end
+                config[key] = parsed
+            end
+            pos = after
+        end
+    end
+    return config
+end
+
+-- Parse an include statement into (is_header, name, config), or nil if it is not one
+local function parse_include(raw)
+    local s = raw:gsub('\\%*', '*'):gsub('\n', ' '):gsub('\\_', '_')
+    if not (s:match('^\\?[!$]include') ) then
+        return nil
+    end
+
+    local is_header = s:match('^\\?[!$]include%-header') ~= nil
+    local rest = s:match('^\\?[!$]include%-header(.*)$')
+    if rest == nil then
+        rest = s:match('^\\?[!$]include(.*)$')
+    end
+
+    local config = {}
+    local args, after = rest:match('^`([^`]+)`(.*)$')
+    if args ~= nil then
+        config = parse_config(args)
+        rest = after
+    end
+
+    local name = rest:match('^%s+(.*)$')
+    if name ~= nil and not name:match('^[^`\'"]+$') then
+        local quote = name:sub(1, 1)
+        if quote:match('[`\'"]') and #name >= 3 and name:sub(-1) == quote then
+            name = name:sub(2, -2)
+        else
+            name = nil
+        end
+    end
+    if name == nil or name == '' then
+        error('Unable to extract info from include line ' .. s)
+    end
+    return is_header, name, config
+end
+
+local function is_include_paragraph(elem)
+    local first = elem.content[1]
+    if first == nil or first.t ~= 'Str' or not first.text:match('^\\?[!$]include') then
+        return nil
+    end
+    return parse_include(strip(pandoc.write(pandoc.Pandoc {elem}, 'markdown_strict')))
+end
+
+-- File contents --------------------------------------------------------------------------------------------------
+
+local function split_lines(content)
+    local lines = {}
+    for line in (content .. '\n'):gmatch('(.-)\n') do
+        table.insert(lines, line)
+    end
+    return lines
+end
+
+-- Number of leading whitespace characters of `s` to skip, including a newline if that is where they stop
+local function skip_whitespace(s)
+    local pos = s:find('[^ \t\r\f\v]')
+    if pos == nil then
+        return nil
+    end
+    return s:sub(pos, pos) == '\n' and pos or pos - 1
+end
+
+local function read_file(name, config)
+    local file = assert(io.open(name, 'r'))
+    local content = file:read('a')
+    file:close()
+
+    if config.xslt ~= nil then
+        error('XSLT transformations of included files are not supported')
+    end
+
+    if config.startLine ~= nil or config.endLine ~= nil then
+        local lines = split_lines(content)
+        local first = (config.startLine or 1) - 1
+        local last = config.endLine or #lines
+        if first < 0 then
+            first = first + #lines
+        end
+        if last < 0 then
+            last = last + #lines + 1
+        end
+        content = table.concat(lines, '\n', math.max(first, 0) + 1, math.min(last, #lines))
+    end
+
+    if config.snippetStart ~= nil or config.snippetEnd ~= nil then
+        local start = 1
+        local snippets = {}
+        local delimiters = config.includeSnippetDelimiters or false
+
+        while start <= #content do
+            local pos = config.snippetStart and content:find(config.snippetStart, start, true) or nil
+            if pos ~= nil then
+                start = pos
+            elseif start ~= 1 then
+                break
+            end
+
+            if not delimiters then
+                start = start + #(config.snippetStart or '')
+                local skip = skip_whitespace(content:sub(start))
+                if skip == nil then
+                    break
+                end
+                start = start + skip
+            end
+
+            local finish = config.snippetEnd and content:find(config.snippetEnd, start, true) or nil
+            if finish == nil then
+                table.insert(snippets, content:sub(start))
+                break
+            end
+
+            local sub_end
+            if delimiters then
+                finish = finish + #config.snippetEnd
+                sub_end = finish
+            else
+                local skip = skip_whitespace(content:sub(start, finish - 1):reverse())
+                sub_end = skip == nil and finish or finish - skip
+            end
+            table.insert(snippets, content:sub(start, sub_end - 1))
+            start = finish
+        end
+        content = table.concat(snippets, '\n')
+    end
+
+    if config.dedent ~= nil then
+        local lines = {}
+        for _, line in ipairs(split_lines(content)) do
+            local pos = line:find('[^%s]')
+            if pos ~= nil then
+                table.insert(lines, config.dedent < 0 and line:sub(pos) or line:sub(math.min(pos - 1, config.dedent) + 1))
+            else
+                table.insert(lines, line)
+            end
+        end
+        content = table.concat(lines, '\n')
+    end
+
+    return content
+end
+
+-- Processing -----------------------------------------------------------------------------------------------------
+
+local process
+
+local function files_for(name, cwd)
+    local files = find_files(name, cwd)
+    if #files == 0 then
+        local message = 'Included file not found: ' .. name
+        if options.not_found_error then
+            error(message)
+        end
+        warn(message)
+        return nil
+    end
+
+    if options.order == 'natural' then
+        table.sort(files, function(a, b) return natural_less(a.name, b.name) end)
+    elseif options.order == 'alphabetical' then
+        table.sort(files, function(a, b) return a.name < b.name end)
+    elseif options.order ~= 'default' then
+        error('Invalid file order: ' .. options.order)
+    end
+    return files
+end
+
+-- Process a list of blocks whose include statements are relative to `cwd`, and which was included
+-- at `current` relative to the entry point. Metadata of included files is merged into `meta`.
+process = function(blocks, cwd, current, meta)
+    return pandoc.Pandoc(blocks):walk {
+        Para = function(elem)
+            local is_header, name, config = is_include_paragraph(elem)
+            if is_header == nil then
+                return nil
+            end
+
+            local files = files_for(name, cwd)
+            if files == nil then
+                return nil
+            end
+
+            local elements = {}
+            for _, found in ipairs(files) do
+                local file = found.file
+                if not is_file(file) then
+                    error('Included file not found: ' .. found.name)
+                end
+
+                local raw = read_file(file, config)
+                local directory = path.directory(file)
+                local sub_current = path.normalize(path.join {current, path.directory(found.name)})
+
+                local new_blocks
+                local new_meta
+                if not is_header then
+                    if config.raw ~= nil then
+                        new_blocks = {pandoc.RawBlock(config.raw, raw)}
+                    else
+                        local format = config.format or extension_formats[file:match('(%.[^./]*)$') or ''] or 'markdown'
+                        local new_doc = pandoc.read(raw, format)
+                        new_meta = new_doc.meta
+                        new_blocks = process(new_doc.blocks, directory, sub_current, new_meta)
+                    end
+                else
+                    new_meta = pandoc.read('---\n' .. raw .. '\n---').meta
+                end
+
+                if new_meta ~= nil then
+                    for key, value in pairs(new_meta) do
+                        if meta[key] == nil then
+                            meta[key] = value
+                        end
+                    end
+                end
+
+                local increment = config.incrementSection or 0
+                if new_blocks ~= nil then
+                    for _, block in ipairs(new_blocks) do
+                        if increment ~= 0 and block.t == 'Header' then
+                            block.level = block.level + increment
+                        end
+                        table.insert(elements, block)
+                    end
+                end
+            end
+            return elements
+        end,
+
+        CodeBlock = function(elem)
+            local is_header, name, config = parse_include(strip(elem.text))
+            if is_header == nil then
+                return nil
+            end
+            if is_header then
+                io.stderr:write('[WARN] Invalid !include-header in code blocks\n')
+                return nil
+            end
+
+            local files = find_files(name, cwd)
+            if #files == 0 then
+                local message = 'Included file not found: ' .. name
+                if options.not_found_error then
+                    error(message)
+                end
+                warn(message)
+                return nil
+            end
+
+            local codes = {}
+            for _, found in ipairs(files) do
+                table.insert(codes, read_file(found.file, config))
+            end
+            elem.text = table.concat(codes, '\n')
+            return elem
+        end,
+
+        Image = function(elem)
+            if not options.rewrite_path then
+                return nil
+            end
+            if elem.src:match('^%a[%w+.-]*:') or path.is_absolute(elem.src) then
+                return nil
+            end
+            elem.src = path.normalize(path.join {options.entry, current, elem.src})
+            return elem
+        end,
+    }.blocks
+end
+
+local function meta_string(value)
+    if value == nil then
+        return nil
+    elseif type(value) == 'boolean' then
+        return value
+    end
+    return pandoc.utils.stringify(value)
+end
+
+function Pandoc(doc)
+    options.entry = meta_string(doc.meta['include-entry']) or options.entry
+    options.order = meta_string(doc.meta['include-order']) or options.order
+    options.resources = meta_string(doc.meta['include-resources']) or options.resources
+    local rewrite = meta_string(doc.meta['rewrite-path'])
+    if rewrite ~= nil then
+        options.rewrite_path = rewrite ~= false and rewrite ~= ''
+    end
+
+    doc.blocks = process(doc.blocks, options.entry, '.', doc.meta)
+    return doc
+end
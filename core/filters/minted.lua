@@ -0,0 +1,120 @@
+-- Typeset code with minted in LaTeX, replacing the pandoc-minted Python filter with identical output.
+-- The language is taken from the first class of the code element, falling back to the `pandoc-minted.language`
+-- metadata field, and all other attributes are passed to minted as its options.
+-- Code blocks without attributes are taken from the content-addressed cache of core/builder/highlight.py instead,
+-- already highlighted by Pygments, if configured by metadata (all blocks missing from it are highlighted by a single
+-- call of the highlighter, and blocks it cannot highlight are left to minted):
+--   highlight-cache   the cache directory
+--   highlight-salt    identifies Pygments and the style, part of every key
+--   highlight-python  the Python interpreter to run the highlighter with
+
+local function default_language(meta)
+    local settings = meta['pandoc-minted']
+    if pandoc.utils.type(settings) ~= 'table' then
+        return 'text'
+    end
+
+    local language = settings['language']
+    if pandoc.utils.type(language) == 'Inlines' and #language > 0 then
+        return language[1].text
+    else
+        -- pandoc-minted fails to recognise any other value, and so do we
+        return 'None'
+    end
+end
+
+local function unpack(elem, language)
+    if #elem.classes > 0 then
+        language = elem.classes[1]
+    end
+
+    local attributes = {}
+    for _, pair in ipairs(elem.attributes) do
+        table.insert(attributes, pair[1] .. '=' .. pair[2])
+    end
+    return language, table.concat(attributes, ', ')
+end
+
+local function hex(text)
+    return (text:gsub('.', function(char) return string.format('%02x', char:byte()) end))
+end
+
+local function read(path)
+    local file = io.open(path, 'r')
+    if file == nil then
+        return nil
+    end
+    local content = file:read('a')
+    file:close()
+    return content
+end
+
+-- Returns a function giving the cached highlighted block of a code element, or nil if it has to be left to minted
+local function highlighted(doc, language)
+    if doc.meta['highlight-salt'] == nil then
+        return function() return nil end
+    end
+
+    local directory = pandoc.utils.stringify(doc.meta['highlight-cache'])
+    local salt = pandoc.utils.stringify(doc.meta['highlight-salt'])
+    local python = pandoc.utils.stringify(doc.meta['highlight-python'])
+
+    -- Must agree with HighlightCache.key and HighlightCache.path
+    local function path(elem)
+        if #elem.attributes > 0 then
+            return nil
+        end
+        local lang = unpack(elem, language)
+        local key = pandoc.utils.sha1(salt .. '\0' .. lang .. '\0' .. elem.text)
+        return directory .. '/' .. key:sub(1, 2) .. '/' .. key, lang
+    end
+
+    local missing, request = {}, {}
+    doc:walk({
+        CodeBlock = function(elem)
+            local file, lang = path(elem)
+            if file ~= nil and missing[file] == nil and read(file) == nil then
+                missing[file] = true
+                table.insert(request, lang .. ' ' .. hex(elem.text))
+            end
+        end,
+    })
+
+    if #request > 0 then
+        local ok, message = pcall(pandoc.pipe, python, {'-m', 'core.builder.highlight', directory, salt},
+                                  table.concat(request, '\n') .. '\n')
+        if not ok then
+            io.stderr:write('minted: highlighting failed, code is left to minted: ', tostring(message), '\n')
+        end
+    end
+
+    return function(elem)
+        local file = path(elem)
+        return file ~= nil and read(file) or nil
+    end
+end
+
+function Pandoc(doc)
+    if FORMAT ~= 'latex' then
+        return nil
+    end
+
+    local language = default_language(doc.meta)
+    local cached = highlighted(doc, language)
+    return doc:walk {
+        CodeBlock = function(elem)
+            local block = cached(elem)
+            if block ~= nil then
+                return pandoc.RawBlock('latex', block)
+            end
+
+            local lang, attributes = unpack(elem, language)
+            return pandoc.RawBlock('latex',
+                '\\begin{minted}[' .. attributes .. ']{' .. lang .. '}\n' .. elem.text .. '\n\\end{minted}')
+        end,
+        Code = function(elem)
+            local lang, attributes = unpack(elem, language)
+            return pandoc.RawInline('latex', '\\mintinline[' .. attributes .. ']{' .. lang .. '}{' .. elem.text .. '}')
+        end,
+    }
+end
@@ -0,0 +1,79 @@
+-- Render the parsed document to another output format as well, so that a file is parsed only once per run.
+-- Must be the first filter. Configured by metadata, which is removed before any other filter sees it:
+--   render-to      the additional output format
+--   render-output  path to write it to
+--   render-math    HTML math method, `mathjax`, `mathml` or `webtex:<url>`
+--   render-filter  the filter chain of the other format, in order, as `json:<program>` or `lua:<path>`
+
+local function strings(value)
+    if value == nil then
+        return {}
+    elseif pandoc.utils.type(value) == 'List' then
+        return value:map(pandoc.utils.stringify)
+    else
+        return {pandoc.utils.stringify(value)}
+    end
+end
+
+-- Load a Lua filter file as pandoc would, but with FORMAT set to `format`
+local function load_filters(path, format)
+    local env = setmetatable({FORMAT = format}, {__index = _G})
+    local result = assert(loadfile(path, 't', env))()
+    if type(result) == 'table' then
+        return result[1] ~= nil and result or {result}
+    end
+
+    local filter = {}
+    for key, value in pairs(env) do
+        if key ~= 'FORMAT' then
+            filter[key] = value
+        end
+    end
+    return {filter}
+end
+
+local function math_method(value)
+    local method, url = value:match('^([^:]+):(.*)$')
+    if method == nil then
+        return value
+    end
+    return {method = method, url = url}
+end
+
+function Pandoc(doc)
+    local format = doc.meta['render-to']
+    if format == nil then
+        return nil
+    end
+
+    format = pandoc.utils.stringify(format)
+    local output = pandoc.utils.stringify(doc.meta['render-output'])
+    local options = {}
+    if doc.meta['render-math'] ~= nil then
+        options.html_math_method = math_method(pandoc.utils.stringify(doc.meta['render-math']))
+    end
+    local chain = strings(doc.meta['render-filter'])
+    for _, key in ipairs({'render-to', 'render-output', 'render-math', 'render-filter'}) do
+        doc.meta[key] = nil
+    end
+
+    local other = doc
+    for _, spec in ipairs(chain) do
+        local kind, name = spec:match('^(%a+):(.*)$')
+        if kind == 'json' then
+            other = pandoc.utils.run_json_filter(other, name, {format})
+        elseif kind == 'lua' then
+            for _, filter in ipairs(load_filters(name, format)) do
+                other = other:walk(filter)
+            end
+        else
+            error('Unknown filter specification ' .. spec)
+        end
+    end
+
+    -- pandoc itself ends the output with a newline
+    local file = assert(io.open(output, 'w'))
+    file:write(pandoc.write(other, format, options), '\n')
+    file:close()
+    return doc
+end
@@ -0,0 +1,374 @@
+-- Expand the siunitx commands we use (\num, \qty, \unit, \ang, ranges and lists, and the old \SI and \si)
+-- in formulas to plain TeX, formatted as configured in core/latex/siunitx.tex, so that pandoc's `--mathml`
+-- typesets them like the PDFs. Units declared there with \DeclareSIUnit are read from the file.
+-- Only for HTML with `convert.py --math mathml`, configured by metadata:
+--   siunitx-decimal-marker  output decimal marker of the locale
+--   siunitx-and             final separator of lists of the locale
+
+if FORMAT:match('^html') == nil then
+    return {}
+end
+
+local prefixes = {
+    quecto = 'q', ronto = 'r', yocto = 'y', zepto = 'z', atto = 'a', femto = 'f', pico = 'p', nano = 'n',
+    micro = 'µ', milli = 'm', centi = 'c', deci = 'd', deca = 'da', deka = 'da', hecto = 'h', kilo = 'k',
+    mega = 'M', giga = 'G', tera = 'T', peta = 'P', exa = 'E', zetta = 'Z', yotta = 'Y', ronna = 'R', quetta = 'Q',
+}
+
+local units = {
+    metre = 'm', meter = 'm', gram = 'g', kilogram = 'kg', second = 's', ampere = 'A', kelvin = 'K', mole = 'mol',
+    candela = 'cd', radian = 'rad', steradian = 'sr', hertz = 'Hz', newton = 'N', pascal = 'Pa', joule = 'J',
+    watt = 'W', coulomb = 'C', volt = 'V', farad = 'F', ohm = 'Ω', siemens = 'S', weber = 'Wb', tesla = 'T',
+    henry = 'H', degreeCelsius = '°C', lumen = 'lm', lux = 'lx', becquerel = 'Bq', gray = 'Gy', sievert = 'Sv',
+    katal = 'kat', minute = 'min', hour = 'h', day = 'd', degree = '°', arcminute = '′', arcsecond = '″',
+    hectare = 'ha', litre = 'L', liter = 'L', tonne = 't', electronvolt = 'eV', dalton = 'Da',
+    atomicmassunit = 'u', astronomicalunit = 'au', bel = 'B', decibel = 'dB', neper = 'Np', percent = '%',
+    bar = 'bar', angstrom = 'Å', barn = 'b', knot = 'kn', mmHg = 'mmHg', nauticalmile = 'M',
+}
+
+-- Units typeset right after the number, without the number-unit product
+local unspaced = {['°'] = true, ['′'] = true, ['″'] = true}
+
+-- Commands inside the symbols of our own units, which texmath does not know
+local symbol_commands = {
+    {'\\kern%-?[%d.]+em', ''}, {'\\ensuremath', ''}, {'\\textperthousand', '‰'}, {'\\Sun', '\\odot'},
+    {'\\Earth', '\\oplus'},
+}
+
+-- Return the balanced group starting at `position` (which must hold `open`) and the position after it
+local function group(text, position, open, close)
+    local depth = 0
+    for i = position, #text do
+        local char = text:sub(i, i)
+        if char == '\\' then
+            -- skip escaped characters such as \{
+        elseif char == open and text:sub(i - 1, i - 1) ~= '\\' then
+            depth = depth + 1
+        elseif char == close and text:sub(i - 1, i - 1) ~= '\\' then
+            depth = depth - 1
+            if depth == 0 then
+                return text:sub(position + 1, i - 1), i + 1
+            end
+        end
+    end
+    return nil, position
+end
+
+local function read_declared_units(path)
+    local file = io.open(path, 'r')
+    if file == nil then
+        return
+    end
+    local text = file:read('a')
+    file:close()
+
+    local position = 1
+    while true do
+        local start, stop, name = text:find('\\DeclareSIUnit%s*{\\(%a+)}%s*', position)
+        if start == nil then
+            return
+        end
+        local symbol, after = group(text, stop + 1, '{', '}')
+        if symbol == nil then
+            return
+        end
+        for _, pair in ipairs(symbol_commands) do
+            symbol = symbol:gsub(pair[1], pair[2])
+        end
+        units[name] = symbol
+        position = after
+    end
+end
+
+read_declared_units('core/latex/siunitx.tex')
+
+local decimal_marker = '.'
+local final_separator = 'and'
+
+local function trim(text)
+    return (text:gsub('^%s+', ''):gsub('%s+$', ''))
+end
+
+-- Digits separated into groups of three by thin spaces, if there are at least five of them
+local function grouped(digits, from_left)
+    if #digits < 5 then
+        return digits
+    end
+    local groups = {}
+    if from_left then
+        for i = 1, #digits, 3 do
+            table.insert(groups, digits:sub(i, i + 2))
+        end
+    else
+        local first = #digits % 3
+        if first > 0 then
+            table.insert(groups, digits:sub(1, first))
+        end
+        for i = first + 1, #digits, 3 do
+            table.insert(groups, digits:sub(i, i + 2))
+        end
+    end
+    return table.concat(groups, '\\,')
+end
+
+local function mantissa(text)
+    local integer, fraction = text:match('^(%d*)%.(%d*)$')
+    if integer == nil then
+        integer = text:match('^(%d+)$')
+        if integer == nil then
+            return nil
+        end
+        return grouped(integer)
+    end
+    local marker = decimal_marker == ',' and '{,}' or decimal_marker
+    return grouped(integer == '' and '0' or integer) .. marker .. grouped(fraction, true)
+end
+
+-- Format a number as siunitx would, or return it unchanged if it is not a plain number
+local function number(text)
+    text = trim(text)
+    local value, uncertainty = text:match('^(.-)%s*%+%-%s*(.+)$')
+    if value == nil then
+        value, uncertainty = text:match('^(.-)%s*\\pm%s*(.+)$')
+    end
+    if value ~= nil then
+        return number(value) .. ' \\pm ' .. number(uncertainty)
+    end
+
+    -- Compact uncertainty 1.23(4) is printed separately as 1.23 ± 0.04
+    local base, digits, rest = text:match('^([+-]?%d*%.?%d+)%((%d+)%)(.*)$')
+    if base ~= nil then
+        local places = #(base:match('%.(%d+)$') or '')
+        local value_uncertainty = places == 0 and digits or string.format('%.' .. places .. 'f', tonumber(digits) / 10 ^ places)
+        return number(base .. rest) .. ' \\pm ' .. number(value_uncertainty .. rest)
+    end
+
+    local sign, body = text:match('^([+-]?)%s*(.*)$')
+    local significand, exponent = body:match('^(.-)[eE]%s*([+-]?%d+)$')
+    if significand == nil then
+        significand = body
+    end
+    local result
+    if significand == '' and exponent ~= nil then
+        result = ''
+    else
+        result = mantissa(significand)
+        if result == nil then
+            return text
+        end
+    end
+    if exponent ~= nil then
+        exponent = exponent:gsub('^%+', '')
+        result = result == '' and ('10^{' .. exponent .. '}') or (result .. ' \\cdot 10^{' .. exponent .. '}')
+    end
+    return sign .. result
+end
+
+-- Typeset a unit such as \kilo\metre\per\second\squared, in the reciprocal per-mode, with nothing between units
+local function unit(text)
+    text = trim(text)
+    if not text:match('^\\') then
+        return '\\mathrm{' .. text .. '}', unspaced[text] ~= nil
+    end
+
+    local parts = {}
+    local prefix, power, per = '', nil, false
+    local position = 1
+    while position <= #text do
+        local start, stop, name = text:find('^%s*\\(%a+)%s*', position)
+        if start == nil then
+            -- Anything else is taken literally
+            local char = text:sub(position, position)
+            if char:match('%S') then
+                table.insert(parts, {symbol = char, power = 1})
+            end
+            position = position + 1
+        else
+            position = stop + 1
+            local argument
+            if name == 'tothe' or name == 'raiseto' or name == 'of' then
+                argument, position = group(text, position, '{', '}')
+                argument = argument or ''
+            end
+
+            if prefixes[name] ~= nil then
+                prefix = prefix .. prefixes[name]
+            elseif name == 'per' then
+                per = true
+            elseif name == 'square' then
+                power = 2
+            elseif name == 'cubic' then
+                power = 3
+            elseif name == 'raiseto' then
+                power = argument
+            elseif name == 'squared' or name == 'cubed' or name == 'tothe' then
+                if #parts > 0 then
+                    local last = parts[#parts]
+                    local value = name == 'squared' and 2 or (name == 'cubed' and 3 or argument)
+                    last.power = last.negative and ('-' .. value) or value
+                end
+            elseif name == 'of' then
+                if #parts > 0 then
+                    parts[#parts].subscript = argument
+                end
+            elseif units[name] ~= nil then
+                local exponent = power or 1
+                table.insert(parts, {
+                    symbol = prefix .. units[name],
+                    power = per and ('-' .. exponent) or exponent,
+                    negative = per,
+                })
+                prefix, power, per = '', nil, false
+            else
+                -- Unknown commands are kept as they are
+                table.insert(parts, {symbol = '\\' .. name, power = 1, raw = true})
+            end
+        end
+    end
+
+    local result = {}
+    for _, part in ipairs(parts) do
+        local piece = part.raw and part.symbol or ('\\mathrm{' .. part.symbol .. '}')
+        if part.subscript ~= nil then
+            piece = piece .. '_{\\mathrm{' .. part.subscript .. '}}'
+        end
+        if tostring(part.power) ~= '1' then
+            piece = piece .. '^{' .. tostring(part.power) .. '}'
+        end
+        table.insert(result, piece)
+    end
+    return table.concat(result), #parts == 1 and unspaced[parts[1].symbol] ~= nil
+end
+
+local function quantity(value, units_text)
+    local typeset, attached = unit(units_text)
+    return number(value) .. (attached and '' or '\\ ') .. typeset
+end
+
+local function split(text)
+    local items = {}
+    for item in (text .. ';'):gmatch('([^;]*);') do
+        table.insert(items, item)
+    end
+    return items
+end
+
+local function list(items)
+    if #items <= 1 then
+        return items[1] or ''
+    end
+    -- As list-final-separator and list-pair-separator of core/templates/override.jtt, without a serial comma
+    local last = table.remove(items)
+    return table.concat(items, '\\text{,}\\ ') .. '\\text{ ' .. final_separator .. ' }' .. last
+end
+
+local function angle(text)
+    local symbols = {'^{\\circ}', '\'', '\'\''}
+    local result = {}
+    for i, part in ipairs(split(text)) do
+        if trim(part) ~= '' and symbols[i] ~= nil then
+            table.insert(result, number(part) .. symbols[i])
+        end
+    end
+    return table.concat(result)
+end
+
+local range = '\\text{ -- }'
+
+-- Number of mandatory arguments and the expansion of every command
+local commands = {
+    num = {1, function(a) return number(a) end},
+    qty = {2, quantity},
+    SI = {2, quantity},
+    unit = {1, function(a) return (unit(a)) end},
+    si = {1, function(a) return (unit(a)) end},
+    ang = {1, angle},
+    numrange = {2, function(a, b) return number(a) .. range .. number(b) end},
+    qtyrange = {3, function(a, b, u) return quantity(a, u) .. range .. quantity(b, u) end},
+    SIrange = {3, function(a, b, u) return quantity(a, u) .. range .. quantity(b, u) end},
+    numlist = {1, function(a)
+        local items = {}
+        for _, item in ipairs(split(a)) do table.insert(items, number(item)) end
+        return list(items)
+    end},
+    qtylist = {2, function(a, u)
+        local items = {}
+        for _, item in ipairs(split(a)) do table.insert(items, quantity(item, u)) end
+        return list(items)
+    end},
+}
+commands.SIlist = commands.qtylist
+
+-- Expand all siunitx commands in TeX `text`, returning it and whether anything was expanded
+local function expand(text)
+    local result = {}
+    local position = 1
+    local expanded = false
+    while true do
+        local start, stop, name = text:find('\\(%a+)', position)
+        if start == nil then
+            table.insert(result, text:sub(position))
+            break
+        end
+        table.insert(result, text:sub(position, start - 1))
+
+        local command = commands[name]
+        local arguments, after = {}, stop + 1
+        if command ~= nil then
+            after = text:find('%S', after) or after
+            if text:sub(after, after) == '[' then
+                local _, next = group(text, after, '[', ']')
+                after = text:find('%S', next) or next
+            end
+            for _ = 1, command[1] do
+                after = text:find('%S', after) or after
+                local argument
+                argument, after = group(text, after, '{', '}')
+                if argument == nil then
+                    break
+                end
+                table.insert(arguments, argument)
+            end
+        end
+
+        if command ~= nil and #arguments == command[1] then
+            table.insert(result, '{' .. command[2](table.unpack(arguments)) .. '}')
+            expanded = true
+            position = after
+        else
+            table.insert(result, text:sub(start, stop))
+            position = stop + 1
+        end
+    end
+    return table.concat(result), expanded
+end
+
+function Meta(meta)
+    if meta['siunitx-decimal-marker'] ~= nil then
+        decimal_marker = pandoc.utils.stringify(meta['siunitx-decimal-marker'])
+    end
+    if meta['siunitx-and'] ~= nil then
+        final_separator = pandoc.utils.stringify(meta['siunitx-and'])
+    end
+end
+
+function Math(elem)
+    local text, expanded = expand(elem.text)
+    if expanded then
+        elem.text = text
+        return elem
+    end
+end
+
+-- A siunitx command outside of math would be dropped from HTML, so it is typeset as math
+function RawInline(elem)
+    if elem.format ~= 'tex' and elem.format ~= 'latex' then
+        return nil
+    end
+    local text, expanded = expand(elem.text)
+    if expanded then
+        return pandoc.Math('InlineMath', text)
+    end
+end
+
+return {{Meta = Meta}, {Math = Math, RawInline = RawInline}}
@@ -0,0 +1,77 @@
+-- Replace formulas in HTML output by SVG pre-rendered with the local TeX toolchain (`convert.py --math svg`).
+-- Formulas are read from the content-addressed cache of core/builder/mathcache.py, and all formulas missing from it
+-- are rendered by a single call of its renderer, so that rebuilds only render new formulas.
+-- Formulas that cannot be rendered are left to the regular HTML math method, and the convertor then does not cache
+-- the output, so that they are rendered again by the next build. Configured by metadata:
+--   svgmath-cache   the cache directory
+--   svgmath-salt    identifies the preamble, the locale settings and the TeX tools, part of every key
+--   svgmath-locale  the locale whose number formatting the formulas are rendered with
+--   svgmath-python  the Python interpreter to run the renderer with
+
+if FORMAT:match('^html') == nil then
+    return {}
+end
+
+local function mode(elem)
+    return elem.mathtype == 'DisplayMath' and 'display' or 'inline'
+end
+
+local function hex(text)
+    return (text:gsub('.', function(char) return string.format('%02x', char:byte()) end))
+end
+
+local function read(path)
+    local file = io.open(path, 'r')
+    if file == nil then
+        return nil
+    end
+    local content = file:read('a')
+    file:close()
+    return content
+end
+
+function Pandoc(doc)
+    if doc.meta['svgmath-salt'] == nil then
+        return nil
+    end
+
+    local directory = pandoc.utils.stringify(doc.meta['svgmath-cache'])
+    local salt = pandoc.utils.stringify(doc.meta['svgmath-salt'])
+    local python = pandoc.utils.stringify(doc.meta['svgmath-python'])
+    local locale = pandoc.utils.stringify(doc.meta['svgmath-locale'])
+
+    -- Must agree with MathCache.key and MathCache.path
+    local function path(elem)
+        local key = pandoc.utils.sha1(salt .. '\0' .. mode(elem) .. '\0' .. elem.text)
+        return directory .. '/' .. key:sub(1, 2) .. '/' .. key
+    end
+
+    local missing, request = {}, {}
+    doc:walk({
+        Math = function(elem)
+            local file = path(elem)
+            if missing[file] == nil and read(file) == nil then
+                missing[file] = true
+                table.insert(request, mode(elem) .. ' ' .. hex(elem.text))
+            end
+        end,
+    })
+
+    if #request > 0 then
+        local ok, message = pcall(pandoc.pipe, python, {'-m', 'core.builder.mathcache', directory, salt, locale},
+                                  table.concat(request, '\n') .. '\n')
+        if not ok then
+            io.stderr:write('svgmath: rendering failed, formulas are left to the HTML math method: ',
+                            tostring(message), '\n')
+        end
+    end
+
+    return doc:walk({
+        Math = function(elem)
+            local fragment = read(path(elem))
+            if fragment ~= nil then
+                return pandoc.RawInline('html', fragment)
+            end
+        end,
+    })
+end
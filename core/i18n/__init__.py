@@ -1,4 +1,4 @@
-from enschema import Schema, Optional
+import functools
 
 
 class Locale:
@@ -125,33 +125,45 @@ languages = [
 
 languages = {locale.id: locale for locale in languages}
 
-LanguageSchema = Schema({
-    'language': {
-        'id': str,
-        'name': str,
-        'locale': str,
-        'quotes': {
-            'open': str,
-            'close': str,
-            'babel_id': str,
-            Optional('extra'): str,
-        },
-        'andw': str,
-        'figure': str,
-        'figures': str,
-        'table': str,
-        'tables': str,
-        'equation': str,
-        'equations': str,
-        Optional('listing'): str,
-        Optional('listings'): str,
-        Optional('section'): str,
-        Optional('sections'): str,
-        Optional('rtl', default=False): bool,
-        'siunitx': {
-            'list_pair_separator': str,
-            'list_final_separator': str,
-            'output_decimal_marker': str,
+
+@functools.cache
+def language_schema():
+    # enschema is only needed by builders, not by every conversion that needs the locales
+    from enschema import Schema, Optional
+
+    return Schema({
+        'language': {
+            'id': str,
+            'name': str,
+            'locale': str,
+            'quotes': {
+                'open': str,
+                'close': str,
+                'babel_id': str,
+                Optional('extra'): str,
+            },
+            'andw': str,
+            'figure': str,
+            'figures': str,
+            'table': str,
+            'tables': str,
+            'equation': str,
+            'equations': str,
+            Optional('listing'): str,
+            Optional('listings'): str,
+            Optional('section'): str,
+            Optional('sections'): str,
+            Optional('rtl', default=False): bool,
+            'siunitx': {
+                'list_pair_separator': str,
+                'list_final_separator': str,
+                'output_decimal_marker': str,
+            }
         }
-    }
-})
+    })
+
+
+def __getattr__(name):
+    if name == 'LanguageSchema':
+        return language_schema()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
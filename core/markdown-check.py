@@ -8,6 +8,7 @@ import subprocess
 
 from pathlib import Path
 
+from builder.cache import AstCache
 from mdcheck import check, exceptions
 from utilities import colour as c
 
@@ -23,7 +24,10 @@ class StyleEnforcer:
         self.parser.add_argument('--only', nargs='+', type=str)
         self.parser.add_argument('--ignore', nargs='+', type=str)
         self.parser.add_argument('--markdown', action='store_true')
+        self.parser.add_argument('--ast-cache-dir', type=Path, default=AstCache.default_directory,
+                                 help="store pandoc ASTs here, for convert.py to render from without parsing again")
         self.args = self.parser.parse_args()
+        self.asts = AstCache(self.args.ast_cache_dir)
 
         self.commented = re.compile(r'^%')
 
@@ -144,17 +148,35 @@ class StyleEnforcer:
                 print(f"File {c.path(file.name)} {c.ok('OK')}")
             return ok
 
+    @staticmethod
+    def ast_elements(node):
+        """ All elements of a pandoc JSON AST, depth first """
+        if isinstance(node, dict):
+            if 't' in node:
+                yield node
+            for value in node.values():
+                yield from StyleEnforcer.ast_elements(value)
+        elif isinstance(node, list):
+            for item in node:
+                yield from StyleEnforcer.ast_elements(item)
+
     def check_markdown(self, path):
-        out = subprocess.check_output(['pandoc', '--from', 'markdown+smart', '--to', 'native', path],
-                                      encoding='utf-8').split("\n")
+        # The AST is stored, so that convert.py can render from it without parsing the file again
+        try:
+            ast = self.asts.parse(path.read_text(encoding='utf-8'))
+        except UnicodeDecodeError:
+            # Reported by check_markdown_file
+            return
 
-        for line in out:
+        for element in self.ast_elements(ast['blocks']):
             try:
-                if matches := re.search(
-                        r'(Format "tex").*(?P<si>\\\\(SI|SIrange|SIlist|num|numrange|numlist|ang|si)({[^}]+})+)', line):
-                    si = matches.group('si')
-                    raise exceptions.MarkdownError(f"Raw siunitx token \"{si}\"")
-#                if matches := re.search(r'Math InlineMath ".*[^ ](?P<symbol>=|\\approx|\\cdot|\\doteq|\+)[^ ].*"', line):
+                if element['t'] in ['RawInline', 'RawBlock'] and element['c'][0] == 'tex':
+                    if matches := re.search(r'(?P<si>\\(SI|SIrange|SIlist|num|numrange|numlist|ang|si)({[^}]+})+)',
+                                            element['c'][1]):
+                        si = matches.group('si')
+                        raise exceptions.MarkdownError(f"Raw siunitx token \"{si}\"")
+#                if element['t'] == 'Math' and element['c'][0]['t'] == 'InlineMath' and \
+#                        (matches := re.search(r'[^ ](?P<symbol>=|\\approx|\\cdot|\\doteq|\+)[^ ]', element['c'][1])):
 #                    symbol = matches.group('symbol')
 #                    raise exceptions.MarkdownError(f"Missing space around \"{symbol}\"")
             except exceptions.MarkdownError as e:
@@ -0,0 +1,52 @@
+import subprocess
+
+import pytest
+import yaml
+
+from core.builder import context, git, validator
+from core.builder.cache import AstCache, ConversionCache, MetadataCache, TreeCache
+from core.builder.context import registry
+from core.builder.highlight import HighlightCache
+from core.builder.mathcache import MathCache
+
+
+@pytest.fixture(autouse=True)
+def caches(tmp_path_factory, monkeypatch):
+    """ Keep all caches of the tests in a temporary directory instead of build/.cache of the repository """
+    directory = tmp_path_factory.mktemp('cache')
+    for cls in [ConversionCache, AstCache, MetadataCache, TreeCache, MathCache, HighlightCache]:
+        monkeypatch.setattr(cls, 'default_directory', directory / cls.default_directory.name)
+    monkeypatch.setattr(context, 'metadata', MetadataCache())
+    monkeypatch.setattr(validator, 'tree_cache', TreeCache())
+    return directory
+
+
+def write(path, content: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(yaml.safe_dump(content, allow_unicode=True))
+
+
+@pytest.fixture
+def volume(tmp_path):
+    """ A repository with a naboj volume with one language and one venue """
+    write(tmp_path / 'phys' / 'meta.yaml', {'url': 'https://naboj.org', 'hacks': {}})
+    write(tmp_path / 'phys' / '.static' / 'i18n' / 'sk.yaml', {'section': {'problems': 'Úlohy'}})
+    write(tmp_path / 'phys' / '16' / 'meta.yaml', {
+        'date': '2024-04-19',
+        'problems': ['kolotoc', 'vlak', 'lampa'],
+        'start': 600,
+    })
+    write(tmp_path / 'phys' / '16' / 'languages' / 'sk' / 'meta.yaml', {'booklet': {'contents': {'intro': True}}})
+    write(tmp_path / 'phys' / '16' / 'venues' / 'bratislava' / 'meta.yaml', {
+        'code': 'SKBAF', 'name': 'Bratislava', 'language': 'sk', 'evaluators': 2,
+    })
+    commit = ['-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '-m', 'Volume']
+    for args in [['init'], ['add', '.'], commit]:
+        subprocess.run(['git', *args], cwd=tmp_path, check=True, capture_output=True)
+
+    git.clear_cache()
+    registry.clear()
+    registry.validation = 'off'
+    yield tmp_path
+    registry.clear()
+    git.clear_cache()
@@ -0,0 +1,117 @@
+import datetime
+import io
+import os
+import pytest
+import tempfile
+import yaml
+
+from core.builder.cache import AstCache, ConversionCache, MetadataCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ConversionCache(tmp_path / 'convert')
+
+
+class TestConversionCache:
+    def test_miss(self, cache):
+        assert not cache.fetch('0123abcd', io.StringIO())
+        assert (cache.hits, cache.misses) == (0, 1)
+
+    def test_store_and_fetch(self, cache):
+        result = io.StringIO("Výsledok konverzie\n")
+        cache.store('0123abcd', result)
+        assert result.tell() == 0
+
+        out = io.StringIO()
+        assert cache.fetch('0123abcd', out)
+        assert out.getvalue() == "Výsledok konverzie\n"
+
+    def test_fetch_into_file(self, cache):
+        cache.store('0123abcd', io.StringIO("a\nb\n"))
+        with tempfile.NamedTemporaryFile(mode='w+') as out:
+            out.write("prefix\n")
+            assert cache.fetch('0123abcd', out)
+            out.write("suffix\n")
+            out.seek(0)
+            assert out.read() == "prefix\na\nb\nsuffix\n"
+
+    def test_failed_write_is_not_published(self, cache):
+        with pytest.raises(RuntimeError):
+            with cache.writer('0123abcd') as out:
+                out.write("partial")
+                raise RuntimeError
+        assert not cache.path('0123abcd').exists()
+        assert list(cache.path('0123abcd').parent.iterdir()) == []
+
+    def test_totals_are_shared(self, cache):
+        other = ConversionCache(cache.directory)
+        cache.fetch('0123abcd', io.StringIO())
+        other.store('0123abcd', io.StringIO("x"))
+        other.fetch('0123abcd', io.StringIO())
+        assert cache.totals() == (1, 1)
+
+    def test_discard(self, cache):
+        with cache.writer('0123abcd') as out:
+            out.write("unwanted")
+            raise ConversionCache.Discard
+        assert not cache.path('0123abcd').exists()
+
+
+class TestAstCache:
+    def test_parse_and_lookup(self, tmp_path):
+        asts = AstCache(tmp_path / 'ast')
+        assert asts.lookup('Ahoj *svet*\n') is None
+        ast = asts.parse('Ahoj *svet*\n')
+        assert ast['blocks'][0]['t'] == 'Para'
+        assert asts.lookup('Ahoj *svet*\n') == asts.path(AstCache.key('Ahoj *svet*\n'))
+        assert asts.parse('Ahoj *svet*\n') == ast
+        assert asts.totals() == (2, 2)
+
+
+class TestMetadataCache:
+    @pytest.fixture
+    def meta(self, tmp_path):
+        path = tmp_path / 'meta.yaml'
+        path.write_text("id: 16\ndate: 2024-04-19\nproblems:\n  - id: kolotoc\n")
+        return path
+
+    def test_load(self, tmp_path, meta):
+        cache = MetadataCache(tmp_path / 'cache')
+        assert cache.load(meta) == {'id': 16, 'date': datetime.date(2024, 4, 19), 'problems': [{'id': 'kolotoc'}]}
+
+    def test_copies(self, tmp_path, meta):
+        cache = MetadataCache(tmp_path / 'cache')
+        first = cache.load(meta)
+        first['problems'].append({'id': 'pridany'})
+        assert cache.load(meta)['problems'] == [{'id': 'kolotoc'}]
+
+    def test_shared_on_disk(self, tmp_path, meta, monkeypatch):
+        MetadataCache(tmp_path / 'cache').load(meta)
+        monkeypatch.setattr(yaml, 'load', None)
+        assert MetadataCache(tmp_path / 'cache').load(meta)['id'] == 16
+
+    def test_changed(self, tmp_path, meta):
+        cache = MetadataCache(tmp_path / 'cache')
+        assert cache.load(meta)['id'] == 16
+        meta.write_text("id: 17\n")
+        assert cache.load(meta) == {'id': 17}
+
+    def test_latest_only(self, tmp_path, meta):
+        cache = MetadataCache(tmp_path / 'cache')
+        for number in range(16, 20):
+            meta.write_text(f"id: {number}\n")
+            os.utime(meta, ns=(number * 10 ** 9, number * 10 ** 9))
+            assert cache.load(meta) == {'id': number}
+        assert list(cache.loaded) == [str(meta)]
+        assert len(list(cache.directory.glob('*/*'))) == 1
+
+    def test_changed_on_disk(self, tmp_path, meta):
+        MetadataCache(tmp_path / 'cache').load(meta)
+        meta.write_text("id: 17\n")
+        os.utime(meta, ns=(17 * 10 ** 9, 17 * 10 ** 9))
+        assert MetadataCache(tmp_path / 'cache').load(meta) == {'id': 17}
+
+    def test_missing(self, tmp_path):
+        with pytest.raises(FileNotFoundError):
+            MetadataCache(tmp_path / 'cache').load(tmp_path / 'meta.yaml')
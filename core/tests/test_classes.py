@@ -0,0 +1,116 @@
+import pytest
+import random
+import re
+from collections import defaultdict
+
+from core.builder.classes import RegexFailure, RegexReplacement, RegexTable
+from core.builder.convertor import Convertor
+from core.benchmarks.rules import SAMPLES
+
+
+@pytest.fixture
+def lines():
+    rng = random.Random(1)
+    result = []
+    for _ in range(2000):
+        line = rng.choice(SAMPLES)
+        cut = rng.randrange(len(line) + 1)
+        # Mangle some lines to hit partial matches too
+        result.append(line[cut:] + line[:cut] + '\n' if rng.random() < 0.3 else line + '\n')
+    return result
+
+
+class TestRequiredLiterals:
+    @pytest.mark.parametrize("pattern,triggers", [
+        (r'@H', ('@H',)),
+        (r'(<<<<<<<<|========|>>>>>>>>)', ('<<<<<<<<', '========', '>>>>>>>>')),
+        (r'(^|(\s*))\$\${', ('$${',)),
+        (r'^@T([Oo][Dd][Oo])?\s*(.*)$', ('@T',)),
+        (r'(\\num|\\SI){e', ('\\SI', '\\num')),
+        (r'\^\\circ|\^{\\circ}', ('^\\circ', '^{\\circ}')),
+        (r'ab*cd', ('cd',)),
+        (r'x{2}yz', ('yz',)),
+    ])
+    def test_triggers(self, pattern, triggers):
+        assert RegexTable([RegexFailure(pattern, error="")]).triggers == triggers
+
+    def test_redundant_triggers(self):
+        table = RegexTable([RegexFailure(r'\\includegraphics', error=""), RegexFailure(r'\\includegraphics\[', error="")])
+        assert table.triggers == ('\\includegraphics',)
+
+    def test_no_literal_falls_back_to_alternation(self):
+        table = RegexTable([RegexFailure(r'\d+', error=""), RegexFailure(r'(?P<x>a)b', error="")])
+        assert table.triggers is None
+        assert table.prefilter is not None
+        assert not table.may_match("ccc")
+        assert table.may_match("c1c")
+
+    def test_backreference_disables_prefilter(self):
+        table = RegexTable([RegexFailure(r'\d+', error=""), RegexFailure(r'(.)\1', error="")])
+        assert table.triggers is None
+        assert table.prefilter is None
+        assert table.may_match("abc")
+
+    def test_ignorecase_has_no_triggers(self):
+        table = RegexTable([RegexFailure(r'todo', error="", flags=re.IGNORECASE)])
+        assert table.triggers is None
+        assert table.may_match("TODO")
+
+
+class TestRegexTable:
+    @pytest.mark.parametrize("output_format", ['latex', 'html'])
+    @pytest.mark.parametrize("table", ['quotes', 'pre_regexes', 'post_regexes'])
+    def test_process_identical(self, lines, output_format, table):
+        rules = Convertor.rule_set(output_format, 'sk')[table]
+        for line in lines:
+            assert rules.process(line) == Convertor.process_line(line, list(rules))
+
+    @pytest.mark.parametrize("output_format", ['latex', 'html'])
+    @pytest.mark.parametrize("table", ['pre_checks', 'post_checks'])
+    def test_check_identical(self, lines, output_format, table):
+        rules = Convertor.rule_set(output_format, 'sk')[table]
+
+        def outcome(function, line):
+            try:
+                return function(line)
+            except Exception as e:
+                return e.args
+
+        for line in lines + ['<<<<<<<< @H <img src="x.png"\n']:
+            assert outcome(rules.check, line) == outcome(lambda x: Convertor.check_line(x, list(rules)), line)
+
+    def test_first_failure_wins(self):
+        table = RegexTable([RegexFailure(r'b', error="first"), RegexFailure(r'a', error="second")])
+        with pytest.raises(Exception, match="first"):
+            table.check("ab")
+
+    def test_rules_see_previous_replacements(self):
+        table = RegexTable([RegexReplacement(r'a', 'b'), RegexReplacement(r'b', 'c')])
+        assert table.process("a") == "c"
+        assert table.process("x") == "x"
+
+    @pytest.mark.parametrize("output_format", ['latex', 'html'])
+    def test_profiled_identical(self, lines, output_format):
+        rules = Convertor.rule_set(output_format, 'sk')['post_regexes']
+        profile = defaultdict(lambda: [0, 0.0])
+        for line in lines:
+            assert rules.process(line, profile) == rules.process(line)
+
+    def test_profile_counts(self):
+        table = RegexTable([RegexReplacement(r'a', 'b', purpose="a to b"), RegexReplacement(r'c', 'd')])
+        profile = defaultdict(lambda: [0, 0.0])
+        assert table.process("aac", profile) == "bbd"
+        table.process("x", profile)
+        assert [profile["a to b"][0], profile["c"][0]] == [2, 1]
+
+    def test_profile_check(self):
+        table = RegexTable([RegexFailure(r'a', error="no a"), RegexFailure(r'b', error="no b")])
+        profile = defaultdict(lambda: [0, 0.0])
+        with pytest.raises(Exception, match="no b"):
+            table.check("b", profile)
+        assert [profile["no a"][0], profile["no b"][0]] == [0, 1]
+
+    def test_empty(self):
+        table = RegexTable([])
+        assert table.process("x") == "x"
+        assert table.check("x") == "x"
@@ -1,6 +1,11 @@
 import pytest
+from pathlib import Path
 
-from core.builder.context import Context
+from enschema import Schema, SchemaError, And
+from schema import Literal
+
+from core.builder.context import Context, FileSystemContext, BuildableFileSystemContext, ContextModule, registry
+from core.utilities.frozen import freeze
 
 
 @pytest.fixture
@@ -90,4 +95,187 @@ class TestContext:
 
     def test_or(self):
         """ Note that or'ed contexts retain the parent's name but override items with child's """
-        assert Context('foo', bar='mitzvah') | Context('baz', bar='baron') == Context('foo', bar='baron')
\ No newline at end of file
+        assert Context('foo', bar='mitzvah') | Context('baz', bar='baron') == Context('foo', bar='baron')
+
+
+class ContextNode(FileSystemContext):
+    _schema = Schema({'id': str, 'count': int})
+    populated = 0
+
+    def node_path(self, *path):
+        return Path(self.root, *path)
+
+    def populate(self, node):
+        ContextNode.populated += 1
+        self.load_meta(node).add_id(node)
+
+
+class ContextTree(FileSystemContext):
+    _schema = Schema({'nodes': list})
+    _subcontext_key = 'nodes'
+    _subcontext_class = ContextNode
+
+    def node_path(self, *path):
+        return Path(self.root, *path)
+
+    def populate(self):
+        self.add_list('nodes', [ContextNode(self.root, node) for node in ['a', 'b', 'a', 'a']])
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for node in ['a', 'b']:
+        (tmp_path / node).mkdir()
+        (tmp_path / node / 'meta.yaml').write_text("count: 1\n")
+    registry.clear()
+    ContextNode.populated = 0
+    yield tmp_path
+    registry.clear()
+
+
+class TestContextRegistry:
+    def test_built_once(self, tree):
+        assert ContextTree(tree).data['nodes'] == [{'id': node, 'count': 1} for node in ['a', 'b', 'a', 'a']]
+        assert ContextNode(tree, 'b').data == {'id': 'b', 'count': 1}
+        assert ContextNode.populated == 2
+        assert (registry.built, registry.saved) == (3, 3)
+
+    def test_copies_are_independent(self, tree):
+        first = ContextNode(tree, 'a').override('count', 5)
+        second = ContextNode(tree, 'a')
+        assert first.data['count'] == 5
+        assert second.data['count'] == 1
+        assert first is not second
+
+    def test_keyed_by_root(self, tree, tmp_path_factory):
+        other = tmp_path_factory.mktemp('other')
+        (other / 'a').mkdir()
+        (other / 'a' / 'meta.yaml').write_text("count: 2\n")
+        assert ContextNode(tree, 'a').data['count'] == 1
+        assert ContextNode(other, 'a').data['count'] == 2
+        assert ContextNode(str(other), 'a').data['count'] == 2
+        assert (registry.built, registry.saved) == (2, 1)
+
+    def test_unhashable_arguments_are_not_shared(self, tree):
+        ContextNode(tree, 'a', extra=['x'])
+        ContextNode(tree, 'a', extra=['x'])
+        assert ContextNode.populated == 2
+        assert registry.saved == 0
+
+    def test_failed_construction_is_not_kept(self, tree):
+        with pytest.raises(FileNotFoundError):
+            ContextNode(tree, 'c')
+        (tree / 'c').mkdir()
+        (tree / 'c' / 'meta.yaml').write_text("count: 3\n")
+        assert ContextNode(tree, 'c').data['count'] == 3
+
+    def test_clear(self, tree):
+        ContextNode(tree, 'a')
+        registry.clear()
+        ContextNode(tree, 'a')
+        assert ContextNode.populated == 2
+        assert (registry.built, registry.saved) == (1, 0)
+
+
+def counted(value) -> bool:
+    counted.calls += 1
+    return value > 0
+
+
+class ContextCounted(ContextNode):
+    _schema = Schema({'id': str, 'count': And(int, counted)})
+
+
+class BuildableContextTree(BuildableFileSystemContext):
+    _schema = Schema({'id': str})
+    _subcontext_class = ContextCounted
+
+    def node_path(self, *path):
+        return Path(self.root, *path)
+
+    def populate(self, *nodes):
+        self.add_id('tree')
+        self.add_list('nodes', [ContextCounted(self.root, node) for node in nodes])
+        self.adopt(module=ContextModule('test'))
+
+
+@pytest.fixture
+def counted_tree(tree):
+    (tree / 'bad').mkdir()
+    (tree / 'bad' / 'meta.yaml').write_text("count: 0\n")
+    counted.calls = 0
+    return tree
+
+
+class TestValidation:
+    def test_children_validated_once(self, counted_tree):
+        context = BuildableContextTree(counted_tree, 'a', 'b', 'a')
+        assert [node['id'] for node in context.data['nodes']] == ['a', 'b', 'a']
+        assert counted.calls == 2
+
+    def test_invalid_child(self, counted_tree):
+        with pytest.raises(SchemaError):
+            BuildableContextTree(counted_tree, 'a', 'bad')
+
+    def test_invalid_adopted_context(self, counted_tree):
+        module = ContextModule('')
+        context = ContextTree(counted_tree)
+        with pytest.raises(SchemaError):
+            context.adopt(module=module)
+
+    def test_root(self, counted_tree):
+        registry.validation = 'root'
+        BuildableContextTree(counted_tree, 'a', 'bad')
+        assert counted.calls == 0
+
+        registry.validation = 'full'
+        with pytest.raises(SchemaError):
+            BuildableContextTree(counted_tree, 'a', 'bad')
+
+    def test_off(self, counted_tree):
+        registry.validation = 'off'
+        BuildableContextTree(counted_tree, 'a', 'bad')
+        ContextCounted(counted_tree, 'bad')
+        assert counted.calls == 0
+
+    @pytest.mark.parametrize('schema', [
+        Schema({'node': {'id': str, 'count': And(int, lambda x: x > 1)}}),
+        Schema({'node': {Literal('id', description="Name"): str, 'count': And(int, lambda x: x > 1)}}),
+    ])
+    def test_frozen_data(self, schema, monkeypatch):
+        """ Schemas can tell what is wrong with shared data too, also where the compiled check falls back to them """
+        monkeypatch.setattr(Context, '_schema', schema)
+        Context().add(node=freeze({'id': 'a', 'count': 2})).validate()
+        with pytest.raises(SchemaError):
+            Context().add(node=freeze({'id': 'a', 'count': 1})).validate()
+
+    def test_schemas_are_not_modified(self, counted_tree):
+        schema = repr(BuildableContextTree._schema)
+        context = BuildableContextTree(counted_tree, 'a', 'b')
+        context |= ContextTree(counted_tree)
+        assert repr(BuildableContextTree._schema) == schema
+
+
+class TestSharedData:
+    def test_adopt_shares(self, tree):
+        child = ContextNode(tree, 'a').add(items=[1, 2])
+        parent = Context().adopt(child=child)
+        assert parent.data['child']['items'] is child.data['items']
+
+    def test_shared_data_cannot_change(self, tree):
+        parent = Context().adopt(child=ContextNode(tree, 'a').add(items=[1, 2]))
+        with pytest.raises(TypeError):
+            parent.data['child']['items'].append(3)
+
+    def test_override_in_child(self, tree):
+        child = ContextNode(tree, 'a')
+        parent = Context().adopt(child=child)
+        parent.override('child', parent.data['child'] | {'count': 7})
+        assert parent.data['child'] == {'id': 'a', 'count': 7}
+        assert child.data['count'] == 1
+
+    def test_or_leaves_both(self, tree):
+        first, second = ContextNode(tree, 'a'), ContextNode(tree, 'b').add(extra=True)
+        merged = first | second
+        assert merged.data == {'id': 'b', 'count': 1, 'extra': True}
+        assert first.data == {'id': 'a', 'count': 1}
@@ -0,0 +1,74 @@
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+
+root = Path(__file__).parents[2]
+
+# Colours of core.utilities.colour
+re_colour = re.compile(r'\x1b\[[0-9;]*m')
+
+
+@pytest.fixture
+def batch(tmp_path):
+    def _batch(manifest: str, *args, env=None):
+        result = subprocess.run([sys.executable, 'convert.py', 'latex', 'sk', '--batch', '-', '-j', '2',
+                                 '--cache-dir', tmp_path / 'cache', '--ast-cache-dir', tmp_path / 'ast',
+                                 '--math-cache-dir', tmp_path / 'math', '--highlight-cache-dir', tmp_path / 'highlight',
+                                 '--depfile-dir', tmp_path / 'deps', *args],
+                                cwd=root, input=manifest, capture_output=True, text=True, env=env)
+        return result.returncode, re_colour.sub('', result.stdout), re_colour.sub('', result.stderr)
+
+    return _batch
+
+
+class TestBatch:
+    def test_manifest_from_stdin(self, tmp_path, batch):
+        for name in ['a', 'b']:
+            (tmp_path / f'{name}.md').write_text(f'Súbor {name}\n')
+        code, stdout, _ = batch(f"# komentár\n{tmp_path}/a.md {tmp_path}/out/a.tex\n\n"
+                                f"html en {tmp_path}/b.md {tmp_path}/out/b.html latex {tmp_path}/out/b.tex\n")
+        assert code == 0, stdout
+        assert (tmp_path / 'out' / 'a.tex').read_text() == 'Súbor a\n'
+        assert (tmp_path / 'out' / 'b.html').read_text() == '<p>Súbor b</p>\n'
+        assert (tmp_path / 'out' / 'b.tex').read_text() == 'Súbor b\n'
+        assert '(0 hits, 3 misses in' in stdout
+
+    @pytest.mark.parametrize('line', ['a.md', 'latex sk a.md a.tex html', 'pdf sk a.md a.pdf', 'latex xx a.md a.tex'])
+    def test_malformed_line(self, tmp_path, batch, line):
+        (tmp_path / 'a.md').write_text('Súbor\n')
+        code, _, stderr = batch(f"{tmp_path}/a.md {tmp_path}/ok.tex\n{line}\n")
+        assert code != 0
+        assert re.search(r'manifest line 2\b', stderr)
+        assert not (tmp_path / 'ok.tex').exists()
+
+    def test_failing_item(self, tmp_path, batch):
+        manifest = ''
+        for number in range(4):
+            (tmp_path / f'{number}.md').write_text(f'Súbor {number}\n' if number != 2 else 'Uhol $30^\\circ$\n')
+            manifest += f"{tmp_path}/{number}.md {tmp_path}/out/{number}.tex\n"
+
+        code, stdout, _ = batch(manifest, '--no-cache')
+        assert code != 0
+        assert f'failure (1) on {tmp_path}/2.md' in stdout
+        assert 'batch failed on 1 of 4 files' in stdout
+        assert [(tmp_path / 'out' / f'{number}.tex').read_text() for number in [0, 1, 3]] == \
+            ['Súbor 0\n', 'Súbor 1\n', 'Súbor 3\n']
+
+    def test_failing_pandoc(self, tmp_path, batch):
+        (tmp_path / 'bin').mkdir()
+        (tmp_path / 'bin' / 'pandoc').write_text('#!/bin/sh\ncat > /dev/null\nexit 3\n')
+        (tmp_path / 'bin' / 'pandoc').chmod(0o755)
+        (tmp_path / 'a.md').write_text('Súbor\n')
+        env = {**os.environ, 'PATH': f"{tmp_path / 'bin'}{os.pathsep}{os.environ['PATH']}"}
+
+        # Nothing is cached, so the next build fails again instead of using the broken output
+        for _ in range(2):
+            code, stdout, _ = batch(f"{tmp_path}/a.md {tmp_path}/out/a.tex\n", env=env)
+            assert code != 0
+            assert 'pandoc failed with code 3' in stdout
+            assert f'failure (1) on {tmp_path}/a.md' in stdout
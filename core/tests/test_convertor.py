@@ -1,20 +1,40 @@
+import asyncio
+import io
+import json
 import pytest
 import re
 import tempfile
+from pathlib import Path
 
-from core.builder.convertor import Convertor
+from core.builder import convertor
+from core.builder.cache import AstCache, ConversionCache
+from core.builder.convertor import Convertor, convert_files
+from core.builder.highlight import HighlightCache
+from core.builder.mathcache import MathCache
+from core.builder.profiler import aggregate
 
 
-@pytest.fixture
-def convert():
-    def _convert(fmt, language, string):
-        infile = tempfile.NamedTemporaryFile(mode='w+')
+@pytest.fixture(params=[True, False], ids=['stream', 'buffered'])
+def convert(request):
+    """
+    Convert `string`, or the file at `path`, streamed and buffered, asserting that it succeeds. Returns the output,
+    followed by the outputs of the formats in `others` if there are any. The convertor is kept in `convert.convertor`.
+    """
+    def _convert(fmt, language, string=None, *, path=None, others=(), **options):
+        infile = tempfile.NamedTemporaryFile(mode='w+') if path is None else open(path)
         outfile = tempfile.NamedTemporaryFile(mode='w+')
-        infile.write(string)
-        infile.seek(0)
-        Convertor(fmt, language, infile, outfile).run()
+        other_outputs = {other: io.StringIO() for other in others}
+        with infile:
+            if path is None:
+                infile.write(string)
+                infile.seek(0)
+            _convert.convertor = Convertor(fmt, language, infile, outfile, other_outputs=other_outputs,
+                                           stream=request.param, **options)
+            assert _convert.convertor.run() == 0
         outfile.seek(0)
-        return outfile.read()
+        if not others:
+            return outfile.read()
+        return outfile.read(), *(out.getvalue() for out in other_outputs.values())
 
     return _convert
 
@@ -117,3 +137,367 @@ class TestTags:
     def test_aligned(self, convert):
         output = convert('latex', 'sk', '$${\na\n}$$')
         assert re.match(r'\\\[.*\\begin\{aligned}\na\n\\end\{aligned}.*\\]', output, flags=re.DOTALL) is not None
+
+
+class TestChecks:
+    def test_pre_check_reports_line(self, capsys):
+        infile = tempfile.NamedTemporaryFile(mode='w+')
+        outfile = tempfile.NamedTemporaryFile(mode='w+')
+        infile.write('Prvý riadok\n\nUhol $30^\\circ$\n')
+        infile.seek(0)
+        assert Convertor('latex', 'sk', infile, outfile).run() is None
+        output = capsys.readouterr().out
+        assert 'No \\circ allowed in exponents' in output
+        assert 'input line' in output and 'Uhol $30^\\circ$' in output
+
+    def test_post_check_reports_line(self, capsys):
+        infile = tempfile.NamedTemporaryFile(mode='w+')
+        outfile = tempfile.NamedTemporaryFile(mode='w+')
+        infile.write('Prvý odsek\n\nDruhý odsek s @H uprostred\n')
+        infile.seek(0)
+        assert Convertor('latex', 'sk', infile, outfile).run() is None
+        output = capsys.readouterr().out
+        assert 'HTML-only tag in LaTeX' in output
+        assert 'output line' in output and 'Druhý odsek s @H uprostred' in output
+
+    @pytest.mark.parametrize('stream', [True, False], ids=['stream', 'buffered'])
+    @pytest.mark.parametrize('run', ['sync', 'async'])
+    def test_pandoc_failure(self, tmp_path, monkeypatch, capsys, stream, run):
+        (tmp_path / 'fail.lua').write_text("function Para(para)\n    error('broken filter')\nend\n")
+        monkeypatch.setattr(Convertor, 'filter_chain', lambda self: [('lua', str(tmp_path / 'fail.lua'))])
+        cache = ConversionCache(tmp_path / 'cache')
+        convertor = Convertor('latex', 'sk', io.StringIO('Text\n'), io.StringIO(), cache=cache, stream=stream)
+        assert (convertor.run() if run == 'sync' else asyncio.run(convertor.run_async())) is None
+        assert convertor.pandoc_returncode != 0
+        assert 'pandoc failed with code' in capsys.readouterr().out
+        assert list(cache.directory.glob('*/*')) == []
+
+
+class TestFilters:
+    def test_include(self, tmp_path, convert):
+        (tmp_path / 'sub').mkdir()
+        (tmp_path / 'a.md').write_text('Hello *there*\n')
+        (tmp_path / 'sub' / 'b.md').write_text('!include c.md\n')
+        (tmp_path / 'sub' / 'c.md').write_text('Nested\n')
+        (tmp_path / 'main.md').write_text('!include a.md\n\n!include sub/b.md\n')
+        assert convert('latex', 'sk', path=tmp_path / 'main.md') == 'Hello \\emph{there}\n\nNested\n'
+
+    def test_include_code(self, tmp_path, convert):
+        (tmp_path / 'code.py').write_text('x = 1\n# start\n    y = 2\n# end\n')
+        (tmp_path / 'main.md').write_text('```{.python}\n!include`snippetStart="# start", snippetEnd="# end", '
+                                          'dedent=4` code.py\n```\n')
+        assert convert('latex', 'sk', path=tmp_path / 'main.md') == \
+            '\\begin{minted}[]{python}\ny = 2\n\\end{minted}\n'
+
+    def test_minted(self, tmp_path, convert):
+        (tmp_path / 'main.md').write_text('Call `f(x)`{.c linenos=true}.\n\n```\nplain\n```\n')
+        assert convert('latex', 'sk', path=tmp_path / 'main.md') == \
+            'Call \\mintinline[linenos=true]{c}{f(x)}.\n\n\\begin{minted}[]{text}\nplain\n\\end{minted}\n'
+
+
+class TestHighlight:
+    def test_cached(self, tmp_path, convert):
+        output = convert('latex', 'sk', '```python\nprint("a_b")\n```\n', highlight_cache=tmp_path)
+        style = HighlightCache(tmp_path).path(HighlightCache.salt())
+        assert output == (f'\\ifcsname PYGdgs\\endcsname\\else\\input{{{style}}}\\fi\n'
+                          '\\begin{Verbatim}[commandchars=\\\\\\{\\},fontsize=\\footnotesize]\n'
+                          '\\PYGdgs{n+nb}{print}\\PYGdgs{p}{(}\\PYGdgs{l+s+s2}{\\PYGdgsZdq{}}'
+                          '\\PYGdgs{l+s+s2}{a\\PYGdgsZus{}b}\\PYGdgs{l+s+s2}{\\PYGdgsZdq{}}\\PYGdgs{p}{)}\n'
+                          '\\end{Verbatim}\n')
+        assert 'PYGdgs@tok@k' in style.read_text()
+
+        # A block from another file is read from the cache, without highlighting it again
+        entries = sorted(tmp_path.rglob('*'))
+        assert convert('latex', 'sk', 'Riešenie:\n\n```python\nprint("a_b")\n```\n',
+                       highlight_cache=tmp_path).endswith(output)
+        assert sorted(tmp_path.rglob('*')) == entries
+
+    def test_left_to_minted(self, tmp_path, convert):
+        text = '```{.c linenos=true}\nint x;\n```\n\n```nonexistent\nx\n```\n'
+        assert convert('latex', 'sk', text, highlight_cache=tmp_path) == \
+            ('\\begin{minted}[linenos=true]{c}\nint x;\n\\end{minted}\n\n'
+             '\\begin{minted}[]{nonexistent}\nx\n\\end{minted}\n')
+
+
+class TestOtherOutputs:
+    @pytest.mark.parametrize('math', ['mathjax', 'webtex'])
+    def test_shared_parse(self, convert, math):
+        text = 'Máme "dačo" a $x^2$.\n\n```\ncode\n```\n\n![Obrázok](obrazok.png){height=20mm}\n'
+        latex, html = convert('latex', 'sk', text, others=['html'], math=math)
+        convertor = convert.convertor
+        assert list(convertor.rendered) == [convertor.others['html']]
+        assert latex == convert('latex', 'sk', text, math=math)
+        assert html == convert('html', 'sk', text, math=math)
+
+    def test_different_input_is_parsed_separately(self, convert):
+        text = 'Riadok\n\n@L \\LaTeX\n\n@H <b>HTML</b>\n'
+        latex, html = convert('latex', 'sk', text, others=['html'])
+        assert convert.convertor.rendered == {}
+        assert latex == convert('latex', 'sk', text)
+        assert html == convert('html', 'sk', text)
+
+    def test_cached(self, tmp_path, convert):
+        cache = ConversionCache(tmp_path)
+        convert('latex', 'sk', 'Text\n', others=['html'], cache=cache)
+        assert convert('latex', 'sk', 'Text\n', others=['html'], cache=cache) == ('Text\n', '<p>Text</p>\n')
+        assert convert.convertor.cache_hit and convert.convertor.others['html'].cache_hit
+
+    def test_cached_separately(self, tmp_path, convert):
+        cache = ConversionCache(tmp_path)
+        assert convert('latex', 'sk', 'Text\n', cache=cache) == 'Text\n'
+        assert convert('latex', 'sk', 'Text\n', others=['html'], cache=cache) == ('Text\n', '<p>Text</p>\n')
+        assert convert.convertor.cache_hit and not convert.convertor.others['html'].cache_hit
+
+
+class TestLocales:
+    def test_shared(self, tmp_path, convert):
+        cache = ConversionCache(tmp_path / 'cache')
+        (tmp_path / 'answer.md').write_text('$v = \\SI{3.5}{m/s}$, "rýchlo"\n\n$$E = mc^2$$ {#eq:e}\n')
+        output = convert('latex', 'sk', path=tmp_path / 'answer.md', cache=cache)
+        assert not convert.convertor.cache_hit
+        for code in ['en', 'fa']:
+            assert convert('latex', code, path=tmp_path / 'answer.md', cache=cache) == output
+            assert convert.convertor.cache_hit
+
+    def test_symlinked_translation(self, tmp_path, convert):
+        cache = ConversionCache(tmp_path / 'cache')
+        (tmp_path / 'sk').mkdir()
+        (tmp_path / 'en').mkdir()
+        (tmp_path / 'sk' / 'problem.md').write_text('Zadanie\n\n!include part.md\n')
+        (tmp_path / 'sk' / 'part.md').write_text('$$E = mc^2$$\n')
+        for name in ['problem.md', 'part.md']:
+            (tmp_path / 'en' / name).symlink_to(Path('..', 'sk', name))
+
+        output = convert('latex', 'sk', path=tmp_path / 'sk' / 'problem.md', cache=cache)
+        assert not convert.convertor.cache_hit and 'E = mc^2' in output
+        assert convert('latex', 'en', path=tmp_path / 'en' / 'problem.md', cache=cache) == output
+        assert convert.convertor.cache_hit
+
+        # A translation with its own included file has a key of its own
+        (tmp_path / 'en' / 'part.md').unlink()
+        (tmp_path / 'en' / 'part.md').write_text('$$E = mc^3$$\n')
+        output = convert('latex', 'en', path=tmp_path / 'en' / 'problem.md', cache=cache)
+        assert not convert.convertor.cache_hit and 'E = mc^3' in output
+
+    @pytest.mark.parametrize('text', ['Podľa @eq:e.\n', '![Graf](graf.png){#fig:graf}\n', '!include part.md\n'])
+    def test_named_by_crossref(self, tmp_path, convert, text):
+        cache = ConversionCache(tmp_path / 'cache')
+        (tmp_path / 'part.md').write_text('Tabuľka @tbl:t.\n')
+        (tmp_path / 'main.md').write_text(text)
+        hits = []
+        for code in ['sk', 'en', 'sk']:
+            convert('latex', code, path=tmp_path / 'main.md', cache=cache)
+            hits.append(convert.convertor.cache_hit)
+        assert hits == [False, False, True]
+
+
+class TestAst:
+    def test_rendered_from_stored_ast(self, tmp_path, convert):
+        asts = AstCache(tmp_path)
+        asts.parse('Ahoj *svet*\n')
+        # Replace the stored AST to tell that pandoc renders it instead of parsing the input
+        with asts.writer(AstCache.key('Ahoj *svet*\n')) as out:
+            out.write(json.dumps(asts.parse('Ahoj **svet**\n')))
+
+        assert convert('latex', 'sk', 'Ahoj *svet*\n', others=['html'], asts=asts) == \
+            ('Ahoj \\textbf{svet}\n', '<p>Ahoj <strong>svet</strong></p>\n')
+        assert convert.convertor.ast is not None
+
+    def test_prepared_input_differs(self, tmp_path, convert):
+        asts = AstCache(tmp_path)
+        asts.parse('% komentár\nAhoj\n')
+        assert convert('latex', 'sk', '% komentár\nAhoj\n', asts=asts) == 'Ahoj\n'
+        assert convert.convertor.ast is None
+
+
+class TestProfile:
+    def test_record(self, tmp_path, convert):
+        convert('latex', 'sk', '% komentár\nText\n', profile=tmp_path / 'profile')
+        entry, = [json.loads(line) for line in (tmp_path / 'profile').read_text().splitlines()]
+        assert entry['format'] == 'latex' and entry['mode'] == ('stream' if convert.convertor.stream else 'buffered')
+        assert {'pre_check', 'preprocess', 'call_pandoc', 'postprocess', 'post_check', 'write'} <= set(entry['stages'])
+        assert entry['rules']['preprocess']['Comment']['fired'] == 1
+
+    def test_aggregate(self, tmp_path):
+        for text in ['% a\n', '% b\n']:
+            Convertor('html', 'sk', io.StringIO(text), io.StringIO(), profile=tmp_path / 'profile').run()
+        with open(tmp_path / 'profile') as log:
+            count, stages, rules = aggregate(log)
+        assert count == 2 and stages['total'] > 0
+        assert rules['preprocess', 'Comment'][0] == 2
+
+
+class TestAsync:
+    @pytest.mark.parametrize('fmt', ['latex', 'html'])
+    def test_same_as_sync(self, convert, fmt):
+        text = 'Máme "dačo" a $x^2$.\n\n$${\na\n}$$\n\n![Obrázok](obrazok.png){height=20mm}\n'
+        sync = convert(fmt, 'sk', text)
+        concurrent = io.StringIO()
+        stream = convert.convertor.stream
+        assert asyncio.run(Convertor(fmt, 'sk', io.StringIO(text), concurrent, stream=stream).run_async()) == 0
+        assert concurrent.getvalue() == sync
+
+    def test_other_outputs(self):
+        latex, html = io.StringIO(), io.StringIO()
+        convertor = Convertor('latex', 'sk', io.StringIO('Text\n'), latex, other_outputs={'html': html})
+        assert asyncio.run(convertor.run_async()) == 0
+        assert (latex.getvalue(), html.getvalue()) == ('Text\n', '<p>Text</p>\n')
+
+    def test_check_failure(self, capsys):
+        infile = io.StringIO('Uhol $30^\\circ$\n')
+        assert asyncio.run(Convertor('latex', 'sk', infile, io.StringIO()).run_async()) is None
+        assert 'No \\circ allowed in exponents' in capsys.readouterr().out
+
+    def test_convert_files(self, tmp_path):
+        jobs = []
+        for number in range(6):
+            (tmp_path / f'{number}.md').write_text(f'Súbor {number}\n' if number != 3 else 'Uhol $30^\\circ$\n')
+            jobs.append(('latex', 'sk', tmp_path / f'{number}.md', tmp_path / 'out' / f'{number}.tex'))
+
+        results = asyncio.run(convert_files(jobs, limit=2))
+        assert [code for code, _ in results] == [0, 0, 0, 1, 0, 0]
+        assert (tmp_path / 'out' / '5.tex').read_text() == 'Súbor 5\n'
+
+
+class TestDepfiles:
+    def test_includes_and_images(self, tmp_path):
+        (tmp_path / 'part.md').write_text('Časť ![b](b.png)\n')
+        (tmp_path / 'a b.png').touch()
+        (tmp_path / 'b.png').touch()
+        (tmp_path / 'main.md').write_text('![a](<a b.png>) ![web](https://example.com/x.png)\n\n!include part.md\n')
+        with open(tmp_path / 'main.md') as infile, open(tmp_path / 'main.tex', 'w') as outfile:
+            assert Convertor('latex', 'sk', infile, outfile, depfiles=tmp_path / 'deps').run() == 0
+
+        depfile = tmp_path / 'deps' / (tmp_path / 'main.tex').relative_to('/').with_suffix('.tex.d')
+        target, part, image, other = str(tmp_path / 'main.tex'), str(tmp_path / 'part.md'), \
+            str(tmp_path / 'a\\ b.png'), str(tmp_path / 'b.png')
+        assert depfile.read_text() == (f"{target}: {part} {image} {other}\n"
+                                       f"{part}:\n{image}:\n{other}:\n")
+
+    def test_other_targets(self, tmp_path):
+        (tmp_path / 'part.md').write_text('Časť\n')
+        (tmp_path / 'main.md').write_text('!include part.md\n')
+        with open(tmp_path / 'main.md') as infile, open(tmp_path / 'main.tex', 'w') as outfile:
+            assert Convertor('latex', 'sk', infile, outfile, depfiles=tmp_path / 'deps',
+                             depfile_targets=['build/sk.batch']).run() == 0
+
+        depfile = tmp_path / 'deps' / (tmp_path / 'main.tex').relative_to('/').with_suffix('.tex.d')
+        part = tmp_path / 'part.md'
+        assert depfile.read_text() == f"{tmp_path / 'main.tex'} build/sk.batch: {part}\n{part}:\n"
+
+    def test_unnamed_output(self, tmp_path):
+        convertor = Convertor('latex', 'sk', io.StringIO('Text\n'), io.StringIO(), depfiles=tmp_path)
+        assert convertor.run() == 0
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestSvgMath:
+    @staticmethod
+    def populate(directory, formulas):
+        cache = MathCache('sk', directory)
+        for mode, formula in formulas:
+            key = MathCache.key(MathCache.salt('sk'), mode, formula)
+            with cache.storage.writer(key) as out:
+                out.write(f'<svg>{mode} {formula}</svg>')
+
+    def test_cached(self, tmp_path, convert):
+        self.populate(tmp_path, [('inline', 'x^2'), ('display', 'E = mc^2')])
+        assert convert('html', 'sk', 'Nech $x^2$.\n\n$$E = mc^2$$\n', math='svg', math_cache=tmp_path) == \
+            '<p>Nech <svg>inline x^2</svg>.</p>\n<p><svg>display E = mc^2</svg></p>\n'
+
+    def test_other_output(self, tmp_path, convert):
+        self.populate(tmp_path, [('inline', 'x^2')])
+        assert convert('latex', 'sk', 'Nech $x^2$.\n', others=['html'], math='svg', math_cache=tmp_path) == \
+            ('Nech \\(x^2\\).\n', '<p>Nech <svg>inline x^2</svg>.</p>\n')
+
+    def test_locale(self):
+        assert 'output-decimal-marker   = {,},' in MathCache.settings('sk')
+        assert 'list-final-separator    = {\\text{ and }},' in MathCache.settings('en')
+        assert MathCache.salt('sk') != MathCache.salt('en')
+
+    @pytest.mark.parametrize('shared', [False, True], ids=['own', 'shared'])
+    def test_fallback_not_cached(self, tmp_path, convert, shared):
+        # An undefined macro fails TeX, and so does every formula where TeX is not installed
+        cache = ConversionCache(tmp_path / 'conversions')
+        options = dict(math='svg', math_cache=tmp_path / 'math', cache=cache)
+        if shared:
+            _, html = convert('latex', 'sk', 'Nech $\\undefined$.\n', others=['html'], **options)
+        else:
+            html = convert('html', 'sk', 'Nech $\\undefined$.\n', **options)
+        assert html == '<p>Nech <span class="math inline">\\(\\undefined\\)</span>.</p>\n'
+        assert [path.read_text() for path in cache.directory.glob('*/*')] == \
+            (['Nech \\(\\undefined\\).\n'] if shared else [])
+
+    def test_fragment(self):
+        svg = ("<?xml version='1.0' encoding='UTF-8'?>\n<!-- This file was generated by dvisvgm -->\n"
+               "<svg version='1.1' width='10pt' height='8pt'>\n<defs>\n<path id='g0-120' d='M1 2'/>\n</defs>\n"
+               "<use x='0' y='5' xlink:href='#g0-120'/>\n</svg>\n")
+        fragment = MathCache.fragment(svg, 'abcdef0123456789', 'inline', 'x < y', 1.5)
+        assert fragment == ('<span class="math inline" role="img" aria-label="x &lt; y">'
+                            '<svg style="vertical-align: -1.500pt" version=\'1.1\' width=\'10pt\' height=\'8pt\'> '
+                            '<defs> <path id=\'mabcdef012345-g0-120\' d=\'M1 2\'/> </defs> '
+                            '<use x=\'0\' y=\'5\' xlink:href=\'#mabcdef012345-g0-120\'/> </svg></span>')
+
+
+class TestMathml:
+    @staticmethod
+    def annotations(output):
+        return re.findall(r'<annotation encoding="application/x-tex">(.*?)</annotation>', output)
+
+    @pytest.mark.parametrize('locale_code,expected', [
+        ('sk', r'{3{,}5 \cdot 10^{3}\ \mathrm{km}\mathrm{s}^{-1}}'),
+        ('en', r'{3.5 \cdot 10^{3}\ \mathrm{km}\mathrm{s}^{-1}}'),
+    ])
+    def test_quantity(self, convert, locale_code, expected):
+        output = convert('html', locale_code, 'Rýchlosť $\\qty{3.5e3}{\\kilo\\metre\\per\\second}$.\n', math='mathml')
+        assert '<math' in output
+        assert self.annotations(output) == [expected]
+
+    @pytest.mark.parametrize('formula,expected', [
+        (r'\num{12345.678}', r'{12\,345{,}678}'),
+        (r'\num{7.2 +- 0.5}', r'{7{,}2 \pm 0{,}5}'),
+        (r'\num{1.23(4)}', r'{1{,}23 \pm 0{,}04}'),
+        (r'\ang{12;30}', r"{12^{\circ}30&#39;}"),
+        (r'\qty{3}{\degree}', r'{3\mathrm{°}}'),
+        (r'\qty{5}{\permille}', r'{5\ \mathrm{\text{‰}}}'),
+        (r'\numlist{1;2;3}', r'{1\text{,}\ 2\text{ a }3}'),
+        (r'\numlist{1;2;3;4}', r'{1\text{,}\ 2\text{,}\ 3\text{ a }4}'),
+        (r'\numlist{1;2}', r'{1\text{ a }2}'),
+        (r'\SIrange[mode=text]{5}{10}{\square\metre}', r'{5\ \mathrm{m}^{2}\text{ -- }10\ \mathrm{m}^{2}}'),
+    ])
+    def test_formatted(self, convert, formula, expected):
+        assert self.annotations(convert('html', 'sk', f'${formula}$\n', math='mathml')) == [expected]
+
+    def test_outside_math(self, convert):
+        assert self.annotations(convert('html', 'sk', 'Uhol \\ang{90}.\n', math='mathml')) == [r'{90^{\circ}}']
+
+    def test_other_output(self, convert):
+        latex, html = convert('latex', 'sk', '$\\qty{2}{\\metre}$\n', others=['html'], math='mathml')
+        assert latex == '\\(\\qty{2}{\\metre}\\)\n'
+        assert self.annotations(html) == [r'{2\ \mathrm{m}}']
+
+
+class TestPandocVersion:
+    @pytest.fixture
+    def old_pandoc(self, monkeypatch):
+        monkeypatch.setattr(convertor, 'pandoc_version', lambda: (2, 9, 2, 1))
+        convertor.warn_old_pandoc.cache_clear()
+
+    def test_version(self):
+        assert convertor.pandoc_version() >= (2,)
+
+    def test_python_filters(self, old_pandoc, capsys):
+        chain = Convertor('latex', 'sk', io.StringIO(), io.StringIO()).filter_chain()
+        assert [name for kind, name in chain if kind == 'json'] == ['pandoc-crossref', *Convertor.python_filters]
+        assert 'older than 2.17' in capsys.readouterr().out
+
+    def test_chosen_filters(self, old_pandoc):
+        assert Convertor('latex', 'sk', io.StringIO(), io.StringIO(), filters='lua').filters == 'lua'
+
+    def test_no_svg_math(self, old_pandoc):
+        assert Convertor('html', 'sk', io.StringIO(), io.StringIO(), math='svg').math == 'mathjax'
+
+    def test_not_rendered_together(self, old_pandoc):
+        latex = Convertor('latex', 'sk', io.StringIO(), io.StringIO())
+        html = Convertor('html', 'sk', io.StringIO(), io.StringIO())
+        assert not latex.shares_input(html, 'Ahoj\n')
@@ -0,0 +1,123 @@
+import datetime
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+
+from core.builder import daemon, git
+from modules.naboj.builder.contexts import BuildableContextVolume
+
+
+BUILDER = '''
+import sys
+import logging
+from core.utilities import logger
+
+log = logging.getLogger('dgs')
+if not log.handlers:
+    logger.setupLog('dgs')
+
+log.warning(f"building {sys.argv[1]}")
+print(open(sys.argv[1]).read().upper(), end='')
+sys.exit(int(sys.argv[2]))
+'''
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    """ A daemon serving from its own thread, and a builder module it can run """
+    (tmp_path / 'fake_builder.py').write_text(BUILDER)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.setattr(daemon, 'entry_points', daemon.entry_points | {'fake_builder'})
+    path = tmp_path / 'dgs.sock'
+
+    thread = threading.Thread(target=daemon.serve, args=(path,), daemon=True)
+    thread.start()
+    while daemon.server is None:
+        thread.join(0.01)
+    server = daemon.server
+    yield path
+
+    server.shutdown()
+    thread.join()
+
+
+class TestDaemon:
+    def test_build(self, socket_path, tmp_path):
+        source = tmp_path / 'source.txt'
+        source.write_text('náboj\n')
+        daemon_server, daemon.server = daemon.server, None
+        try:
+            response = daemon.request('fake_builder', ['fake_builder.py', str(source), '3'], path=socket_path)
+        finally:
+            daemon.server = daemon_server
+        assert response['status'] == 3
+        assert response['stdout'] == 'NÁBOJ\n'
+        assert f"building {source}" in response['stderr']
+
+    def test_not_a_builder(self, socket_path, tmp_path):
+        daemon_server, daemon.server = daemon.server, None
+        try:
+            response = daemon.request('os', ['os.py'], path=socket_path)
+        finally:
+            daemon.server = daemon_server
+        assert response == {'status': 1, 'stdout': '', 'stderr': "dgs daemon: os is not a builder\n"}
+
+    @pytest.mark.parametrize('module', sorted(daemon.entry_points))
+    def test_entry_point_exists(self, module):
+        assert Path(*module.split('.')).with_suffix('.py').is_file()
+
+    def test_not_running(self, tmp_path):
+        assert daemon.request('fake_builder', ['fake_builder.py'], path=tmp_path / 'missing.sock') is None
+
+    def test_stale(self, socket_path, monkeypatch):
+        daemon_server, daemon.server = daemon.server, None
+        monkeypatch.setattr(daemon, 'code_fingerprint', lambda: 'changed')
+        try:
+            assert daemon.request('fake_builder', ['fake_builder.py', 'x', '0'], path=socket_path) is None
+        finally:
+            daemon.server = daemon_server
+
+
+class TestContexts:
+    class Context:
+        built = 0
+
+        def __init__(self, root, *ident):
+            self.root, self.ident = root, ident
+            TestContexts.Context.built += 1
+
+    def test_kept_until_changed(self, socket_path, tmp_path):
+        (tmp_path / 'source').mkdir()
+        (tmp_path / 'source' / 'meta.yaml').write_text('a: 1\n')
+        first = daemon.context(self.Context, tmp_path / 'source', 'phys', 16)
+        assert daemon.context(self.Context, tmp_path / 'source', 'phys', 16) is first
+        assert daemon.context(self.Context, tmp_path / 'source', 'phys', 17) is not first
+
+        (tmp_path / 'source' / 'meta.yaml').write_text('a: 22\n')
+        assert daemon.context(self.Context, tmp_path / 'source', 'phys', 16) is not first
+
+    def test_without_daemon(self, tmp_path):
+        assert daemon.context(self.Context, tmp_path, 'phys') is not daemon.context(self.Context, tmp_path, 'phys')
+
+    def test_nested_repository(self, socket_path, volume):
+        """ New commits of repositories below the root, which the fingerprint skips, are in the build info """
+        def commit(message):
+            subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com',
+                            'commit', '--allow-empty', '-m', message], cwd=competition, check=True, capture_output=True)
+            git.clear_cache()
+
+        competition = volume / 'phys'
+        subprocess.run(['git', 'init', '--initial-branch=master'], cwd=competition, check=True, capture_output=True)
+        commit('First')
+        first = daemon.context(BuildableContextVolume, volume, 'phys', 16)
+        build = first.data['build']
+        assert build['repo']['hash'] == git.run_git(str(competition))[0]
+
+        commit('Second')
+        again = daemon.context(BuildableContextVolume, volume, 'phys', 16)
+        assert again is first
+        assert again.data['build']['repo']['hash'] == git.run_git(str(competition))[0] != build['repo']['hash']
+        assert again.data['build']['timestamp'] > build['timestamp']
+        assert isinstance(again.data['build']['timestamp'], datetime.datetime)
@@ -0,0 +1,64 @@
+import copy
+import jinja2
+import pickle
+import pytest
+
+from core.utilities.frozen import FrozenDict, FrozenList, freeze, thaw
+
+
+@pytest.fixture
+def data():
+    return {'venue': {'code': 'SKBAA', 'teams': [{'id': 1, 'name': 'Ťava'}, {'id': 2, 'name': 'Los'}]}, 'start': 600}
+
+
+class TestFrozen:
+    def test_freeze(self, data):
+        frozen = freeze(data)
+        assert frozen == data
+        assert isinstance(frozen['venue'], FrozenDict)
+        assert isinstance(frozen['venue']['teams'], FrozenList)
+        assert isinstance(frozen['venue']['teams'][0], FrozenDict)
+
+    def test_already_frozen_is_shared(self, data):
+        frozen = freeze(data)
+        again = freeze({'venue': frozen['venue']})
+        assert again['venue'] is frozen['venue']
+
+    @pytest.mark.parametrize("change", [
+        lambda x: x.__setitem__('start', 0),
+        lambda x: x.update(start=0),
+        lambda x: x.pop('start'),
+        lambda x: x['venue'].setdefault('name', ''),
+        lambda x: x['venue']['teams'].append({}),
+        lambda x: x['venue']['teams'].sort(),
+        lambda x: x['venue']['teams'][0].__delitem__('id'),
+    ])
+    def test_cannot_change(self, data, change):
+        with pytest.raises(TypeError):
+            change(freeze(data))
+
+    def test_or_copies_only_one_level(self, data):
+        frozen = freeze(data)
+        changed = frozen['venue'] | {'code': 'CZBAA'}
+        assert isinstance(changed, FrozenDict)
+        assert changed['code'] == 'CZBAA'
+        assert frozen['venue']['code'] == 'SKBAA'
+        assert changed['teams'] is frozen['venue']['teams']
+
+    def test_copies(self, data):
+        frozen = freeze(data)
+        assert copy.copy(frozen) is frozen
+        assert copy.deepcopy(frozen) is frozen
+        assert pickle.loads(pickle.dumps(frozen)) == frozen
+
+    def test_thaw(self, data):
+        thawed = thaw({'frozen': freeze(data)})
+        assert thawed == {'frozen': data}
+        assert type(thawed['frozen']['venue']) is dict
+        assert type(thawed['frozen']['venue']['teams'][0]) is dict
+        thawed['frozen']['venue']['teams'].append({})
+        assert len(data['venue']['teams']) == 2
+
+    def test_jinja(self, data):
+        template = jinja2.Template("{{ venue.code }}:{% for team in venue['teams'] %} {{ team.name }}{% endfor %}")
+        assert template.render(freeze(data)) == "SKBAA: Ťava Los"
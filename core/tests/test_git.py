@@ -0,0 +1,100 @@
+import hashlib
+import subprocess
+
+import pytest
+
+from core.builder import git
+
+
+def run(cwd, *args):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repository(tmp_path):
+    git.clear_cache()
+    run(tmp_path, 'init', '--initial-branch=master')
+    run(tmp_path, 'config', 'user.email', 'test@example.com')
+    run(tmp_path, 'config', 'user.name', 'Test')
+    (tmp_path / 'meta.yaml').write_text('id: 1\n')
+    run(tmp_path, 'add', 'meta.yaml')
+    run(tmp_path, 'commit', '-m', 'First')
+    (tmp_path / 'phys' / '16').mkdir(parents=True)
+    yield tmp_path
+    git.clear_cache()
+
+
+class TestGit:
+    def read(self, directory):
+        """ Metadata read from the files, which must agree with git """
+        git.clear_cache()
+        result = git.read_metadata(*git.git_directories(str(directory)))
+        assert result == git.run_git(str(directory))
+        return result
+
+    def test_loose_refs(self, repository):
+        sha, branch = self.read(repository / 'phys' / '16')
+        assert len(sha) == 7 and branch == 'master'
+
+    def test_packed_refs(self, repository):
+        run(repository, 'pack-refs', '--all')
+        assert not (repository / '.git' / 'refs' / 'heads' / 'master').exists()
+        self.read(repository)
+
+    def test_other_branch(self, repository):
+        run(repository, 'checkout', '-b', 'feature/tearoff')
+        (repository / 'meta.yaml').write_text('id: 2\n')
+        run(repository, 'commit', '-am', 'Second')
+        assert self.read(repository)[1] == 'feature/tearoff'
+
+    def test_detached(self, repository):
+        run(repository, 'checkout', '--detach')
+        assert self.read(repository)[1] == 'HEAD'
+
+    def test_worktree(self, repository, tmp_path_factory):
+        worktree = tmp_path_factory.mktemp('worktree') / 'tree'
+        run(repository, 'worktree', 'add', '-b', 'other', str(worktree))
+        assert self.read(worktree)[1] == 'other'
+
+    def test_abbrev(self, repository):
+        run(repository, 'config', 'core.abbrev', '12')
+        assert len(self.read(repository)[0]) == 12
+
+    @pytest.mark.parametrize('pack', [False, True])
+    def test_ambiguous(self, repository, pack):
+        """ Another object sharing the prefix makes the hash longer, as long as git makes it """
+        run(repository, 'config', 'core.abbrev', '4')
+        sha = self.read(repository)[0]
+        content = next(content for content in (f'{number}\n'.encode() for number in range(10 ** 7))
+                       if hashlib.sha1(b'blob %d\0' % len(content) + content).hexdigest().startswith(sha))
+        blob = subprocess.run(['git', 'hash-object', '-w', '--stdin'], cwd=repository, input=content,
+                              check=True, capture_output=True).stdout.decode().strip()
+        if pack:
+            run(repository, 'tag', 'blob', blob)
+            run(repository, 'repack', '-a', '-d')
+            assert not (repository / '.git' / 'objects' / blob[:2] / blob[2:]).exists()
+        assert len(self.read(repository)[0]) > 4
+
+    def test_large(self, repository):
+        """ Beyond 2 ** 14 packed objects git abbreviates to 8 characters by default """
+        stream = ''.join(f'blob\ndata {len(str(number)) + 1}\n{number}\n\n' for number in range(2 ** 14))
+        subprocess.run(['git', 'fast-import', '--quiet'], cwd=repository, input=stream.encode(),
+                       check=True, capture_output=True)
+        assert len(self.read(repository)[0]) == 8
+
+    def test_alternates(self, repository, tmp_path_factory):
+        clone = tmp_path_factory.mktemp('clone') / 'tree'
+        run(repository, 'clone', '--shared', str(repository), str(clone))
+        with pytest.raises(git.UnreadableRepository):
+            git.read_metadata(*git.git_directories(str(clone)))
+        assert git.metadata(str(clone)) == git.run_git(str(clone))
+
+    def test_cached(self, repository, monkeypatch):
+        expected = git.metadata(str(repository))
+        monkeypatch.setattr(git, 'packed_refs', None)
+        assert git.metadata(str(repository / 'phys')) == expected
+
+    def test_not_a_repository(self, tmp_path_factory):
+        directory = tmp_path_factory.mktemp('plain')
+        with pytest.raises(subprocess.CalledProcessError):
+            git.metadata(str(directory))
@@ -0,0 +1,82 @@
+import jinja2
+import pytest
+import tracemalloc
+
+from core.builder import jinja
+
+
+@pytest.fixture
+def root(tmp_path, monkeypatch):
+    monkeypatch.setattr(jinja, 'bytecode_directory', tmp_path / 'bytecode')
+    jinja.bytecode_cache.cache_clear()
+    jinja._environment.cache_clear()
+    (tmp_path / 'templates').mkdir()
+    (tmp_path / 'templates' / 'base.jtt').write_text('(@ block body @)(@ endblock @)\n')
+    (tmp_path / 'templates' / 'page.jtt').write_text(
+        "(@ extends 'base.jtt' @)(@ block body @)(* x | roman *)(@ endblock @)"
+    )
+    yield tmp_path / 'templates'
+    jinja.bytecode_cache.cache_clear()
+    jinja._environment.cache_clear()
+
+
+class TestEnvironment:
+    def test_shared_by_root(self, root):
+        assert jinja.environment(root) is jinja.environment(f'{root}/')
+        assert jinja.environment(root) is not jinja.environment(root / '..')
+
+    def test_bytecode_persisted(self, root, tmp_path):
+        assert jinja.environment(root).get_template('page.jtt').render(x=4) == 'IV'
+        assert len(list((tmp_path / 'bytecode').iterdir())) == 2
+
+        # A new process starts with an empty environment, but loads the compiled templates
+        jinja._environment.cache_clear()
+        env = jinja.environment(root)
+        env.compile = None
+        assert env.get_template('page.jtt').render(x=9) == 'IX'
+
+    def test_recompiled_when_changed(self, root):
+        assert jinja.environment(root).get_template('page.jtt').render(x=4) == 'IV'
+        jinja._environment.cache_clear()
+        (root / 'base.jtt').write_text('[(@ block body @)(@ endblock @)]\n')
+        assert jinja.environment(root).get_template('page.jtt').render(x=4) == '[IV]'
+
+
+class TestPrintTemplate:
+    @pytest.fixture
+    def teams(self, root):
+        (root / 'teams.jtt').write_text(
+            "%% for team in range(teams)\n"
+            "Tím (* team *): (* range(problems) | join(' ') *)\n"
+            "%% endfor\n"
+        )
+        (root / 'broken.jtt').write_text("(* teams *)\n(* venue *)\n")
+        return root
+
+    def test_file(self, teams, tmp_path):
+        context = {'teams': 2, 'problems': 3}
+        written = jinja.print_template(teams, 'teams.jtt', context, outdir=tmp_path, new_name='teams.tex')
+        assert (tmp_path / 'teams.tex').read_text() == "Tím 0: 0 1 2\nTím 1: 0 1 2\n\n"
+        assert (tmp_path / 'teams.tex').read_text() == \
+            jinja.environment(teams).get_template('teams.jtt').render(context) + '\n'
+        assert written == (tmp_path / 'teams.tex').stat().st_size
+
+    def test_stdout(self, teams, capsys):
+        written = jinja.print_template(teams, 'teams.jtt', {'teams': 1, 'problems': 2})
+        assert capsys.readouterr().out == "Tím 0: 0 1\n\n"
+        assert written == len("Tím 0: 0 1\n\n".encode('utf-8'))
+
+    def test_failed_output_is_removed(self, teams, tmp_path):
+        with pytest.raises(jinja2.exceptions.UndefinedError):
+            jinja.print_template(teams, 'broken.jtt', {'teams': 2}, outdir=tmp_path, new_name='broken.tex')
+        assert not (tmp_path / 'broken.tex').exists()
+
+    def test_memory_does_not_grow_with_output(self, teams, tmp_path):
+        jinja.print_template(teams, 'teams.jtt', {'teams': 1, 'problems': 1}, outdir=tmp_path, new_name='teams.tex')
+        tracemalloc.start()
+        written = jinja.print_template(teams, 'teams.jtt', {'teams': 5000, 'problems': 100}, outdir=tmp_path,
+                                       new_name='teams.tex')
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert written > 2 ** 20
+        assert peak < 2 ** 18
@@ -0,0 +1,97 @@
+import os
+import shutil
+import subprocess
+import time
+from pathlib import Path
+
+import pytest
+
+
+root = Path(__file__).parents[2]
+
+pytestmark = pytest.mark.skipif(shutil.which('make') is None, reason="make is not installed")
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """ A working tree with the repository's build system and a naboj volume with two Slovak problems """
+    for name in ['Makefile', 'modules', 'core', 'convert.py']:
+        (tmp_path / name).symlink_to(root / name)
+    for problem in ['a', 'b']:
+        directory = tmp_path / 'source' / 'naboj' / 'c' / 'v' / 'problems' / problem / 'sk'
+        directory.mkdir(parents=True)
+        (directory / 'problem.md').write_text(f'Úloha {problem}\n')
+    return tmp_path
+
+
+def make(tree, target):
+    result = subprocess.run(['make', target], cwd=tree, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+    return result.stdout
+
+
+def output(tree, problem):
+    return tree / 'build' / 'naboj' / 'c' / 'v' / 'problems' / problem / 'sk' / 'problem.tex'
+
+
+class TestBatch:
+    target = 'build/naboj/c/v/problems/sk'
+
+    def test_converted(self, tree):
+        make(tree, self.target)
+        assert [output(tree, problem).read_text() for problem in 'ab'] == ['Úloha a\n', 'Úloha b\n']
+        assert 'Batch converting' not in make(tree, self.target)
+
+    def test_deleted_output(self, tree):
+        make(tree, self.target)
+        stamp = tree / 'build' / 'naboj' / 'c' / 'v' / 'problems' / 'sk.batch'
+        mtime = output(tree, 'a').stat().st_mtime_ns
+        output(tree, 'b').unlink()
+        assert stamp.stat().st_mtime_ns >= mtime
+
+        make(tree, self.target)
+        assert output(tree, 'b').read_text() == 'Úloha b\n'
+        # Only the missing output is converted again
+        assert output(tree, 'a').stat().st_mtime_ns == mtime
+
+    def test_changed_source(self, tree):
+        make(tree, self.target)
+        source = tree / 'source' / 'naboj' / 'c' / 'v' / 'problems' / 'a' / 'sk' / 'problem.md'
+        source.write_text('Nová úloha a\n')
+        later = output(tree, 'a').stat().st_mtime_ns + 1_000_000_000
+        os.utime(source, ns=(later, later))
+
+        make(tree, self.target)
+        assert output(tree, 'a').read_text() == 'Nová úloha a\n'
+
+    def test_changed_include(self, tree):
+        source = tree / 'source' / 'naboj' / 'c' / 'v' / 'problems' / 'a' / 'sk'
+        (source / 'part.md').write_text('Časť\n')
+        (source / 'problem.md').write_text('Úloha a\n\n!include part.md\n')
+        make(tree, self.target)
+        assert output(tree, 'a').read_text() == 'Úloha a\n\nČasť\n'
+
+        (source / 'part.md').write_text('Nová časť\n')
+        later = output(tree, 'a').stat().st_mtime_ns + 1_000_000_000
+        os.utime(source / 'part.md', ns=(later, later))
+        make(tree, self.target)
+        assert output(tree, 'a').read_text() == 'Úloha a\n\nNová časť\n'
+
+
+class TestVolume:
+    target = 'build/naboj/c/v/build-volume'
+
+    def test_i18n_prerequisite(self, tree):
+        source, build = tree / 'source' / 'naboj' / 'c', tree / 'build' / 'naboj' / 'c'
+        translation = source / '.static' / 'i18n' / 'sk.yaml'
+        # Made in the future, so that everything is newer than the directories created for it
+        made = time.time_ns() + 10 ** 10
+        for path in [source / 'meta.yaml', source / 'v' / 'meta.yaml', source / 'v' / 'languages' / 'sk' / 'meta.yaml',
+                     translation, build / 'copy-static', build / '.static' / 'logo' / 'logo.pdf', tree / self.target]:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+            os.utime(path, ns=(made, made))
+        assert subprocess.run(['make', '-q', self.target], cwd=tree).returncode == 0
+
+        os.utime(translation, ns=(made + 10 ** 9, made + 10 ** 9))
+        assert subprocess.run(['make', '-q', self.target], cwd=tree).returncode == 1
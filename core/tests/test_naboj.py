@@ -0,0 +1,54 @@
+import pytest
+
+from core.builder.context import registry
+from modules.naboj.builder.contexts import BuildableContextLanguage, BuildableContextVenue, BuildableContextVolume
+from modules.naboj.builder.contexts.hierarchy import ContextCompetition, ContextVenue, ContextVolume
+
+
+def without_timestamps(data):
+    """ The data without the build timestamps, which differ between contexts built at different times """
+    if isinstance(data, dict):
+        return {key: without_timestamps(value) for key, value in data.items() if key != 'timestamp'}
+    if isinstance(data, list | tuple):
+        return [without_timestamps(item) for item in data]
+    return data
+
+
+class TestVolume:
+    def built(self, cls) -> int:
+        return sum(key[0] is cls for key in registry.contexts)
+
+    def test_shared(self, volume):
+        parent = BuildableContextVolume(volume, 'phys', 16)
+        language = BuildableContextLanguage(volume, 'phys', 16, 'sk', parent=parent)
+        venue = BuildableContextVenue(volume, 'phys', 16, 'bratislava', parent=parent)
+
+        assert language.volume is parent.volume and venue.volume is parent.volume
+        assert language.competition is parent.competition and venue.competition is parent.competition
+        assert language.data['i18n'] == venue.data['i18n'] == parent.i18n('phys').data
+        # The venue looks up its volume again, and gets it from the registry
+        assert self.built(ContextVolume) == 1 and self.built(ContextCompetition) == 1
+        assert registry.saved >= 1
+
+    def test_venue(self, volume):
+        parent = BuildableContextVolume(volume, 'phys', 16)
+        venue = BuildableContextVenue(volume, 'phys', 16, 'bratislava', parent=parent)
+        assert venue.data['venue']['start'] == 600
+        assert venue.data['venue']['problems_modulo'] == [[{'id': 'vlak', 'number': 2}],
+                                                          [{'id': 'kolotoc', 'number': 1},
+                                                           {'id': 'lampa', 'number': 3}]]
+        assert venue.data['language']['id'] == 'sk'
+        assert self.built(ContextVenue) == 1
+
+    @pytest.mark.parametrize('cls, ident', [(BuildableContextLanguage, 'sk'), (BuildableContextVenue, 'bratislava')])
+    def test_same_data(self, volume, cls, ident):
+        """ A context is not kept by the registry when built with the unhashable parent, but has the same data """
+        parent = BuildableContextVolume(volume, 'phys', 16)
+        shared = cls(volume, 'phys', 16, ident, parent=parent)
+        assert not any(key[0] is cls for key in registry.contexts)
+
+        registry.clear()
+        registry.validation = 'off'
+        alone = cls(volume, 'phys', 16, ident)
+        assert without_timestamps(shared.data) == without_timestamps(alone.data)
+        assert shared.data['volume']['problems'][1] == {'id': 'vlak', 'number': 2}
@@ -0,0 +1,156 @@
+import datetime
+import importlib
+import inspect
+import pytest
+from pathlib import Path
+
+import schema as base
+from enschema import Schema, And, Or, Optional, Regex, Use
+
+from core.builder.context import Context
+from core.utilities.frozen import freeze
+from core.utilities.schema import compiled
+
+
+person = {'name': str, 'gender': Or('f', 'm', '?')}
+
+SCHEMAS = {
+    'literals': Schema({
+        'id': And(str, len),
+        'number': And(int, lambda x: x > 0),
+        Optional('tags'): [str],
+        'date': datetime.date,
+    }),
+    'patterns': Schema({str: int, 'name': str}),
+    'nested lists': Schema({'categories': [[], [And(str, len)]]}),
+    'or': Schema(Or('', [person])),
+    'regex': Schema({'code': Regex(r'^[A-Z]{5}$'), Optional('symbol'): Or(None, And(str, lambda x: len(x) == 1))}),
+    'use': Schema({'skin': Use(str), Optional('count'): And(Use(int), lambda x: x > 2)}),
+    'ignore extra keys': Schema({'id': str, 'inner': {'a': int}}, ignore_extra_keys=True),
+    'nested schema': Schema({'inner': Schema({'a': int})}),
+    'literal keys': Schema({'inner': {base.Literal('a', description="Some number"): int}}),
+}
+
+DATA = [
+    None, 0, 1, True, 3.5, '', 'x', 'ABCDE', [], [''], ['a', 'b'], [{'name': 'Ňa', 'gender': 'f'}],
+    {},
+    {'id': 'a', 'number': 3, 'date': datetime.date(2024, 1, 1)},
+    {'id': 'a', 'number': 3, 'date': datetime.date(2024, 1, 1), 'tags': ['x']},
+    {'id': 'a', 'number': True, 'date': datetime.date(2024, 1, 1)},
+    {'id': '', 'number': 3, 'date': datetime.date(2024, 1, 1)},
+    {'id': 'a', 'number': 3, 'date': datetime.date(2024, 1, 1), 'extra': 1},
+    {'name': 'a', 'b': 1, 'c': 2},
+    {'name': 'a', 'b': '1'},
+    {'b': 1},
+    {'categories': []},
+    {'categories': [[], ['a', 'b']]},
+    {'categories': [['']]},
+    {'code': 'ABCDE'},
+    {'code': 'ABCDEF', 'symbol': None},
+    {'code': 'ABCDE', 'symbol': 'ab'},
+    {'code': 5},
+    {'skin': 'orange', 'count': '3'},
+    {'skin': 'orange', 'count': '1'},
+    {'skin': 'orange', 'count': 'many'},
+    {'id': 'a', 'inner': {'a': 1, 'b': 2}, 'other': 3},
+    {'id': 'a', 'inner': {'a': '1'}},
+    {'inner': {'a': 1}},
+    {'inner': {'a': 1, 'b': 2}},
+]
+
+
+class TestCompiled:
+    @pytest.mark.parametrize("name", SCHEMAS.keys())
+    def test_agrees_with_schema(self, name):
+        schema = SCHEMAS[name]
+        check = compiled(schema)
+        for data in DATA:
+            assert check(data) == schema.is_valid(data), data
+
+    @pytest.mark.parametrize("name", SCHEMAS.keys())
+    def test_frozen_data(self, name):
+        """ Shared data of contexts is frozen, also where compiled checks fall back to the schema """
+        schema = SCHEMAS[name]
+        check = compiled(schema)
+        for data in DATA:
+            assert check(freeze(data)) == schema.is_valid(data), data
+
+    def test_compiled_once(self):
+        schema = Schema({'a': int})
+        assert compiled(schema) is compiled(schema)
+        assert compiled(schema) is not compiled(Schema({'a': int}))
+
+
+def context_files() -> list[Path]:
+    return sorted(path for pattern in ['*/builder/context.py', '*/builder/contexts/*.py']
+                  for path in Path('modules').glob(pattern) if path.name != '__init__.py')
+
+
+def context_schemas() -> dict[str, Schema]:
+    """ The _schema of every context class of core and of all modules, by the name of the class """
+    names = ['core.builder.context'] + ['.'.join(path.with_suffix('').parts) for path in context_files()]
+    schemas = {}
+    for name in names:
+        for _, cls in inspect.getmembers(importlib.import_module(name), inspect.isclass):
+            if issubclass(cls, Context) and isinstance(cls.__dict__.get('_schema'), base.Schema):
+                schemas.setdefault(f'{cls.__module__}.{cls.__qualname__}', cls._schema)
+    return schemas
+
+
+# Values tried for leaves of a schema, the first one the leaf accepts is taken
+LEAVES = [
+    'abc', 'ABCDE', 'orange', 'sk', 'slovak', 'kinematics', 1, 0, True, None, 2.5,
+    datetime.date(2024, 4, 19), datetime.datetime(2024, 4, 19, 12), [], {},
+]
+
+
+def valid(sch):
+    """ Some data that `sch` accepts, with all optional keys present """
+    if type(sch) in (base.Schema, Schema, base.Optional, Optional, base.Literal):
+        return valid(sch.schema)
+    if sch is None or isinstance(sch, (str, int, float)):
+        return sch
+    if isinstance(sch, dict):
+        return {valid(key): valid(value) for key, value in sch.items()}
+    if type(sch) in (list, tuple):
+        return type(sch)(valid(item) for item in sch)
+    candidates = [valid(arg) for arg in sch.args] if isinstance(sch, (base.And, base.Or)) else []
+    for candidate in candidates + LEAVES:
+        if Schema(sch).is_valid(candidate):
+            return candidate
+    raise ValueError(f"No sample data for {sch!r}")
+
+
+def mutations(data):
+    """ Copies of `data` with a single change anywhere in it: a key removed or added, or a value replaced """
+    yield from [None, 'abc', 5, True, []]
+    if isinstance(data, dict):
+        yield data | {'unexpected': 1}
+        for key, value in data.items():
+            yield {k: v for k, v in data.items() if k != key}
+            for changed in mutations(value):
+                yield data | {key: changed}
+    elif isinstance(data, list):
+        yield data + data
+        for index, item in enumerate(data):
+            for changed in mutations(item):
+                yield data[:index] + [changed] + data[index + 1:]
+
+
+class TestContextSchemas:
+    @pytest.mark.parametrize("name, schema", context_schemas().items())
+    def test_agrees_with_schema(self, name, schema):
+        check = compiled(schema)
+        sample = valid(schema)
+        assert check(sample) and schema.is_valid(sample)
+
+        invalid = 0
+        for data in mutations(sample):
+            assert check(data) == schema.is_valid(data), data
+            invalid += not check(data)
+        assert invalid > 0
+
+    def test_all_modules(self):
+        """ All modules whose contexts have schemas of their own are covered """
+        modules = {name.split('.')[1] for name in context_schemas() if name.startswith('modules.')}
+        assert modules == {path.parts[1] for path in context_files() if '_schema = ' in path.read_text()}
@@ -0,0 +1,14 @@
+import pytest
+
+from core.benchmarks.startup import ENTRY_POINTS, imports
+
+
+class TestStartup:
+    @pytest.mark.parametrize('name', ENTRY_POINTS.keys())
+    def test_no_unneeded_imports(self, name):
+        argv, _, forbidden = ENTRY_POINTS[name]
+        try:
+            _, modules = imports(argv)
+        except RuntimeError as error:
+            pytest.skip(str(error))
+        assert set(forbidden) & modules == set()
@@ -0,0 +1,120 @@
+import os
+import pytest
+from pathlib import Path
+
+from enschema import Schema, SchemaError, Optional, Regex
+
+from core.builder import validate, validator
+from core.builder.cache import TreeCache
+from core.builder.validator import FileSystemValidator, File, Link
+
+
+class RoundValidator(FileSystemValidator):
+    _schema = Schema({
+        Regex(r'0[1-8]'): {
+            'problem.md': File,
+            Optional('figure.png'): Link,
+        },
+        'meta.yaml': File,
+        Optional('.git'): None,
+    })
+
+
+def age(root: Path, seconds: int = 10) -> None:
+    """ Make all directories under `root` look as if they were changed `seconds` ago """
+    for directory, _, _ in os.walk(root):
+        info = os.stat(directory)
+        os.utime(directory, ns=(info.st_atime_ns, info.st_mtime_ns - seconds * 10 ** 9))
+
+
+@pytest.fixture(autouse=True)
+def tree_cache(tmp_path, monkeypatch):
+    cache = TreeCache(tmp_path / 'cache')
+    monkeypatch.setattr(validator, 'tree_cache', cache)
+    return cache
+
+
+@pytest.fixture
+def round_root(tmp_path):
+    root = tmp_path / 'round'
+    for problem in ['01', '02']:
+        Path(root, problem).mkdir(parents=True)
+        Path(root, problem, 'problem.md').write_text("Zadanie")
+    Path(root, 'meta.yaml').write_text("id: 1")
+    Path(root, '.git', 'objects').mkdir(parents=True)
+    Path(root, '01', 'figure.png').symlink_to(Path(root, 'meta.yaml'))
+    age(root)
+    return root
+
+
+class TestScan:
+    def test_tree(self, round_root):
+        assert RoundValidator(round_root).tree == {
+            '01': {'problem.md': File, 'figure.png': Link},
+            '02': {'problem.md': File},
+            'meta.yaml': File,
+            '.git': None,
+        }
+        RoundValidator(round_root).validate()
+
+    def test_not_a_directory(self, round_root):
+        assert RoundValidator(round_root / 'meta.yaml').tree == File
+        assert RoundValidator(round_root / 'missing').tree is None
+
+    def test_unchanged_directories_are_not_listed_again(self, round_root, tree_cache):
+        first = RoundValidator(round_root).tree
+        # The .git directory is not scanned
+        assert (tree_cache.hits, tree_cache.misses) == (0, 3)
+        assert RoundValidator(round_root).tree == first
+        assert (tree_cache.hits, tree_cache.misses) == (3, 3)
+
+    def test_changed_directories_are_listed_again(self, round_root, tree_cache):
+        RoundValidator(round_root).tree
+        Path(round_root, '03').mkdir()
+        tree = RoundValidator(round_root).tree
+        assert tree['03'] == {}
+        # Only the root has changed, the new directory is listed for the first time
+        assert (tree_cache.hits, tree_cache.misses) == (2, 5)
+        with pytest.raises(SchemaError):
+            RoundValidator(round_root).check()
+
+    def test_recently_changed_directories_are_listed_again(self, round_root, tree_cache):
+        Path(round_root, '02', 'figure.png').symlink_to(Path(round_root, 'meta.yaml'))
+        RoundValidator(round_root).tree
+        RoundValidator(round_root).tree
+        assert (tree_cache.hits, tree_cache.misses) == (2, 4)
+
+    def test_listings_are_shared_by_processes(self, round_root, tree_cache):
+        tree = RoundValidator(round_root).tree
+        other = TreeCache(tree_cache.directory)
+        validator.tree_cache = other
+        assert RoundValidator(round_root).tree == tree
+        assert (other.hits, other.misses) == (3, 0)
+
+
+class TestValidate:
+    @pytest.fixture
+    def source(self, tmp_path):
+        for issue in ['1', '2']:
+            root = Path(tmp_path, 'source', 'seminar', 'fks', '39', '1', issue)
+            Path(root, '01').mkdir(parents=True)
+            Path(root, '01', 'problem.md').write_text("Zadanie")
+            Path(root, '01', 'solution.md').write_text("Riešenie")
+            Path(root, '01', 'meta.yaml').write_text("id: 1")
+            Path(root, 'meta.yaml').write_text("id: 1")
+        # Not a repository without its meta.yaml
+        Path(tmp_path, 'source', 'seminar', 'fks', '39', '1', '3').mkdir()
+        return Path(tmp_path, 'source')
+
+    def test_repositories(self, source):
+        assert [root for _, _, root in validate.repositories(source)] == [
+            Path(source, 'seminar', 'fks', '39', '1', '1'),
+            Path(source, 'seminar', 'fks', '39', '1', '2'),
+        ]
+
+    def test_validate(self, source):
+        repositories = list(validate.repositories(source))
+        Path(repositories[1][2], '01', 'solution.md').unlink()
+        (root, error, warnings), (broken, broken_error, _) = [validate.validate(*args) for args in repositories]
+        assert (root, error, warnings) == (repositories[0][2], None, '')
+        assert broken == repositories[1][2] and 'solution.md' in broken_error
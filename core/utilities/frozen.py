@@ -0,0 +1,70 @@
+from typing import Any
+
+
+def _frozen(self, *args, **kwargs):
+    raise TypeError(f"{self.__class__.__name__} cannot be changed, as it may be shared by several contexts")
+
+
+class FrozenDict(dict):
+    """
+    A dict that cannot be changed, so that contexts can share it instead of copying it.
+    `frozen | other` is a new FrozenDict that shares all values of both.
+    """
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __ior__ = _frozen
+    clear = pop = popitem = setdefault = update = _frozen
+
+    def __or__(self, other):
+        if not isinstance(other, dict):
+            return NotImplemented
+        return FrozenDict({**self, **freeze(other)})
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
+
+
+class FrozenList(list):
+    """ A list that cannot be changed, so that contexts can share it instead of copying it """
+    __slots__ = ()
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _frozen
+    append = extend = insert = pop = remove = clear = sort = reverse = _frozen
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+
+def freeze(value: Any) -> Any:
+    """ `value` with all dicts and lists in it frozen. Parts that are already frozen are shared, not copied. """
+    if isinstance(value, (FrozenDict, FrozenList)):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return FrozenList(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """
+    `value` with all dicts and lists in it copied to plain ones, for code that builds new containers of the same type,
+    such as `Schema.validate`
+    """
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [thaw(item) for item in value]
+    return value
@@ -1,6 +1,10 @@
-from enschema import And, Or, Regex
+from typing import Any, Callable
+
+import schema
+from enschema import And, Or, Regex, Schema, Optional, Const
 
 from core import i18n
+from core.utilities.frozen import thaw
 
 
 def valid_language(code: str) -> bool:
@@ -9,3 +13,172 @@ def valid_language(code: str) -> bool:
 
 def valid_language_name(name: str) -> bool:
     return name in [lang.name for lang in i18n.languages.values()]
+
+
+Check = Callable[[Any], bool]
+
+# Compiled checks by the identity of their schema, which is kept alive so that the identity is not reused
+_compiled: dict[int, tuple[Any, Check]] = {}
+
+
+def compiled(sch: Schema) -> Check:
+    """
+    A check of whether `sch` accepts the data, equivalent to its `is_valid`, but without building a new Schema
+    for every node of the data and formatting error messages that nobody reads. Compiled once per schema object,
+    so schemas must not be modified after being compiled. If the check fails, `sch.validate` explains why,
+    given thawed data (see `core.utilities.frozen.thaw`).
+    """
+    found = _compiled.get(id(sch))
+    if found is None or found[0] is not sch:
+        found = _compiled[id(sch)] = (sch, _compile(sch, False))
+    return found[1]
+
+
+def _fallback(sch: Any, ignore_extra_keys: bool) -> Check:
+    # Schema builds new containers of the type of the data, which frozen data cannot be filled into
+    full = Schema(sch, ignore_extra_keys=ignore_extra_keys)
+    return lambda data: full.is_valid(thaw(data))
+
+
+def _priority(sch: Any) -> float:
+    """ The order in which schema tries the keys of a dictionary schema """
+    raw = sch.schema if isinstance(sch, schema.Optional) else sch
+    if type(raw) in (list, tuple, set, frozenset):
+        result = 5
+    elif isinstance(raw, dict):
+        result = 4
+    elif isinstance(raw, type):
+        result = 3
+    elif isinstance(raw, schema.Literal):
+        result = 0
+    elif hasattr(raw, 'validate'):
+        result = 2
+    elif callable(raw):
+        result = 1
+    else:
+        result = 0
+    return result + 0.5 if isinstance(sch, schema.Optional) else result
+
+
+def _transforms(sch: Any) -> bool:
+    """ Whether validating with `sch` may change the data, which matters for the rest of an And """
+    if isinstance(sch, (schema.Use, schema.Hook)) or (isinstance(sch, schema.Optional) and hasattr(sch, 'default')):
+        return True
+    if isinstance(sch, schema.And):
+        return any(map(_transforms, sch.args))
+    if isinstance(sch, schema.Schema):
+        return _transforms(sch.schema)
+    if isinstance(sch, dict):
+        return any(map(_transforms, [*sch.keys(), *sch.values()]))
+    if type(sch) in (list, tuple, set, frozenset):
+        return any(map(_transforms, sch))
+    return False
+
+
+def _compile(sch: Any, ignore_extra_keys: bool) -> Check:
+    """ Mirrors `Schema(sch, ignore_extra_keys=ignore_extra_keys).validate`, as a boolean """
+    if isinstance(sch, schema.Literal):
+        sch = sch.schema
+
+    if type(sch) in (list, tuple, set, frozenset):
+        kind = type(sch)
+        items = [_compile(item, ignore_extra_keys) for item in sch]
+        return lambda data: isinstance(data, kind) and all(any(item(x) for item in items) for x in data)
+
+    if isinstance(sch, dict):
+        return _compile_dict(sch, ignore_extra_keys)
+
+    if isinstance(sch, type):
+        if sch is int:
+            return lambda data: isinstance(data, int) and not isinstance(data, bool)
+        return lambda data: isinstance(data, sch)
+
+    if hasattr(sch, 'validate'):
+        return _compile_validator(sch)
+
+    if callable(sch):
+        def check(data):
+            try:
+                return bool(sch(data))
+            except Exception:
+                return False
+        return check
+
+    return lambda data: sch == data
+
+
+def _compile_validator(sch: Any) -> Check:
+    if type(sch) in (schema.Schema, Schema, schema.Optional, Optional, schema.Const, Const):
+        return _compile(sch.schema, sch.ignore_extra_keys)
+
+    if isinstance(sch, schema.Or):
+        if sch.only_one:
+            return _fallback(sch, False)
+        items = [_compile(arg, sch._ignore_extra_keys) for arg in sch.args]
+        return lambda data: any(item(data) for item in items)
+
+    if isinstance(sch, schema.And):
+        # Later parts of an And see the data as transformed by earlier ones
+        if any(map(_transforms, sch.args[:-1])):
+            return _fallback(sch, False)
+        items = [_compile(arg, sch._ignore_extra_keys) for arg in sch.args]
+        return lambda data: all(item(data) for item in items)
+
+    if isinstance(sch, schema.Regex):
+        pattern = sch._pattern
+
+        def check(data):
+            try:
+                return pattern.search(data) is not None
+            except TypeError:
+                return False
+        return check
+
+    def check(data):
+        try:
+            sch.validate(thaw(data))
+            return True
+        except Exception:
+            return False
+    return check
+
+
+def _compile_dict(sch: dict, ignore_extra_keys: bool) -> Check:
+    if any(isinstance(key, (schema.Hook, schema.Literal)) for key in sch):
+        return _fallback(sch, ignore_extra_keys)
+
+    # Keys that are plain values are found by lookup, all others are tried in the order schema would try them
+    keys = sorted(sch, key=_priority)
+    literals: dict[Any, tuple[int, Check]] = {}
+    patterns: list[tuple[int, Check, Check]] = []
+    for index, key in enumerate(keys):
+        value = _compile(sch[key], ignore_extra_keys)
+        if _priority(key) < 1:
+            literals.setdefault(key.schema if isinstance(key, schema.Optional) else key, (index, value))
+        else:
+            patterns.append((index, _compile(key, False), value))
+    required = {index for index, key in enumerate(keys) if not isinstance(key, schema.Optional)}
+
+    def check(data):
+        if not isinstance(data, dict):
+            return False
+
+        covered = set()
+        matched = 0
+        for key, value in data.items():
+            found = literals.get(key)
+            if found is None:
+                for index, key_check, value_check in patterns:
+                    if key_check(key):
+                        found = index, value_check
+                        break
+                else:
+                    continue
+
+            if not found[1](value):
+                return False
+            covered.add(found[0])
+            matched += 1
+
+        return required <= covered and (ignore_extra_keys or matched == len(data))
+    return check
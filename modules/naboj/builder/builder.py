@@ -2,7 +2,6 @@ import abc
 from pathlib import Path
 
 from core.builder import builder
-import core.builder.jinja as jinja
 
 
 class BuilderNaboj(builder.BaseBuilder, metaclass=abc.ABCMeta):
@@ -19,9 +18,14 @@ class BuilderNaboj(builder.BaseBuilder, metaclass=abc.ABCMeta):
 
     def build_templates(self):
         super().build_templates()
-        for template in self.i18n_templates:
-            jinja.print_template(
-                Path(self.launch_directory, *self.path()), template, self.context.data,
-                outdir=self.output_directory,
-                new_name=Path(template).with_suffix('.tex'),
-            )
+        self.print_templates(Path(self.launch_directory, *self.path()), self.i18n_templates, self.context,
+                             self.output_directory)
+
+    @staticmethod
+    def print_templates(root, templates: list[str], context, outdir) -> None:
+        """ Render templates found in `root` with the context to `outdir`, as .tex files """
+        from core.builder import jinja
+
+        for template in templates:
+            jinja.print_template(root, template, context.data, outdir=outdir,
+                                 new_name=Path(template).with_suffix('.tex'))
@@ -1,3 +1,3 @@
 from .base import ContextNaboj
 from .i18n import ContextI18n, ContextI18nGlobal
-from .buildable import BuildableContextLanguage, BuildableContextVenue
+from .buildable import BuildableContextLanguage, BuildableContextVenue, BuildableContextVolume
@@ -72,20 +72,21 @@ class ContextNaboj(context.FileSystemContext):
         -   dgs branch and git hash
         -   repo branch and git hash
         """
-        self.add(
-            build={
-                'user': os.environ.get('USERNAME'),
-                'dgs': {
-                    'hash': get_last_commit_hash(),
-                    'branch': get_branch(),
-                },
-                'repo': {
-                    'hash': get_last_commit_hash(self.node_path(repo_root)),
-                    'branch': get_branch(self.node_path(repo_root)),
-                },
-                'timestamp': datetime.datetime.now(datetime.timezone.utc),
+        self.add(build=self.build_info(repo_root))
+
+    def build_info(self, repo_root: str) -> dict:
+        return {
+            'user': os.environ.get('USERNAME'),
+            'dgs': {
+                'hash': get_last_commit_hash(),
+                'branch': get_branch(),
             },
-        )
+            'repo': {
+                'hash': get_last_commit_hash(self.node_path(repo_root)),
+                'branch': get_branch(self.node_path(repo_root)),
+            },
+            'timestamp': datetime.datetime.now(datetime.timezone.utc),
+        }
 
     def as_tuple(self, competition: str = None, volume: int = None, sub: str = None, issue: str = None):
         assert competition in ContextNaboj.competitions
@@ -12,48 +12,77 @@ class BuildableContextNaboj(BuildableFileSystemContext, ContextNaboj, metaclass=
     _schema = ContextNaboj._schema
     _validator_class = NabojValidator
 
+    def __init__(self, root, *args, parent: 'BuildableContextVolume | None' = None):
+        # The context of the whole volume, if building all its languages and venues, which shares its contexts
+        self.parent = parent
+        super().__init__(root, *args)
+
     def populate(self, competition, volume):
         super().populate(competition)
+        self._competition = competition
+        if self.parent is None:
+            self.competition = ContextCompetition(self.root, competition)
+            self.volume = ContextVolume(self.root, competition, volume)
+        else:
+            self.competition = self.parent.competition
+            self.volume = self.parent.volume
+
         self.adopt(
             module=ContextModule('naboj'),
-            competition=ContextCompetition(self.root, competition),
-            volume=ContextVolume(self.root, competition, volume),
+            competition=self.competition,
+            volume=self.volume,
         )
 
+    def i18n(self, competition) -> ContextI18nGlobal:
+        return ContextI18nGlobal(self.root, competition) if self.parent is None else self.parent.i18n(competition)
+
+    def refresh(self) -> None:
+        """ The repositories may have new commits, and the build its own timestamp """
+        self.add(build=self.build_info(self._competition))
+
+    def validate_repo(self, *path) -> None:
+        """ The repository of the volume is validated only once for all its languages and venues """
+        if self.parent is None:
+            super().validate_repo(*path)
+
+
+class BuildableContextVolume(BuildableContextNaboj):
+    """ Shared contexts of all languages and venues of a volume, built only once when building all of them """
+    _target = 'volume'
+
+    def populate(self, competition, volume):
+        super().populate(competition, volume)
+        self._i18n = ContextI18nGlobal(self.root, competition)
+
+    def i18n(self, competition) -> ContextI18nGlobal:
+        return self._i18n
+
 
 class BuildableContextLanguage(BuildableContextNaboj):
     _target = 'language'
     _subdir = 'languages'
-    _schema = i18n.LanguageSchema
-
-    def __init__(self, root, *args):
-        self._schema = super()._schema | self._schema
-        super().__init__(root, *args)
+    _schema = BuildableContextNaboj._schema | i18n.LanguageSchema
 
     def populate(self, competition, volume, language):
         super().populate(competition, volume)
         self.adopt(
             language=ContextLanguage(self.root, competition, volume, language),
-            i18n=ContextI18nGlobal(self.root, competition),
+            i18n=self.i18n(competition),
         )
 
 
 class BuildableContextVenue(BuildableContextNaboj):
     _target = 'venue'
     _subdir = 'venues'
-    _schema = i18n.LanguageSchema
-
-    def __init__(self, root, *args):
-        self._schema = super()._schema | self._schema
-        super().__init__(root, *args)
+    _schema = BuildableContextNaboj._schema | i18n.LanguageSchema
 
     def populate(self, competition, volume, venue):
         super().populate(competition, volume)
         self.adopt(
             venue=ContextVenue(self.root, competition, volume, venue)
                                .override('start', self.data['volume']['start']),
-            i18n=ContextI18nGlobal(self.root, competition)
+            i18n=self.i18n(competition)
         ).add(language=i18n.languages[self.data['venue']['language']].as_dict())
 
         if 'start' not in self.data['venue']:
-            self.data['venue']['start'] = self.data['volume']['start']
+            self.override('venue', self.data['venue'] | {'start': self.data['volume']['start']})
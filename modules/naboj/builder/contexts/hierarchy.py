@@ -87,7 +87,6 @@ class ContextVenue(ContextNaboj):
 
     def populate(self, competition, volume, venue):
         super().populate(competition)
-        comp = ContextCompetition(self.root, competition)
         vol = ContextVolume(self.root, competition, volume)
         self.load_meta(competition, volume, venue) \
             .add_id(venue)
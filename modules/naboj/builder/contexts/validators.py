@@ -54,6 +54,11 @@ class NabojValidator(FileSystemValidator):
         self.debug = False
 
     def perform_extra_checks(self):
+        # Translations of every problem, listed once for all checks
+        self.translations = {
+            problem_id: [x for x in problem.keys() if x in i18n.languages.keys()]
+            for problem_id, problem in self.tree['problems'].items()
+        }
         self._check_same_translations()
         self._check_presence('problem.md')
         self._check_presence('solution.md')
@@ -69,16 +74,14 @@ class NabojValidator(FileSystemValidator):
 
     def _check_same_translations(self) -> None:
         if self.tree['problems']:
-            for (pid1, problem1), (pid2, problem2) in itertools.pairwise(self.tree['problems'].items()):
-                translations1 = [x for x in problem1.keys() if x in i18n.languages.keys()]
-                translations2 = [x for x in problem2.keys() if x in i18n.languages.keys()]
+            for (pid1, translations1), (pid2, translations2) in itertools.pairwise(self.translations.items()):
                 if translations1 != translations2:
                     print(f"Warning: problem {pid1} has translations {translations1} "
                           f"and {pid2} has translations {translations2}")
 
     def _check_presence(self, filename, *, optional: bool = False):
         for problem_id, problem in sorted(self.tree['problems'].items()):
-            translations = [x for x in problem.keys() if x in i18n.languages.keys()]
+            translations = self.translations[problem_id]
             is_present = {
                 trans: problem[trans][filename] if filename in problem[trans] else None for trans in translations
             }
@@ -30,4 +30,5 @@ class BuilderNabojLanguage(BuilderNaboj):
         return self.args.competition, f'{self.args.volume:02d}', self._subdir, self.args.language
 
 
-BuilderNabojLanguage().build_templates()
+if __name__ == "__main__":
+    BuilderNabojLanguage().build_templates()
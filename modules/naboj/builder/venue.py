@@ -1,6 +1,5 @@
 from pathlib import Path
 
-import core.builder.jinja as jinja
 from modules.naboj.builder.builder import BuilderNaboj
 from modules.naboj.builder.contexts import BuildableContextVenue
 
@@ -28,14 +27,12 @@ class BuilderNabojVenue(BuilderNaboj):
 
     def build_templates(self):
         super().build_templates()
+        path = self.path()
+        self.print_templates(
+            Path(self.launch_directory, path[0], path[1], 'languages', self.context.data['venue']['language']),
+            self.language_templates, self.context, self.output_directory,
+        )
 
-        for template in self.language_templates:
-            path = self.path()
-            jinja.print_template(
-                Path(self.launch_directory, path[0], path[1], 'languages', self.context.data['venue']['language']), template, self.context.data,
-                outdir=self.output_directory,
-                new_name=Path(template).with_suffix('.tex'),
-            )
 
-
-BuilderNabojVenue().build_templates()
+if __name__ == "__main__":
+    BuilderNabojVenue().build_templates()
@@ -0,0 +1,63 @@
+import logging
+from pathlib import Path
+
+from core.builder.context import registry
+from core.utilities import crawler
+from modules.naboj.builder.builder import BuilderNaboj
+from modules.naboj.builder.contexts import BuildableContextLanguage, BuildableContextVenue, BuildableContextVolume
+from modules.naboj.builder.language import BuilderNabojLanguage
+from modules.naboj.builder.venue import BuilderNabojVenue
+
+log = logging.getLogger('dgs')
+
+
+class BuilderNabojVolume(BuilderNaboj):
+    """
+    Builds the templates of all languages and venues of a volume at once, into the same directories as
+    BuilderNabojLanguage and BuilderNabojVenue. The competition, volume and i18n contexts are built
+    and the repository of the volume is validated only once.
+    """
+    _target = 'volume'
+
+    _root_context_class = BuildableContextVolume
+
+    def ident(self):
+        return self.args.competition, self.args.volume
+
+    def path(self):
+        return self.args.competition, f'{self.args.volume:02d}'
+
+    def subdirs(self, subdir: str) -> list[str]:
+        directory = Path(self.full_path(), subdir)
+        return crawler.Crawler(directory).subdirs() if directory.is_dir() else []
+
+    def build_templates(self):
+        self.print_build_info()
+        assert self.output_directory is not None, "The volume builder needs an output directory"
+
+        if self.args.debug:
+            self.print_debug_info()
+
+        competition, volume = self.ident()
+        for language in self.subdirs('languages'):
+            context = BuildableContextLanguage(self.launch_directory, competition, volume, language,
+                                               parent=self.context)
+            outdir = Path(self.output_directory, 'languages', language)
+            outdir.mkdir(parents=True, exist_ok=True)
+            self.print_templates(self.template_root, BuilderNabojLanguage.templates, context, outdir)
+            self.print_templates(Path(self.full_path(), 'languages', language), BuilderNabojLanguage.i18n_templates,
+                                 context, outdir)
+
+        for venue in self.subdirs('venues'):
+            context = BuildableContextVenue(self.launch_directory, competition, volume, venue, parent=self.context)
+            outdir = Path(self.output_directory, 'venues', venue)
+            outdir.mkdir(parents=True, exist_ok=True)
+            self.print_templates(self.template_root, BuilderNabojVenue.templates, context, outdir)
+            self.print_templates(Path(self.full_path(), 'languages', context.data['venue']['language']),
+                                 BuilderNabojVenue.language_templates, context, outdir)
+
+        log.debug(f"Contexts: {registry}")
+
+
+if __name__ == "__main__":
+    BuilderNabojVolume().build_templates()
@@ -25,6 +25,14 @@ build/naboj/%/answer-interval.tex: \
 	$(eval language := $(word 5,$(subst /, ,$*)))
 	$(call pandoctex,$(language))
 
+ifdef DUAL
+# Both at once, in the language of the problem (the HTML otherwise uses the global Slovak rule)
+build/naboj/%.tex output/naboj/%.html: \
+	source/naboj/%.md
+	$(eval language := $(word 5,$(subst /, ,$*)))
+	$(call pandocdual,$(language),build/naboj/$*.tex,output/naboj/$*.html)
+endif
+
 build/naboj/%.tex: \
 	source/naboj/%.md
 	$(eval language := $(word 5,$(subst /, ,$*)))
@@ -50,7 +58,9 @@ build/naboj/%/build-language: \
 	source/naboj/$$*/meta.yaml \
 	source/naboj/$$(word 1,$$(subst /, ,$$*))/.static/i18n/$$(word 4,$$(subst /, ,$$*)).yaml
 	$(call prepare_arguments,language)
-	python -m modules.naboj.builder.language 'source/naboj/' 'modules/naboj/templates/' $(word 1,$(words)) $(word 2,$(words)) $(word 4,$(words)) -o '$(dir $@)'
+ifndef NABOJ_VOLUME
+	python -m modules.naboj.builder.language 'source/naboj/' 'modules/naboj/templates/' $(word 1,$(words)) $(word 2,$(words)) $(word 4,$(words)) -o '$(dir $@)' --validate $(VALIDATE)
+endif
 
 # % <competition>/<volume>/venues/<venue>
 build/naboj/%/build-venue: \
@@ -60,7 +70,25 @@ build/naboj/%/build-venue: \
 	$$(subst $$(cdir),,$$(abspath build/naboj/$$*/../../../copy-static)) \
 	$$(subst $$(cdir),,$$(abspath source/naboj/$$*/../../../i18n))
 	$(call prepare_arguments,venue)
-	python -m modules.naboj.builder.venue 'source/naboj/' 'modules/naboj/templates/' $(word 1,$(words)) $(word 2,$(words)) $(word 4,$(words)) -o '$(dir $@)'
+ifndef NABOJ_VOLUME
+	python -m modules.naboj.builder.venue 'source/naboj/' 'modules/naboj/templates/' $(word 1,$(words)) $(word 2,$(words)) $(word 4,$(words)) -o '$(dir $@)' --validate $(VALIDATE)
+endif
+
+# Templates of all languages and venues of a volume in a single run, sharing the competition, volume and i18n
+# contexts and validating the volume only once. The outputs of all languages or venues are then made
+# with NABOJ_VOLUME set, which skips the builders of single languages and venues above.
+# % <competition>/<volume>
+build/naboj/%/build-volume: \
+	$$(subst $$(cdir),,$$(abspath build/naboj/$$*/../copy-static)) \
+	$$(subst $$(cdir),,$$(abspath build/naboj/$$*/../.static/logo/logo.pdf)) \
+	source/naboj/$$*/meta.yaml \
+	$$(wildcard source/naboj/$$*/languages/*/meta.yaml) \
+	$$(wildcard source/naboj/$$*/venues/*/meta.yaml) \
+	$$(foreach language,$$(notdir $$(wildcard source/naboj/$$*/languages/*)),source/naboj/$$(word 1,$$(subst /, ,$$*))/.static/i18n/$$(language).yaml) \
+	$$(subst $$(cdir),,$$(abspath source/naboj/$$*/../meta.yaml)) \
+	$$(subst $$(cdir),,$$(abspath source/naboj/$$*/../i18n))
+	$(call prepare_arguments,volume)
+	python -m modules.naboj.builder.volume 'source/naboj/' 'modules/naboj/templates/' $(word 1,$(words)) $(word 2,$(words)) -o '$(dir $@)' --validate $(VALIDATE)
 
 ### Input files ###################################################################################
 
@@ -157,11 +185,23 @@ build/naboj/%/pdf-prerequisites: \
 # All problems, solutions and answers for every language, and overall
 # <competition>/<volume>
 define RULE_TEMPLATE
+# Stamps for batch conversion: all out-of-date files of a language group are converted in one call,
+# and the stamp is remade whenever one of their outputs is missing
+build/naboj/%/problems/$(1).batch: \
+	$$$$(wildcard source/naboj/$$$$*/problems/*/$(1)/problem.md) \
+	$$$$(call batch_missing,$$$$(wildcard source/naboj/$$$$*/problems/*/$(1)/problem.md))
+	$$(call pandoc_batch,$(1),latex,$$(wildcard source/naboj/$$*/problems/*/$(1)/problem.md))
+
+build/naboj/%/solutions/$(1).batch: \
+	$$$$(wildcard source/naboj/$$$$*/problems/*/$(1)/solution.md) \
+	$$$$(call batch_missing,$$$$(wildcard source/naboj/$$$$*/problems/*/$(1)/solution.md))
+	$$(call pandoc_batch,$(1),latex,$$(wildcard source/naboj/$$*/problems/*/$(1)/solution.md))
+
 build/naboj/%/problems/$(1): \
-	$$$$(subst source/,build/,$$$$(subst .md,.tex,$$$$(wildcard source/naboj/$$$$*/problems/*/$(1)/problem.md))) ;
+	build/naboj/%/problems/$(1).batch ;
 
 build/naboj/%/solutions/$(1): \
-	$$$$(subst source/,build/,$$$$(subst .md,.tex,$$$$(wildcard source/naboj/$$$$*/problems/*/$(1)/solution.md))) ;
+	build/naboj/%/solutions/$(1).batch ;
 
 build/naboj/%/answers/$(1): \
 	$$$$(addsuffix answer.tex,$$$$(subst source/,build/,$$$$(wildcard source/naboj/$$$$*/problems/*/$(1)/))) \
@@ -299,8 +339,8 @@ output/naboj/%/booklets: \
 # All targets for all languages
 # <competition>/<volume>
 output/naboj/%/languages: \
-	$$(foreach dir,$$(subst source/,output/,$$(wildcard source/naboj/$$*/languages/*)),$$(dir)) \
-	$$@/tearoffs.zip ;
+	build/naboj/%/build-volume
+	$(MAKE) NABOJ_VOLUME=1 $(foreach dir,$(subst source/,output/,$(wildcard source/naboj/$*/languages/*)),$(dir)) $@/tearoffs.zip
 
 # <competition>/<volume>/venues/<venue>
 output/naboj/%/instructions.pdf: \
@@ -333,7 +373,8 @@ output/naboj/%: \
 # All targets for all venues
 # <competition>/<volume>
 output/naboj/%/venues: \
-	$$(foreach dir,$$(subst source/,output/,$$(wildcard source/naboj/$$*/venues/*)),$$(dir)) ;
+	build/naboj/%/build-volume
+	$(MAKE) NABOJ_VOLUME=1 $(foreach dir,$(subst source/,output/,$(wildcard source/naboj/$*/venues/*)),$(dir))
 
 # Entire volume
 # <competition>/<volume>
@@ -13,21 +13,21 @@ endef
 define prepare_arguments_semester
 	$(call _prepare_arguments)
 	python -m modules.seminar.builder.$(1) 'source/seminar/' 'modules/seminar/templates/' \
-		-c $(word 1,$(words)) -v $(word 2,$(words)) -s $(word 3,$(words)) -o '$(dir $@)'
+		-c $(word 1,$(words)) -v $(word 2,$(words)) -s $(word 3,$(words)) -o '$(dir $@)' --validate $(VALIDATE)
 endef
 
 # _prepare_arguments_round(builder)
 define prepare_arguments_round
 	$(call _prepare_arguments)
 	python -m modules.seminar.builder.$(1) 'source/seminar/' 'modules/seminar/templates/' \
-		-c $(word 1,$(words)) -v $(word 2,$(words)) -s $(word 3,$(words)) -r $(word 4,$(words)) -o '$(dir $@)' || exit 1;
+		-c $(word 1,$(words)) -v $(word 2,$(words)) -s $(word 3,$(words)) -r $(word 4,$(words)) -o '$(dir $@)' --validate $(VALIDATE) || exit 1;
 endef
 
 build/seminar/%/intro.tex build/seminar/%/rules.tex: \
 	modules/seminar/templates/$$(notdir $@)
 	$(call _prepare_arguments)
 	python -m modules.seminar.builder.volume 'source/seminar/' 'source/seminar/$*/' \
-		-c $(word 1,$(words)) -v $(word 2,$(words)) -o '$(dir $@)' || exit 1;
+		-c $(word 1,$(words)) -v $(word 2,$(words)) -o '$(dir $@)' --validate $(VALIDATE) || exit 1;
 
 build/seminar/%/semester.tex: \
 	build/seminar/$$(word 1, $$(subst /, ,$$*))/$$(word 2, $$(subst /, ,$$*))/intro.tex \